@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks
+~~~~~~~~~~
+
+This package contains the nio benchmarks and the synthetic sync payload
+generator they use.
+
+The benchmarks aren't part of the default test run, run them with:
+
+    python3 -m pytest benchmarks
+"""
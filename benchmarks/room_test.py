@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import pytest
+
+from nio.rooms import MatrixRoom
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None  # type: ignore
+
+
+MEMBER_COUNT = 100000
+
+
+def build_room(member_count):
+    room = MatrixRoom("!room:example.org", "@user0:example.org")
+
+    for index in range(member_count):
+        room.add_member(
+            "@user{}:example.org".format(index),
+            "User {}".format(index),
+            "mxc://example.org/avatar{}".format(index)
+        )
+
+    return room
+
+
+class TestClass(object):
+    def test_large_room_members(self, benchmark):
+        room = benchmark.pedantic(build_room, args=(MEMBER_COUNT, ), rounds=3)
+
+        assert len(room.users) == MEMBER_COUNT
+        benchmark.extra_info["members"] = MEMBER_COUNT
+
+    @pytest.mark.skipif(tracemalloc is None, reason="requires tracemalloc")
+    def test_large_room_memory(self, benchmark):
+        def measure():
+            tracemalloc.start()
+            try:
+                room = build_room(MEMBER_COUNT)
+                size, _ = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+            return room, size
+
+        room, size = benchmark.pedantic(measure, rounds=1)
+
+        assert len(room.users) == MEMBER_COUNT
+        benchmark.extra_info["members"] = MEMBER_COUNT
+        benchmark.extra_info["traced_bytes"] = size
+        benchmark.extra_info["bytes_per_member"] = size / MEMBER_COUNT
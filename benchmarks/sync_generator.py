@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+sync_generator
+~~~~~~~~~~~~~~
+
+This module contains a generator for synthetic sync responses.
+
+The generated payloads are deterministic for a given seed, so benchmark
+numbers of different runs can be compared with each other.
+"""
+
+from __future__ import unicode_literals
+
+import base64
+from random import Random
+
+
+class SyncGenerator(object):
+    """Generator for synthetic sync response payloads.
+
+    Args:
+        seed (int): The seed of the random number generator, the same seed
+            always produces the same payloads.
+        server (str): The server name used for the room, user and event ids.
+    """
+
+    _msgtypes = ["m.text", "m.notice", "m.emote"]
+
+    def __init__(self, seed=0, server="example.org"):
+        self.random = Random(seed)
+        self.server = server
+        self.timestamp = 1520000000000
+        self.event_count = 0
+
+    def _base64(self, byte_count):
+        data = bytearray(self.random.getrandbits(8) for _ in range(byte_count))
+        return base64.b64encode(bytes(data)).decode().rstrip("=")
+
+    def user_id(self, index):
+        return "@user{}:{}".format(index, self.server)
+
+    def room_id(self, index):
+        return "!room{}:{}".format(index, self.server)
+
+    def event(self, event_type, sender, content, state_key=None):
+        self.event_count += 1
+        self.timestamp += self.random.randint(1, 60000)
+
+        event = {
+            "type": event_type,
+            "event_id": "${}{}:{}".format(
+                self.timestamp,
+                self.event_count,
+                self.server
+            ),
+            "sender": sender,
+            "origin_server_ts": self.timestamp,
+            "content": content,
+            "unsigned": {"age": self.random.randint(0, 100000)},
+        }
+
+        if state_key is not None:
+            event["state_key"] = state_key
+
+        return event
+
+    def state_events(self, creator, event_count, encrypted):
+        """Generate the state events of a room.
+
+        The room is created by the creator, the events that aren't needed to
+        set up the room are membership events of other users.
+        """
+        events = [
+            self.event("m.room.create", creator, {
+                "creator": creator,
+                "m.federate": True,
+                "room_version": "1"
+            }, ""),
+            self.event("m.room.member", creator, {
+                "membership": "join",
+                "displayname": "user0",
+                "avatar_url": None
+            }, creator),
+            self.event("m.room.power_levels", creator, {
+                "users": {creator: 100},
+                "users_default": 0,
+                "events_default": 0,
+                "state_default": 50,
+                "ban": 50,
+                "kick": 50,
+                "redact": 50,
+                "invite": 0,
+                "events": {},
+                "notifications": {"room": 50},
+            }, ""),
+            self.event("m.room.join_rules", creator, {
+                "join_rule": "public"
+            }, ""),
+            self.event("m.room.history_visibility", creator, {
+                "history_visibility": "shared"
+            }, ""),
+            self.event("m.room.name", creator, {
+                "name": "Room {}".format(self.random.randint(0, 1 << 16))
+            }, ""),
+            self.event("m.room.topic", creator, {
+                "topic": "Topic {}".format(self.random.randint(0, 1 << 16))
+            }, ""),
+        ]
+
+        if encrypted:
+            events.append(self.event("m.room.encryption", creator, {
+                "algorithm": "m.megolm.v1.aes-sha2"
+            }, ""))
+
+        for index in range(1, event_count - len(events) + 1):
+            user_id = self.user_id(index)
+            events.append(self.event("m.room.member", user_id, {
+                "membership": "join",
+                "displayname": "user{}".format(index),
+                "avatar_url": None
+            }, user_id))
+
+        return events[:event_count]
+
+    def message_event(self, sender):
+        body = " ".join(
+            "word{}".format(self.random.randint(0, 1000))
+            for _ in range(self.random.randint(1, 20))
+        )
+
+        return self.event("m.room.message", sender, {
+            "msgtype": self.random.choice(self._msgtypes),
+            "body": body,
+        })
+
+    def megolm_event(self, sender):
+        return self.event("m.room.encrypted", sender, {
+            "algorithm": "m.megolm.v1.aes-sha2",
+            "sender_key": self._base64(32),
+            "ciphertext": self._base64(self.random.randint(64, 512)),
+            "session_id": self._base64(32),
+            "device_id": "DEVICE{}".format(self.random.randint(0, 9)),
+        })
+
+    def olm_event(self, sender):
+        return {
+            "type": "m.room.encrypted",
+            "sender": sender,
+            "content": {
+                "algorithm": "m.olm.v1.curve25519-aes-sha2",
+                "sender_key": self._base64(32),
+                "ciphertext": {
+                    self._base64(32): {
+                        "type": 0,
+                        "body": self._base64(self.random.randint(256, 1024))
+                    }
+                },
+            },
+        }
+
+    def joined_room(self, timeline_events, state_events, encrypted_fraction):
+        encrypted = self.random.random() < encrypted_fraction
+        member_count = max(state_events - 8, 1)
+        creator = self.user_id(0)
+
+        timeline = []
+
+        for _ in range(timeline_events):
+            sender = self.user_id(self.random.randint(0, member_count - 1))
+
+            if encrypted:
+                timeline.append(self.megolm_event(sender))
+            else:
+                timeline.append(self.message_event(sender))
+
+        return {
+            "account_data": {"events": []},
+            "ephemeral": {"events": []},
+            "state": {
+                "events": self.state_events(creator, state_events, encrypted)
+            },
+            "timeline": {
+                "events": timeline,
+                "limited": True,
+                "prev_batch": "p{}".format(self.random.randint(0, 1 << 32)),
+            },
+            "summary": {
+                "m.joined_member_count": member_count,
+                "m.invited_member_count": 0,
+            },
+            "unread_notifications": {
+                "highlight_count": 0,
+                "notification_count": 0
+            },
+        }
+
+    def invited_room(self, inviter, invitee):
+        events = [
+            {
+                "type": "m.room.name",
+                "sender": inviter,
+                "state_key": "",
+                "content": {"name": "Invite"},
+            },
+            {
+                "type": "m.room.member",
+                "sender": inviter,
+                "state_key": invitee,
+                "content": {"membership": "invite"},
+            },
+        ]
+
+        return {"invite_state": {"events": events}}
+
+    def left_room(self, user_id, timeline_events):
+        timeline = [
+            self.message_event(user_id) for _ in range(timeline_events)
+        ]
+        timeline.append(self.event("m.room.member", user_id, {
+            "membership": "leave"
+        }, user_id))
+
+        return {
+            "state": {"events": []},
+            "timeline": {
+                "events": timeline,
+                "limited": False,
+                "prev_batch": "p{}".format(self.random.randint(0, 1 << 32)),
+            },
+        }
+
+    def sync(
+        self,
+        joined_rooms=100,
+        invited_rooms=0,
+        left_rooms=0,
+        timeline_events=10,
+        state_events=10,
+        encrypted_fraction=0.5,
+        to_device_events=0,
+        device_list_changes=0,
+        next_batch="s1",
+    ):
+        """Generate a sync response payload.
+
+        Args:
+            joined_rooms (int): The number of joined rooms.
+            invited_rooms (int): The number of rooms the user is invited to.
+            left_rooms (int): The number of rooms the user left.
+            timeline_events (int): The number of timeline events per room.
+            state_events (int): The number of state events per joined room.
+            encrypted_fraction (float): The fraction of joined rooms that are
+                encrypted, the timeline of encrypted rooms consists of megolm
+                events.
+            to_device_events (int): The number of olm encrypted to-device
+                events.
+            device_list_changes (int): The number of users in the changed
+                device list.
+            next_batch (str): The sync token of the response.
+
+        Returns the sync response as a dictionary.
+        """
+        own_user = self.user_id(0)
+
+        join = {
+            self.room_id(index): self.joined_room(
+                timeline_events,
+                state_events,
+                encrypted_fraction
+            ) for index in range(joined_rooms)
+        }
+
+        invite = {
+            self.room_id(joined_rooms + index): self.invited_room(
+                self.user_id(index + 1),
+                own_user
+            ) for index in range(invited_rooms)
+        }
+
+        leave = {
+            self.room_id(joined_rooms + invited_rooms + index):
+            self.left_room(own_user, timeline_events)
+            for index in range(left_rooms)
+        }
+
+        return {
+            "next_batch": next_batch,
+            "account_data": {"events": []},
+            "presence": {"events": []},
+            "device_one_time_keys_count": {"signed_curve25519": 50},
+            "device_lists": {
+                "changed": [
+                    self.user_id(index)
+                    for index in range(1, device_list_changes + 1)
+                ],
+                "left": [],
+            },
+            "to_device": {
+                "events": [
+                    self.olm_event(self.user_id(index % 10 + 1))
+                    for index in range(to_device_events)
+                ]
+            },
+            "rooms": {"join": join, "invite": invite, "leave": leave},
+        }
+
+
+def generate_sync(seed=0, **kwargs):
+    """Generate a synthetic sync response payload.
+
+    Args:
+        seed (int): The seed of the random number generator.
+        **kwargs: Arguments that are passed to SyncGenerator.sync().
+
+    Returns the sync response as a dictionary.
+    """
+    return SyncGenerator(seed).sync(**kwargs)
+
+
+def count_events(parsed_dict):
+    """Count the room and to-device events of a sync response payload."""
+    rooms = parsed_dict["rooms"]
+    count = len(parsed_dict["to_device"]["events"])
+
+    for room in rooms["join"].values():
+        count += len(room["state"]["events"])
+        count += len(room["timeline"]["events"])
+
+    for room in rooms["invite"].values():
+        count += len(room["invite_state"]["events"])
+
+    for room in rooms["leave"].values():
+        count += len(room["state"]["events"])
+        count += len(room["timeline"]["events"])
+
+    return count
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import json
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+
+import pytest
+
+from benchmarks.sync_generator import count_events, generate_sync
+from nio import Client, ClientConfig, LoginResponse
+from nio.responses import PartialSyncResponse, SyncResponse
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None  # type: ignore
+
+
+SYNC_SIZES = {
+    "small": dict(joined_rooms=10, timeline_events=10, state_events=10),
+    "large": dict(
+        joined_rooms=200,
+        invited_rooms=20,
+        left_rooms=20,
+        timeline_events=20,
+        state_events=30,
+        to_device_events=50,
+        device_list_changes=100,
+    ),
+}
+
+
+def peak_rss():
+    """Return the peak resident set size of the process in kilobytes."""
+    if resource is None:
+        return None
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def record_throughput(benchmark, event_count):
+    benchmark.extra_info["events"] = event_count
+    benchmark.extra_info["peak_rss_kb"] = peak_rss()
+
+    if benchmark.stats:
+        mean = benchmark.stats.stats.mean
+        benchmark.extra_info["events_per_second"] = event_count / mean
+
+
+# An account with a lot of rooms that share most of their members.
+MANY_ROOMS = dict(joined_rooms=5000, timeline_events=5, state_events=20)
+
+
+@pytest.fixture(params=sorted(SYNC_SIZES))
+def sync_payload(request):
+    return generate_sync(seed=0, **SYNC_SIZES[request.param])
+
+
+class TestClass(object):
+    @staticmethod
+    def _client():
+        config = ClientConfig(encryption_enabled=False)
+        client = Client("@user0:example.org", "DEVICEID", config=config)
+        client.receive_response(
+            LoginResponse("@user0:example.org", "DEVICEID", "token")
+        )
+        return client
+
+    def test_generator_deterministic(self):
+        assert generate_sync(seed=1) == generate_sync(seed=1)
+        assert generate_sync(seed=1) != generate_sync(seed=2)
+
+    def test_sync_from_dict(self, benchmark, sync_payload):
+        response = benchmark.pedantic(
+            SyncResponse.from_dict,
+            setup=lambda: ((deepcopy(sync_payload), ), {}),
+            rounds=5
+        )
+
+        assert isinstance(response, SyncResponse)
+        record_throughput(benchmark, count_events(sync_payload))
+
+    def test_client_receive_sync(self, benchmark, sync_payload):
+        def setup():
+            client = TestClass._client()
+            response = SyncResponse.from_dict(deepcopy(sync_payload))
+            return (client, response), {}
+
+        def receive(client, response):
+            client.receive_response(response)
+            return client
+
+        client = benchmark.pedantic(receive, setup=setup, rounds=5)
+
+        assert len(client.rooms) == len(sync_payload["rooms"]["join"])
+        record_throughput(benchmark, count_events(sync_payload))
+
+    def test_partial_sync_next_part(self, benchmark, sync_payload):
+        def setup():
+            # Only the first few events of every room are parsed up front,
+            # the rest is left for next_part().
+            response = SyncResponse.from_dict(deepcopy(sync_payload), 5)
+            return (response, ), {}
+
+        def drain(response):
+            while isinstance(response, PartialSyncResponse):
+                response = response.next_part(100)
+            return response
+
+        response = benchmark.pedantic(drain, setup=setup, rounds=5)
+
+        assert isinstance(response, SyncResponse)
+        record_throughput(benchmark, count_events(sync_payload))
+
+    def test_sync_from_dict_parallel(self, benchmark):
+        sync_payload = generate_sync(seed=0, **MANY_ROOMS)
+
+        with ProcessPoolExecutor(2) as executor:
+            response = benchmark.pedantic(
+                SyncResponse.from_dict,
+                setup=lambda: ((deepcopy(sync_payload), ), {
+                    "executor": executor
+                }),
+                rounds=1
+            )
+
+        assert isinstance(response, SyncResponse)
+        assert len(response.rooms.join) == MANY_ROOMS["joined_rooms"]
+        record_throughput(benchmark, count_events(sync_payload))
+
+    @pytest.mark.skipif(tracemalloc is None, reason="requires tracemalloc")
+    def test_client_state_memory(self, benchmark):
+        # Parse the response from JSON while tracing, so the strings the
+        # client holds on to are allocated like they are for a real sync.
+        data = json.dumps(generate_sync(seed=0, **MANY_ROOMS))
+
+        def measure():
+            client = TestClass._client()
+
+            tracemalloc.start()
+            try:
+                response = SyncResponse.from_dict(json.loads(data))
+                client.receive_response(response)
+                del response
+                size, _ = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+            return client, size
+
+        client, size = benchmark.pedantic(measure, rounds=1)
+
+        assert len(client.rooms) == MANY_ROOMS["joined_rooms"]
+        assert size
+        benchmark.extra_info["rooms"] = len(client.rooms)
+        benchmark.extra_info["retained_bytes"] = size
@@ -16,6 +16,23 @@
 
 import sys
 
+if sys.version_info >= (3, 0):
+    def intern(string):
+        """Intern a string, other values are returned unchanged.
+
+        User ids, room ids and event types are repeated in a lot of events,
+        interning them keeps a single copy of every identifier in memory.
+        """
+        if type(string) is str:
+            return sys.intern(string)
+
+        return string
+else:
+    def intern(string):
+        # Identifiers are unicode strings, python2 can only intern byte
+        # strings.
+        return string
+
 if sys.version_info >= (3, 5):
     import importlib
 
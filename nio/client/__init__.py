@@ -3,4 +3,4 @@ import sys
 from .base_client import Client, ClientConfig, logged_in, store_loaded
 from .http_client import HttpClient, TransportType, RequestInfo
 if sys.version_info >= (3, 5):
-    from .async_client import AsyncClient
+    from .async_client import AsyncClient, EventStream
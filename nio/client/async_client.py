@@ -15,11 +15,13 @@
 # CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
 import asyncio
+import inspect
 from asyncio import Event
+from collections import deque
 from functools import partial, wraps
 from json.decoder import JSONDecodeError
-from typing import (Any, Coroutine, Dict, Iterable, List, Optional, Tuple,
-                    Type, Union)
+from typing import (Any, AsyncIterator, Coroutine, Deque, Dict, Iterable, List,
+                    Optional, Set, Tuple, Type, Union)
 from uuid import uuid4
 
 import attr
@@ -27,6 +29,7 @@ from aiohttp import ClientResponse, ClientSession, ContentTypeError
 from aiohttp.client_exceptions import ClientConnectionError
 
 from . import Client, ClientConfig, logged_in, store_loaded
+from .base_client import logger
 from ..api import Api
 from ..exceptions import (GroupEncryptionError, LocalProtocolError,
                           MembersSyncError, SendRetryError)
@@ -37,10 +40,12 @@ from ..responses import (JoinedMembersError, JoinedMembersResponse,
                          Response, RoomKeyRequestError, RoomKeyRequestResponse,
                          RoomSendResponse, ShareGroupSessionError,
                          ShareGroupSessionResponse, SyncError, SyncResponse,
-                         ToDeviceError, ToDeviceResponse)
+                         SyncStream, SyncType, ToDeviceError,
+                         ToDeviceResponse)
 
 if False:
     from ..events import MegolmEvent
+    from ..rooms import MatrixRoom
     from .crypto import OlmDevice
 
 _ShareGroupSessionT = Union[ShareGroupSessionError, ShareGroupSessionResponse]
@@ -54,6 +59,286 @@ class ResponseCb(object):
     filter = attr.ib(default=None)
 
 
+class CallbackTasks(object):
+    """Runner tasks for the coroutine event callbacks of a client.
+
+    The scheduled callbacks are queued per room and run by at most
+    max_concurrent runner tasks. The callbacks of the same room are run one
+    after another in the order they were scheduled, the callbacks of
+    different rooms run concurrently.
+
+    Args:
+        max_concurrent (int): The maximum number of callbacks that are run
+            at the same time.
+    """
+
+    def __init__(self, max_concurrent):
+        # type: (int) -> None
+        self.max_concurrent = max_concurrent
+        self._runners = set()  # type: Set[asyncio.Future]
+        # The queued callbacks of every room that has unfinished callbacks.
+        self._queues = dict()  # type: Dict[Optional[str], Deque[Any]]
+        # Rooms with queued callbacks that no runner is working on.
+        self._ready = deque()  # type: Deque[Optional[str]]
+        self._pending = 0
+        self._progress = None  # type: Optional[asyncio.Future]
+
+    def __len__(self):
+        # type: () -> int
+        """The number of unfinished callbacks, queued or running."""
+        return self._pending
+
+    def schedule(self, room_id, callback):
+        # type: (Optional[str], Any) -> None
+        """Schedule a callback.
+
+        Args:
+            room_id (str, optional): The room the callback belongs to, the
+                callback is run after all the previously scheduled callbacks
+                of the room finished.
+            callback (Awaitable, Callable[[], Awaitable]): The awaitable
+                returned by the callback, or a function creating it once the
+                callback should run.
+        """
+        if room_id not in self._queues:
+            self._queues[room_id] = deque()
+            self._ready.append(room_id)
+
+        self._queues[room_id].append(callback)
+        self._pending += 1
+
+        if len(self._runners) < max(self.max_concurrent, 1):
+            runner = asyncio.ensure_future(self._run())
+            self._runners.add(runner)
+            runner.add_done_callback(self._runners.discard)
+
+    async def _run(self):
+        # type: () -> None
+        while self._ready:
+            room_id = self._ready.popleft()
+            queue = self._queues[room_id]
+            callback = queue.popleft()
+
+            try:
+                await (callback() if callable(callback) else callback)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error in event callback")
+            finally:
+                # The next callback of the room may only start now.
+                if queue:
+                    self._ready.append(room_id)
+                else:
+                    del self._queues[room_id]
+
+                self._pending -= 1
+                self._notify()
+
+    def _notify(self):
+        # type: () -> None
+        if self._progress and not self._progress.done():
+            self._progress.set_result(None)
+
+        self._progress = None
+
+    async def wait(self, max_pending=0):
+        # type: (int) -> None
+        """Wait until at most max_pending callbacks are unfinished."""
+        while self._pending > max_pending:
+            if self._progress is None:
+                self._progress = asyncio.get_event_loop().create_future()
+
+            await asyncio.shield(self._progress)
+
+    async def cancel(self):
+        # type: () -> None
+        """Cancel all the unfinished callbacks."""
+        runners = list(self._runners)
+
+        for runner in runners:
+            runner.cancel()
+
+        if runners:
+            await asyncio.wait(runners)
+
+        # Don't leave never awaited coroutines behind for the callbacks that
+        # didn't start yet.
+        for queue in self._queues.values():
+            for callback in queue:
+                if inspect.iscoroutine(callback):
+                    callback.close()
+
+        self._queues.clear()
+        self._ready.clear()
+        self._pending = 0
+        self._notify()
+
+
+class EventStream(object):
+    """An async iterator over the room events of sync responses.
+
+    Event streams are created with AsyncClient.events(). Every stream has its
+    own bounded buffer, the events of a sync response are added to the
+    buffers of all the subscribed streams and are taken out again by
+    iterating over the stream:
+
+        >>> async with client.events(RoomMessageText) as stream:
+        >>>     async for room, event in stream:
+        >>>         print(room.display_name, event.body)
+
+    The overflow policy decides what happens if a buffer is full:
+
+        * "block": The events are still buffered, sync_forever() waits with
+          the next sync request until the consumer caught up.
+        * "drop_oldest": The oldest buffered event is dropped.
+        * "drop_ephemeral": Ephemeral events are dropped, the new one if it
+          is ephemeral, otherwise the oldest buffered one. If no ephemeral
+          event can be dropped, the stream blocks.
+
+    Args:
+        client (AsyncClient): The client the stream is subscribed to.
+        filter (Type, Tuple[Type], optional): The event type or a tuple of
+            event types the stream should contain, all events if not set.
+        room_id (str, optional): The room the stream should contain events
+            of, all rooms if not set.
+        max_size (int): The maximum number of buffered events.
+        overflow (str): The overflow policy of the stream.
+
+    Attributes:
+        dropped (int): The number of events that were dropped because the
+            buffer was full.
+    """
+
+    overflow_policies = ("block", "drop_oldest", "drop_ephemeral")
+
+    def __init__(
+        self,
+        client,             # type: AsyncClient
+        filter=None,        # type: Union[Tuple[Type], Type, None]
+        room_id=None,       # type: Optional[str]
+        max_size=1000,      # type: int
+        overflow="block",   # type: str
+    ):
+        # type: (...) -> None
+        if overflow not in self.overflow_policies:
+            raise ValueError("Invalid overflow policy {}".format(overflow))
+
+        self.client = client
+        self.filter = filter
+        self.room_id = room_id
+        self.max_size = max(max_size, 1)
+        self.overflow = overflow
+        self.dropped = 0
+        self.closed = False
+
+        # Buffered (room, event, ephemeral) tuples.
+        self._items = deque()  # type: deque
+        self._readable = Event()
+        self._writable = Event()
+        self._writable.set()
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._items)
+
+    @property
+    def full(self):
+        # type: () -> bool
+        """Is the buffer of the stream full."""
+        return len(self._items) >= self.max_size
+
+    def put(self, room, event, ephemeral=False):
+        # type: (MatrixRoom, Any, bool) -> None
+        """Add an event to the stream, applying the overflow policy.
+
+        Events that don't match the room or the filter of the stream are
+        ignored.
+        """
+        if self.closed:
+            return
+
+        if self.room_id is not None and room.room_id != self.room_id:
+            return
+
+        if self.filter is not None and not isinstance(event, self.filter):
+            return
+
+        if self.full:
+            if self.overflow == "drop_oldest":
+                self._items.popleft()
+                self.dropped += 1
+
+            elif self.overflow == "drop_ephemeral":
+                if ephemeral:
+                    self.dropped += 1
+                    return
+
+                for index, item in enumerate(self._items):
+                    if item[2]:
+                        del self._items[index]
+                        self.dropped += 1
+                        break
+
+        self._items.append((room, event, ephemeral))
+        self._readable.set()
+
+        if self.full:
+            self._writable.clear()
+
+    async def wait_writable(self):
+        # type: () -> None
+        """Wait until the buffer of a blocking stream isn't full anymore.
+
+        Returns immediately for streams that drop the oldest events.
+        """
+        if self.overflow == "drop_oldest":
+            return
+
+        while self.full and not self.closed:
+            await self._writable.wait()
+
+    def close(self):
+        # type: () -> None
+        """Unsubscribe the stream from the client.
+
+        Iterating over the stream stops once the already buffered events
+        are consumed.
+        """
+        self.closed = True
+
+        if self in self.client.event_streams:
+            self.client.event_streams.remove(self)
+
+        self._readable.set()
+        self._writable.set()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        # type: () -> Tuple[MatrixRoom, Any]
+        while not self._items:
+            if self.closed:
+                raise StopAsyncIteration
+
+            self._readable.clear()
+            await self._readable.wait()
+
+        room, event, _ = self._items.popleft()
+
+        if not self.full:
+            self._writable.set()
+
+        return room, event
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+
 def client_session(func):
     """Ensure that the Async client has a valid client session."""
     @wraps(func)
@@ -120,6 +405,95 @@ class AsyncClient(Client):
 
         super().__init__(user, device_id, store_path, config)
 
+        self.callback_tasks = CallbackTasks(
+            self.config.max_concurrent_callbacks
+        )
+        self.event_streams = []  # type: List[EventStream]
+
+    def _run_callback(self, room_id, func, *args):
+        if asyncio.iscoroutinefunction(func):
+            # The coroutine is only created once the callback is run.
+            self.callback_tasks.schedule(room_id, partial(func, *args))
+            return
+
+        result = func(*args)
+
+        if inspect.isawaitable(result):
+            self.callback_tasks.schedule(room_id, result)
+
+    def events(
+        self,
+        filter=None,        # type: Union[Tuple[Type], Type, None]
+        room_id=None,       # type: Optional[str]
+        max_size=1000,      # type: int
+        overflow="block",   # type: str
+    ):
+        # type: (...) -> EventStream
+        """Subscribe to the room events of sync responses.
+
+        Any number of streams can be subscribed at the same time, every
+        stream gets its own copy of the events. See EventStream for the
+        overflow policies.
+
+        Args:
+            filter (Type, Tuple[Type], optional): The event type or a tuple of
+                event types the stream should contain, all timeline and
+                ephemeral events if not set.
+            room_id (str, optional): Only add the events of this room to the
+                stream.
+            max_size (int, optional): The maximum number of events that are
+                buffered for the stream. Defaults to 1000.
+            overflow (str, optional): What should happen if the buffer of
+                the stream is full, one of "block", "drop_oldest" and
+                "drop_ephemeral". Defaults to "block".
+
+        Returns a new EventStream, which should be closed once it isn't
+        needed anymore.
+        """
+        stream = EventStream(self, filter, room_id, max_size, overflow)
+        self.event_streams.append(stream)
+        return stream
+
+    def room_events(self, room_id, filter=None, **kwargs):
+        # type: (str, Union[Tuple[Type], Type, None], Any) -> EventStream
+        """Subscribe to the events of a single room.
+
+        Takes the same keyword arguments as events().
+
+        Args:
+            room_id (str): The room whose events the stream should contain.
+            filter (Type, Tuple[Type], optional): The event type or a tuple of
+                event types the stream should contain.
+
+        Returns a new EventStream.
+        """
+        return self.events(filter, room_id, **kwargs)
+
+    def _wants_all_events(self):
+        # type: () -> bool
+        return bool(self.event_streams) or super()._wants_all_events()
+
+    def _publish_event(self, room, event, ephemeral=False):
+        for stream in self.event_streams:
+            stream.put(room, event, ephemeral)
+
+    async def wait_for_event_streams(self):
+        # type: () -> None
+        """Wait until the blocking event streams aren't full anymore."""
+        for stream in list(self.event_streams):
+            await stream.wait_writable()
+
+    async def wait_for_callbacks(self, max_pending=0):
+        # type: (int) -> None
+        """Wait for the scheduled coroutine event callbacks to finish.
+
+        Args:
+            max_pending (int, optional): The number of callbacks that may
+                still be unfinished once this returns. Defaults to 0, which
+                waits for all callbacks.
+        """
+        await self.callback_tasks.wait(max_pending)
+
     def add_response_callback(
         self,
         func,           # type: Coroutine[Any, Any, Response]
@@ -273,6 +647,88 @@ class AsyncClient(Client):
         Returns either a `SyncResponse` if the request was successful or
         a `SyncError` if there was an error with the request.
         """
+        response = await self._fetch_sync(
+            self.next_batch,
+            timeout,
+            sync_filter
+        )
+        self.receive_response(response)
+
+        self.synced.set()
+        self.synced.clear()
+
+        return response
+
+    async def _fetch_sync(self, since, timeout=None, sync_filter=None):
+        # type: (Optional[str], Optional[int], Optional[Dict[Any, Any]]) -> Union[SyncResponse, SyncError]  # noqa
+        """Send a sync request and parse the response.
+
+        The client state isn't updated with the response.
+        """
+        method, path = Api.sync(
+            self.access_token,
+            since=since,
+            timeout=timeout,
+            filter=sync_filter
+        )
+        transport_response = await self.send(method, path)
+        executor = self.sync_executor
+
+        if not executor:
+            return await self.create_matrix_response(
+                SyncResponse,
+                transport_response,
+                (0, self.config.lazy_timeline)
+            )
+
+        # Wait for the worker processes in a thread so that the event loop
+        # isn't blocked while the response is parsed.
+        parsed_dict = await self.parse_body(transport_response)
+        loop = asyncio.get_event_loop()
+
+        response = await loop.run_in_executor(None, partial(
+            SyncResponse.from_dict,
+            parsed_dict,
+            0,
+            self.config.lazy_timeline,
+            executor
+        ))
+        response.transport_response = transport_response
+
+        return response
+
+    @logged_in
+    async def sync_stream(
+            self,
+            timeout=None,      # type: Optional[int]
+            sync_filter=None,  # type: Optional[Dict[Any, Any]]
+            chunk_size=65536   # type: int
+    ):
+        # type: (...) -> AsyncIterator[Union[SyncType, SyncError]]
+        """Synchronise with the server while streaming the response body.
+
+        Unlike `sync()`, the response body isn't loaded into memory as a whole
+        but parsed incrementally while it is downloaded. Every joined room is
+        yielded as a `PartialSyncResponse` as soon as it has been parsed.
+
+        Rooms are applied to the client state before they are yielded, unless
+        they contain Megolm events whose sessions aren't known yet. The keys
+        of those sessions may be part of the to-device events of the response,
+        so these rooms are held back until the whole body was received. The
+        last yielded item is a `SyncResponse` with the rest of the response,
+        it only contains the joined rooms that were held back. A `SyncError`
+        is yielded instead if there was an error with the request, the rooms
+        that were already applied may then be part of the next sync again.
+
+        Args:
+            timeout(int, optional): The maximum time that the server should
+                wait for new events before it should return the request
+                anyways, in milliseconds.
+            filter (Dict[Any, Any], optional): A filter that should be used for
+                this sync request.
+            chunk_size (int, optional): The size of the chunks, in bytes, in
+                which the response body is read.
+        """
         method, path = Api.sync(
             self.access_token,
             since=self.next_batch,
@@ -280,12 +736,32 @@ class AsyncClient(Client):
             filter=sync_filter
         )
 
-        response = await self._send(SyncResponse, method, path)
+        transport_response = await self.send(method, path)
+        stream = SyncStream(self.config.lazy_timeline)
+
+        def handle(parts):
+            for part in parts:
+                if self._handle_streamed_room(part):
+                    for room_id in part.rooms.join:
+                        stream.release(room_id)
+
+            return parts
+
+        async for data in transport_response.content.iter_chunked(chunk_size):
+            for part in handle(stream.feed(data)):
+                yield part
+
+        for part in handle(stream.feed(b"", True)):
+            yield part
+
+        response = stream.finish()
+        response.transport_response = transport_response
+        self.receive_response(response)
 
         self.synced.set()
         self.synced.clear()
 
-        return response
+        yield response
 
     @logged_in
     async def send_to_device_messages(self):
@@ -310,12 +786,34 @@ class AsyncClient(Client):
                         or isinstance(response, cb.filter)):
                     await cb.func(response)
 
+    async def _after_sync(self, responses):
+        # type: (List[Response]) -> None
+        """Send the requests that are due after a sync and run the callbacks.
+
+        The responses of the requests are appended to the given list.
+        """
+        responses += await self.send_to_device_messages()
+
+        if self.should_upload_keys:
+            responses.append(await self.keys_upload())
+
+        if self.should_query_keys:
+            responses.append(await self.keys_query())
+
+        await self.run_response_callbacks(responses)
+
+        await self.wait_for_callbacks(self.config.max_pending_callbacks)
+        await self.wait_for_event_streams()
+
     @logged_in
-    async def sync_forever(self, timeout=None, filter=None):
+    async def sync_forever(self, timeout=None, filter=None, pipeline_depth=0):
         """Continuously sync with the configured homeserver.
 
         This method calls the sync method in a loop. To react to events event
-        callbacks should be configured.
+        callbacks should be configured. Before the next sync request is sent,
+        the loop waits until no more than max_pending_callbacks of the
+        coroutine event callbacks are unfinished and until the consumers of
+        full blocking event streams caught up.
 
         The loop also makes sure to handle other required requests between
         syncs. To react to the responses a request callback should be added.
@@ -326,7 +824,19 @@ class AsyncClient(Client):
                 anyways, in milliseconds.
             filter (Dict[Any, Any], optional): A filter that should be used for
                 this sync request.
+            pipeline_depth (int, optional): The number of sync requests that
+                may be sent ahead while a sync response is processed. The
+                next request only needs the sync token of the previous
+                response, so it can be sent as soon as that response is
+                parsed, overlapping the wait for the server with the
+                decryption and the callbacks of the previous response. The
+                responses are still applied to the client state one after
+                another, in order. Defaults to 0, which waits until a
+                response is fully processed before the next request is sent.
         """
+        if pipeline_depth > 0:
+            await self._sync_pipelined(timeout, filter, pipeline_depth)
+            return
 
         while True:
             try:
@@ -334,15 +844,7 @@ class AsyncClient(Client):
 
                 responses.append(await self.sync(timeout, filter))
 
-                responses += await self.send_to_device_messages()
-
-                if self.should_upload_keys:
-                    responses.append(await self.keys_upload())
-
-                if self.should_query_keys:
-                    responses.append(await self.keys_query())
-
-                await self.run_response_callbacks(responses)
+                await self._after_sync(responses)
 
             except asyncio.CancelledError:
                 break
@@ -355,6 +857,73 @@ class AsyncClient(Client):
                 except asyncio.CancelledError:
                     break
 
+    async def _sync_pipelined(self, timeout, sync_filter, depth):
+        # type: (Optional[int], Optional[Dict[Any, Any]], int) -> None
+        """Sync in a loop, fetching the next responses in a separate task."""
+        fetched = asyncio.Queue()  # type: asyncio.Queue
+        # Every sync request that is sent ahead holds a slot until its
+        # response is taken out of the queue.
+        slots = asyncio.Semaphore(depth)
+
+        async def fetch():
+            since = self.next_batch
+
+            while True:
+                await slots.acquire()
+
+                while True:
+                    try:
+                        response = await self._fetch_sync(
+                            since,
+                            timeout,
+                            sync_filter
+                        )
+                        break
+                    except asyncio.CancelledError:
+                        raise
+                    except ClientConnectionError:
+                        await asyncio.sleep(5)
+                    except Exception as e:
+                        await fetched.put(e)
+                        return
+
+                if isinstance(response, SyncResponse):
+                    since = response.next_batch
+
+                await fetched.put(response)
+
+        fetcher = asyncio.ensure_future(fetch())
+
+        try:
+            while True:
+                response = await fetched.get()
+                slots.release()
+
+                if isinstance(response, Exception):
+                    raise response
+
+                self.receive_response(response)
+
+                self.synced.set()
+                self.synced.clear()
+
+                responses = [response]
+
+                try:
+                    await self._after_sync(responses)
+                except ClientConnectionError:
+                    await self.run_response_callbacks(responses)
+                    await asyncio.sleep(5)
+
+        except asyncio.CancelledError:
+            pass
+
+        finally:
+            # Wait for the cancellation so that the request in flight doesn't
+            # outlive the loop.
+            fetcher.cancel()
+            await asyncio.gather(fetcher, return_exceptions=True)
+
     @logged_in
     @store_loaded
     async def start_key_verification(
@@ -527,12 +1096,7 @@ class AsyncClient(Client):
         Raises LocalProtocolError if the client isn't logged in, if the session
         store isn't loaded or if no key query needs to be performed.
         """
-        # TODO refactor that out into the base client, and use our knowledge of
-        # already queried users to limit the user list.
-        user_list = [
-            user_id for room in self.rooms.values()
-            if room.encrypted for user_id in room.users
-        ]
+        user_list = list(self.encrypted_room_index)
 
         if not user_list:
             raise LocalProtocolError("No key query required.")
@@ -826,11 +1390,24 @@ class AsyncClient(Client):
         )
 
     async def close(self):
-        """Close the underlying http session."""
+        """Close the underlying http session and the sync parsing processes.
+
+        Unfinished coroutine event callbacks are cancelled and the event
+        streams are closed.
+        """
+        await self.callback_tasks.cancel()
+
+        for stream in list(self.event_streams):
+            stream.close()
+
         if self.client_session:
             await self.client_session.close()
             self.client_session = None
 
+        if self._sync_executor:
+            self._sync_executor.shutdown()
+            self._sync_executor = None
+
     @store_loaded
     async def export_keys(self, outfile, passphrase, count=10000):
         """Export all the Megolm decryption keys of this device.
@@ -14,12 +14,16 @@
 # CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN
 # CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
+from collections import defaultdict
 from functools import wraps
-from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type, Union
+from itertools import chain
+from typing import (Any, Callable, DefaultDict, Dict, Iterator, List, Optional,
+                    Set, Tuple, Type, Union)
 
 import attr
 from logbook import Logger
 
+from .._compat import intern
 from ..crypto import ENCRYPTION_ENABLED
 from ..events import (BadEventType, Event, KeyVerificationEvent, MegolmEvent,
                       RoomEncryptedEvent, RoomEncryptionEvent, RoomMemberEvent,
@@ -28,19 +32,22 @@ from ..exceptions import LocalProtocolError, MembersSyncError
 from ..log import logger_group
 from ..responses import (ErrorResponse, JoinedMembersResponse,
                          KeysClaimResponse, KeysQueryResponse,
-                         KeysUploadResponse, LoginResponse,
+                         KeysUploadResponse, LazyEventList, LoginResponse,
                          PartialSyncResponse, Response, RoomForgetResponse,
-                         RoomKeyRequestResponse, RoomMessagesResponse,
-                         ShareGroupSessionResponse, SyncResponse, SyncType,
-                         ToDeviceResponse)
-from ..rooms import MatrixInvitedRoom, MatrixRoom
+                         RoomInfo, RoomKeyRequestResponse,
+                         RoomMessagesResponse, ShareGroupSessionResponse,
+                         SyncResponse, SyncType, ToDeviceResponse)
+from ..rooms import (EncryptedRoomIndex, MatrixInvitedRoom, MatrixRoom,
+                     RoomCache, RoomTimeline, TimelineBudget)
 
 if ENCRYPTION_ENABLED:
     from ..crypto import Olm
-    from ..store import DefaultStore, MatrixStore
+    from ..store import (DefaultStore, MatrixStore, read_snapshot,
+                         write_snapshot)
 
 
 if False:
+    from concurrent.futures import ProcessPoolExecutor
     from ..crypto import OlmDevice, OutgoingKeyRequest, Sas
     from .messages import ToDeviceMessage
 
@@ -94,6 +101,54 @@ class ClientConfig(object):
             used.
         pickle_key: (str, optional): A passphrase that will be used to encrypt
             end to end encryption keys.
+        lazy_timeline (bool, optional): Should the events of sync responses be
+            parsed lazily. If enabled, room events are only parsed when they
+            are accessed, the client itself only parses the events it needs
+            to update the room state if no event callbacks are registered.
+        sync_parse_processes (int, optional): The number of worker processes
+            that should be used to parse the joined rooms of sync responses in
+            parallel. The registered event types and the validation mode are
+            sent to the workers with every sync response, event classes that
+            are registered with register_event_type() need to be importable
+            by the workers. Defaults to 0, which parses sync responses in the
+            calling thread.
+        event_source_policy (str, optional): How much of the source
+            dictionary of room events should be kept after the events are
+            parsed. "keep" keeps the whole source, "shallow" keeps only the
+            content and unsigned parts of it and "drop" discards it, only
+            the content of events that can't rebuild it exactly from their
+            attributes is kept. Both policies keep the type, state_key and
+            room_id of the source. The source of compacted events is
+            reconstructed from the event attributes when it is accessed.
+            Defaults to "keep".
+        store_sync_state (bool, optional): Should the state of the joined and
+            invited rooms and the sync token be saved in the store. The state
+            is restored when the store is loaded, allowing the client to
+            resume syncing instead of doing a full initial sync. Requires
+            encryption to be enabled, since the store is only used then.
+        max_resident_rooms (int, optional): The maximum number of joined
+            rooms that are kept in memory. The least recently used rooms are
+            saved to the store and loaded again once they are accessed.
+            Requires encryption to be enabled, since the store is only used
+            then. Defaults to 0, which keeps all rooms in memory.
+        timeline_size (int, optional): The number of recent events that are
+            kept in the timeline of every joined room, see
+            MatrixRoom.timeline. Defaults to 0, which disables the room
+            timelines.
+        timeline_total_size (int, optional): The maximum number of events
+            that are kept in the timelines of all rooms combined. Once it is
+            exceeded, the oldest events of the least recently updated rooms
+            are dropped. Defaults to 0, which only limits the size of the
+            timeline of every room.
+        max_concurrent_callbacks (int, optional): The maximum number of
+            coroutine event callbacks that are run concurrently. Only used by
+            the AsyncClient. Defaults to 8.
+        max_pending_callbacks (int, optional): The number of coroutine event
+            callbacks that may still be unfinished when sync_forever() sends
+            the next sync request, the loop waits for the callbacks to finish
+            until their number drops to this limit. Only used by the
+            AsyncClient. Defaults to 0, which waits for all the callbacks of
+            a sync response.
 
     Raises an ImportWarning if encryption_enabled is true but the dependencies
     for encryption aren't installed.
@@ -109,6 +164,19 @@ class ClientConfig(object):
 
     store_name = attr.ib(type=str, default="")
     pickle_key = attr.ib(type=str, default="DEFAULT_KEY")
+    lazy_timeline = attr.ib(type=bool, default=False)
+    sync_parse_processes = attr.ib(type=int, default=0)
+    event_source_policy = attr.ib(
+        type=str,
+        default="keep",
+        validator=attr.validators.in_(("keep", "shallow", "drop"))
+    )
+    store_sync_state = attr.ib(type=bool, default=False)
+    max_resident_rooms = attr.ib(type=int, default=0)
+    timeline_size = attr.ib(type=int, default=0)
+    timeline_total_size = attr.ib(type=int, default=0)
+    max_concurrent_callbacks = attr.ib(type=int, default=8)
+    max_pending_callbacks = attr.ib(type=int, default=0)
 
     def __attrs_post_init__(self):
         if not ENCRYPTION_ENABLED and self.encryption_enabled:
@@ -129,6 +197,8 @@ class Client(object):
        rooms(Dict[str, MatrixRoom)): A dictionary containing a mapping of room
            ids to MatrixRoom objects. All the rooms a user is joined to will be
            here after a sync.
+       encrypted_room_index(EncryptedRoomIndex): An index of the encrypted
+           rooms the users we share rooms with are members of.
 
     Args:
        user (str): User that will be used to log in.
@@ -160,14 +230,58 @@ class Client(object):
         self.access_token = ""
         self.next_batch = ""
 
-        self.rooms = dict()  # type: Dict[str, MatrixRoom]
+        if self.config.max_resident_rooms:
+            self.rooms = RoomCache(
+                self.config.max_resident_rooms,
+                self._load_room,
+                self._save_room
+            )  # type: Dict[str, MatrixRoom]
+        else:
+            self.rooms = dict()
         self.invited_rooms = dict()  # type: Dict[str, MatrixRoom]
         self.encrypted_rooms = set()  # type: Set[str]
+        self.encrypted_room_index = EncryptedRoomIndex()
+        self._timeline_budget = None  # type: Optional[TimelineBudget]
+
+        if self.config.timeline_total_size:
+            self._timeline_budget = TimelineBudget(
+                self.config.timeline_total_size
+            )
 
         self.event_callbacks = []      # type: List[ClientCallback]
         self.ephemeral_callbacks = []  # type: List[ClientCallback]
         self.to_device_callbacks = []  # type: List[ClientCallback]
 
+        # Callbacks resolved per event class, see _callbacks_for().
+        self._event_callback_index = {} \
+            # type: Dict[Type, List[ClientCallback]]
+        self._ephemeral_callback_index = {} \
+            # type: Dict[Type, List[ClientCallback]]
+        self._to_device_callback_index = {} \
+            # type: Dict[Type, List[ClientCallback]]
+
+        self._sync_executor = None  # type: Optional[ProcessPoolExecutor]
+
+    @property
+    def sync_executor(self):
+        # type: () -> Optional[ProcessPoolExecutor]
+        """Process pool that is used to parse sync responses.
+
+        The pool is created on first use. This is None unless the
+        sync_parse_processes option of the client configuration is set.
+        """
+        if not self.config.sync_parse_processes:
+            return None
+
+        if not self._sync_executor:
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._sync_executor = ProcessPoolExecutor(
+                self.config.sync_parse_processes
+            )
+
+        return self._sync_executor
+
     @property
     def logged_in(self):
         # type: () -> bool
@@ -278,6 +392,10 @@ class Client(object):
         Raises LocalProtocolError if the session_path, user_id and devic_id are
             not set.
         """
+        self._open_store(load_state=True)
+
+    def _open_store(self, load_state):
+        # type: (bool) -> None
         if not self.store_path:
             raise LocalProtocolError("Store path is not defined.")
 
@@ -301,9 +419,103 @@ class Client(object):
             )
             assert self.store
 
-            self.olm = Olm(self.user_id, self.device_id, self.store)
+            self.olm = Olm(
+                self.user_id,
+                self.device_id,
+                self.store,
+                self.config.event_source_policy,
+                load_state
+            )
+
+            if not load_state:
+                return
+
             self.encrypted_rooms = self.store.load_encrypted_rooms()
 
+            if self.config.store_sync_state:
+                rooms, invited_rooms = self.store.load_rooms(
+                    self.encrypted_room_index
+                )
+                if isinstance(self.rooms, RoomCache):
+                    self.rooms.add_stored(rooms)
+                else:
+                    self.rooms.update(rooms)
+
+                self.invited_rooms.update(invited_rooms)
+                self.next_batch = (self.store.load_sync_token()
+                                   or self.next_batch)
+
+            # Device list changes of the tracked users are only reported by
+            # an incremental sync, without a sync token their devices need to
+            # be queried again.
+            if not self.next_batch:
+                self.olm.users_for_key_query.update(self.olm.tracked_users)
+
+    def _load_room(self, room_id):
+        # type: (str) -> Optional[MatrixRoom]
+        """Load a room that was evicted from the room cache."""
+        if not self.store:
+            return None
+
+        return self.store.load_room(room_id, self.encrypted_room_index)
+
+    def _save_room(self, room):
+        # type: (MatrixRoom) -> bool
+        """Save a room that should be evicted from the room cache."""
+        if not self.store:
+            return False
+
+        self.store.save_rooms([room])
+
+        if room.timeline:
+            room.timeline.clear()
+
+        return True
+
+    @store_loaded
+    def snapshot(self, path):
+        # type: (str) -> None
+        """Write a snapshot of the client state to a file.
+
+        The snapshot contains the joined and invited rooms, the encrypted
+        rooms, the sync token and the Olm device, session and group session
+        stores. It can be restored using restore(), which is a lot faster
+        than loading the same state from the store.
+
+        The Olm account and the access token are not part of the snapshot.
+
+        Args:
+            path (str): The path of the snapshot file, an existing file is
+                replaced atomically.
+        """
+        write_snapshot(self, path)
+
+    def restore(self, path):
+        # type: (str) -> None
+        """Restore the client state from a snapshot file.
+
+        This can be used instead of load_store(), the Olm account is loaded
+        from the store while the rest of the state is restored from the
+        snapshot. Olm and Megolm sessions are only unpickled once they are
+        used.
+
+        The user id and device id of the client need to be set, the access
+        token needs to be restored separately.
+
+        Args:
+            path (str): The path of the snapshot file that was written using
+                snapshot().
+
+        Raises LocalProtocolError if encryption is disabled, if the store
+            can't be loaded or if the snapshot doesn't belong to this client.
+        """
+        if not self.config.encryption_enabled:
+            raise LocalProtocolError("Snapshots require encryption to be "
+                                     "enabled.")
+
+        self._open_store(load_state=False)
+        read_snapshot(self, path)
+
     def room_contains_unverified(self, room_id):
         # type: (str) -> bool
         """Check if a room contains unverified devices.
@@ -337,6 +549,17 @@ class Client(object):
             return
         self.invalidate_outbound_session(room_id)
 
+    def _update_session_for_member_event(self, room, event):
+        # type: (MatrixRoom, RoomMemberEvent) -> None
+        if not self.olm:
+            return
+
+        self.olm.update_group_session_member(
+            room.room_id,
+            event.state_key,
+            event.state_key in room.users
+        )
+
     @store_loaded
     def invalidate_outbound_session(self, room_id):
         """Explicitely remove encryption keys for a room.
@@ -361,9 +584,8 @@ class Client(object):
         # type: (OlmDevice) -> None
         assert self.olm
 
-        for room in self.rooms.values():
-            if device.user_id in room.users:
-                self.invalidate_outbound_session(room.room_id)
+        for room_id in self.encrypted_room_index.rooms(device.user_id):
+            self.invalidate_outbound_session(room_id)
 
     @store_loaded
     def verify_device(self, device):
@@ -519,6 +741,100 @@ class Client(object):
         assert self.olm
         return self.olm.decrypt_megolm_event(event)
 
+    def _room_events(self, events):
+        # type: (List[Any]) -> Iterator[Tuple[int, Any]]
+        """Iterate over the room events of a sync response.
+
+        Events of a lazy event list are only parsed if the room state depends
+        on them, if they need to be decrypted, or if there are event callbacks
+        or room timelines that need to see them.
+
+        The source of the events is compacted according to the
+        event_source_policy of the client config.
+        """
+        if isinstance(events, LazyEventList) and not self._wants_all_events():
+            items = events.items(
+                MatrixRoom.state_event_types | {"m.room.encrypted"}
+            )
+        else:
+            items = enumerate(events)
+
+        policy = self.config.event_source_policy
+
+        if policy == "keep":
+            return items
+
+        return self._compacted_events(items, policy)
+
+    def _wants_all_events(self):
+        # type: () -> bool
+        """Are all the room events of sync responses needed.
+
+        Returns True if there are event callbacks or room timelines that need
+        to see every event, False otherwise.
+        """
+        return bool(self.event_callbacks or self.config.timeline_size)
+
+    @staticmethod
+    def _compacted_events(items, policy):
+        # type: (Iterator[Tuple[int, Any]], str) -> Iterator[Tuple[int, Any]]
+        for index, event in items:
+            if isinstance(event, Event):
+                event.compact_source(policy)
+
+            yield index, event
+
+    @staticmethod
+    def _callbacks_for(
+        callbacks,  # type: List[ClientCallback]
+        index,      # type: Dict[Type, List[ClientCallback]]
+        event,      # type: Any
+    ):
+        # type: (...) -> List[ClientCallback]
+        """Get the callbacks that should be run for an event.
+
+        The callbacks whose filter matches the class of the event are resolved
+        once per event class and cached in the index. The index needs to be
+        cleared if the list of callbacks changes.
+        """
+        event_class = type(event)
+
+        try:
+            return index[event_class]
+        except KeyError:
+            matching = [
+                cb for cb in callbacks
+                if cb.filter is None or issubclass(event_class, cb.filter)
+            ]
+            index[event_class] = matching
+            return matching
+
+    def _run_callback(self, room_id, func, *args):
+        # type: (Optional[str], Callable, Any) -> None
+        """Run an event callback.
+
+        Args:
+            room_id (str, optional): The id of the room the event belongs to,
+                None for to-device events.
+            func (Callable): The callback that should be run.
+            *args: The arguments of the callback.
+        """
+        func(*args)
+
+    def _publish_event(self, room, event, ephemeral=False):
+        # type: (MatrixRoom, Any, bool) -> None
+        """Publish a room event of a sync response to its subscribers.
+
+        Called for every room event after the event callbacks ran, the base
+        client has no subscribers.
+
+        Args:
+            room (MatrixRoom): The room the event belongs to.
+            event (Any): The timeline or ephemeral event.
+            ephemeral (bool): Is the event an ephemeral event.
+        """
+        pass
+
     def _handle_sync(self, response):
         # type: (SyncType) -> None
         # We already recieved such a sync response, do nothing in that case.
@@ -530,6 +846,8 @@ class Client(object):
 
         encrypted_rooms = set()
         decrypted_to_device = []  # type: ignore
+        # The users whose membership changed in the joined rooms.
+        changed_members = defaultdict(set)  # type: DefaultDict[str, Set[str]]
 
         for index, to_device_event in enumerate(response.to_device_events):
             if isinstance(to_device_event, RoomEncryptedEvent):
@@ -544,10 +862,12 @@ class Client(object):
                 if self.olm:
                     self.olm.handle_key_verification(to_device_event)
 
-            for cb in self.to_device_callbacks:
-                if (cb.filter is None
-                        or isinstance(to_device_event, cb.filter)):
-                    cb.func(to_device_event)
+            for cb in self._callbacks_for(
+                self.to_device_callbacks,
+                self._to_device_callback_index,
+                to_device_event
+            ):
+                self._run_callback(None, cb.func, to_device_event)
 
         # Replace the encrypted to_device events with decrypted ones
         for decrypted_event in decrypted_to_device:
@@ -558,7 +878,7 @@ class Client(object):
         for room_id, info in response.rooms.invite.items():
             if room_id not in self.invited_rooms:
                 logger.info("New invited room {}".format(room_id))
-                self.invited_rooms[room_id] = MatrixInvitedRoom(
+                self.invited_rooms[intern(room_id)] = MatrixInvitedRoom(
                     room_id, self.user_id
                 )
 
@@ -569,115 +889,265 @@ class Client(object):
 
         # Handle joined rooms
         for room_id, join_info in response.rooms.join.items():
-            if room_id in self.invited_rooms:
-                del self.invited_rooms[room_id]
-
-            if room_id not in self.rooms:
-                logger.info("New joined room {}".format(room_id))
-                self.rooms[room_id] = MatrixRoom(
-                    room_id,
-                    self.user_id,
-                    room_id in self.encrypted_rooms
-                )
+            self._handle_joined_room(
+                room_id,
+                join_info,
+                encrypted_rooms,
+                changed_members
+            )
 
-            room = self.rooms[room_id]
+        # Handle left rooms, their state isn't needed anymore.
+        for room_id in response.rooms.leave:
+            logger.info("Left room {}".format(room_id))
+            self._remove_room(room_id)
 
-            for event in join_info.state:
-                if isinstance(event, RoomEncryptionEvent):
-                    encrypted_rooms.add(room_id)
+        self.encrypted_rooms.update(encrypted_rooms)
 
-                if isinstance(event, RoomMemberEvent):
-                    if room.handle_membership(event):
-                        self._invalidate_session_for_member_event(room_id)
-                else:
-                    room.handle_event(event)
+        if self.store:
+            self.store.save_encrypted_rooms(encrypted_rooms)
 
-            if join_info.summary:
-                room.update_summary(join_info.summary)
+            if self.config.store_sync_state:
+                self._save_sync_state(response, changed_members)
 
-            decrypted_events = []
+        if self.olm:
+            expired_verifications = self.olm.clear_verifications()
 
-            for index, event in enumerate(join_info.timeline.events):
-                if isinstance(event, MegolmEvent) and self.olm:
-                    event.room_id = room_id
-                    new_event = self.olm.decrypt_event(event)
-                    if new_event:
-                        event = new_event
-                        decrypted_events.append((index, new_event))
+            for event in expired_verifications:
+                for cb in self._callbacks_for(
+                    self.to_device_callbacks,
+                    self._to_device_callback_index,
+                    event
+                ):
+                    self._run_callback(None, cb.func, event)
 
-                elif isinstance(event, RoomEncryptionEvent):
-                    encrypted_rooms.add(room_id)
+            self.olm.uploaded_key_count = (
+                response.device_key_count.signed_curve25519)
 
-                if isinstance(event, RoomMemberEvent):
-                    if room.handle_membership(event):
-                        self._invalidate_session_for_member_event(room_id)
-                else:
-                    room.handle_event(event)
+            changed_users = set(
+                user for user in chain(
+                    response.device_list.changed,
+                    response.device_list.left
+                ) if user in self.encrypted_room_index
+            )
+
+            self.olm.add_changed_users(changed_users)
+
+    def _handle_joined_room(
+        self,
+        room_id,          # type: str
+        join_info,        # type: RoomInfo
+        encrypted_rooms,  # type: Set[str]
+        changed_members   # type: DefaultDict[str, Set[str]]
+    ):
+        # type: (...) -> None
+        """Update a joined room with its part of a sync response.
 
-                for cb in self.event_callbacks:
-                    if (cb.filter is None or isinstance(event, cb.filter)):
-                        cb.func(room, event)
+        The ids of rooms that turned out to be encrypted are added to
+        encrypted_rooms, the users whose membership changed to
+        changed_members.
+        """
+        if room_id in self.invited_rooms:
+            del self.invited_rooms[room_id]
 
-            # Replace the Megolm events with decrypted ones
-            for decrypted_event in decrypted_events:
-                index, event = decrypted_event
-                join_info.timeline.events[index] = event
+        if room_id not in self.rooms:
+            logger.info("New joined room {}".format(room_id))
+            self.rooms[intern(room_id)] = MatrixRoom(
+                room_id,
+                self.user_id,
+                room_id in self.encrypted_rooms,
+                self.encrypted_room_index
+            )
 
-            for event in join_info.ephemeral:
-                room.handle_ephemeral_event(event)
+        room = self.rooms[room_id]
 
-                for cb in self.ephemeral_callbacks:
-                    if (cb.filter is None or isinstance(event, cb.filter)):
-                        cb.func(room, event)
+        for _, event in self._room_events(join_info.state):
+            if isinstance(event, RoomEncryptionEvent):
+                encrypted_rooms.add(room_id)
 
-            if room.encrypted and self.olm is not None:
-                self.olm.update_tracked_users(room)
+            if isinstance(event, RoomMemberEvent):
+                changed_members[room_id].add(event.state_key)
 
-        self.encrypted_rooms.update(encrypted_rooms)
+                if room.handle_membership(event):
+                    self._invalidate_session_for_member_event(room_id)
 
-        if self.store:
-            self.store.save_encrypted_rooms(encrypted_rooms)
+                self._update_session_for_member_event(room, event)
+            else:
+                room.handle_event(event)
 
-        if self.olm:
-            expired_verifications = self.olm.clear_verifications()
+        if join_info.summary:
+            room.update_summary(join_info.summary)
 
-            for event in expired_verifications:
-                for cb in self.to_device_callbacks:
-                    if (cb.filter is None
-                            or isinstance(event, cb.filter)):
-                        cb.func(event)
+        if self.config.timeline_size and room.timeline is None:
+            room.timeline = RoomTimeline(
+                self.config.timeline_size,
+                self._timeline_budget
+            )
 
-            changed_users = set()
-            self.olm.uploaded_key_count = (
-                response.device_key_count.signed_curve25519)
+        if room.timeline is not None and join_info.timeline.limited:
+            room.timeline.add_gap(join_info.timeline.prev_batch)
+
+        decrypted_events = []
 
-            for user in response.device_list.changed:
-                for room in self.rooms.values():
-                    if not room.encrypted:
-                        continue
+        for index, event in self._room_events(join_info.timeline.events):
+            if isinstance(event, MegolmEvent) and self.olm:
+                event.room_id = room_id
+                new_event = self.olm.decrypt_event(event)
+                if new_event:
+                    event = new_event
+                    decrypted_events.append((index, new_event))
 
-                    if user in room.users:
-                        changed_users.add(user)
+            elif isinstance(event, RoomEncryptionEvent):
+                encrypted_rooms.add(room_id)
 
-            for user in response.device_list.left:
-                for room in self.rooms.values():
-                    if not room.encrypted:
-                        continue
+            if isinstance(event, RoomMemberEvent):
+                changed_members[room_id].add(event.state_key)
 
-                    if user in room.users:
-                        changed_users.add(user)
+                if room.handle_membership(event):
+                    self._invalidate_session_for_member_event(room_id)
 
-            self.olm.add_changed_users(changed_users)
+                self._update_session_for_member_event(room, event)
+            else:
+                room.handle_event(event)
+
+            if room.timeline is not None:
+                room.timeline.append(event)
+
+            for cb in self._callbacks_for(
+                self.event_callbacks,
+                self._event_callback_index,
+                event
+            ):
+                self._run_callback(room_id, cb.func, room, event)
+
+            self._publish_event(room, event)
+
+        # Replace the Megolm events with decrypted ones
+        for decrypted_event in decrypted_events:
+            index, event = decrypted_event
+            join_info.timeline.events[index] = event
+
+        for event in join_info.ephemeral:
+            room.handle_ephemeral_event(event)
+
+            for cb in self._callbacks_for(
+                self.ephemeral_callbacks,
+                self._ephemeral_callback_index,
+                event
+            ):
+                self._run_callback(room_id, cb.func, room, event)
+
+            self._publish_event(room, event, ephemeral=True)
+
+        if room.encrypted and self.olm is not None:
+            self.olm.update_tracked_users(room)
+
+    def _room_keys_known(self, room_id, join_info):
+        # type: (str, RoomInfo) -> bool
+        """Are the Megolm sessions of the encrypted room events known."""
+        if not self.olm:
+            return True
+
+        events = join_info.timeline.events
+
+        if isinstance(events, LazyEventList):
+            events = (
+                event for _, event in events.items({"m.room.encrypted"})
+            )
+
+        store = self.olm.inbound_group_store
+
+        for event in events:
+            if not isinstance(event, MegolmEvent):
+                continue
+
+            if not store.get(room_id, event.sender_key, event.session_id):
+                return False
+
+        return True
+
+    def _handle_streamed_room(self, response):
+        # type: (PartialSyncResponse) -> bool
+        """Handle a joined room of a streamed sync response right away.
+
+        Rooms with Megolm events whose sessions aren't known yet are left for
+        the complete response, the keys of the sessions may be part of its
+        to-device events.
+
+        Args:
+            response (PartialSyncResponse): The partial response that
+                contains the room, see `SyncStream`.
+
+        Returns True if the room was handled, False otherwise.
+        """
+        for room_id, join_info in response.rooms.join.items():
+            if not self._room_keys_known(room_id, join_info):
+                return False
+
+        encrypted_rooms = set()  # type: Set[str]
+        changed_members = defaultdict(set)  # type: DefaultDict[str, Set[str]]
+
+        for room_id, join_info in response.rooms.join.items():
+            self._handle_joined_room(
+                room_id,
+                join_info,
+                encrypted_rooms,
+                changed_members
+            )
+
+        self.encrypted_rooms.update(encrypted_rooms)
+
+        if self.store:
+            self.store.save_encrypted_rooms(encrypted_rooms)
+
+            if self.config.store_sync_state:
+                self._save_sync_state(response, changed_members)
+
+        return True
+
+    def _save_sync_state(self, response, changed_members):
+        # type: (SyncType, Dict[str, Set[str]]) -> None
+        """Save the rooms that the sync response touched.
+
+        Only the members of the joined rooms whose membership changed are
+        saved, the sync token is saved once the whole response is handled.
+        Rooms that were evicted from the room cache were already saved as a
+        whole when they were evicted.
+        """
+        if isinstance(self.rooms, RoomCache):
+            is_resident = self.rooms.is_resident
+        else:
+            is_resident = self.rooms.__contains__
+
+        self.store.save_rooms(
+            self.invited_rooms[room_id]
+            for room_id in response.rooms.invite
+            if room_id in self.invited_rooms
+        )
+        self.store.save_rooms(
+            (
+                self.rooms[room_id] for room_id in response.rooms.join
+                if is_resident(room_id)
+            ),
+            changed_members
+        )
+
+        if isinstance(response, SyncResponse):
+            self.store.save_sync_token(response.next_batch)
 
     def _handle_messages_response(self, response):
         decrypted_events = []
 
+        policy = self.config.event_source_policy
+
         for index, event in enumerate(response.chunk):
             if isinstance(event, MegolmEvent) and self.olm:
                 new_event = self.olm.decrypt_event(event)
                 if new_event:
                     decrypted_events.append((index, new_event))
 
+            elif isinstance(event, Event):
+                event.compact_source(policy)
+
         for decrypted_event in decrypted_events:
             index, event = decrypted_event
             response.chunk[index] = event
@@ -693,19 +1163,13 @@ class Client(object):
             session = self.olm.outbound_group_sessions.get(room_id, None)
             room = self.rooms.get(room_id, None)
 
-            session.users_shared_with.update(response.users_shared_with)
-
-            if not session and not room:
+            if not session or not room:
                 return
 
-            users = room.users
+            session.mark_shared_with(response.users_shared_with)
 
-            for user_id in users:
-                for device in self.device_store.active_user_devices(user_id):
-                    user = (user_id, device.id)
-                    if (user not in session.users_shared_with
-                            and user not in session.users_ignored):
-                        return
+            if session.users_pending:
+                return
 
             logger.info("Marking outbound group session for room {} "
                         "as shared".format(room_id))
@@ -713,9 +1177,8 @@ class Client(object):
 
         elif isinstance(response, KeysQueryResponse):
             for user_id in response.changed:
-                for room in self.rooms.values():
-                    if room.encrypted and user_id in room.users:
-                        self.invalidate_outbound_session(room.room_id)
+                for room_id in self.encrypted_room_index.rooms(user_id):
+                    self.invalidate_outbound_session(room_id)
 
     def _handle_joined_members(self, response):
         if response.room_id not in self.rooms:
@@ -728,20 +1191,60 @@ class Client(object):
                 member.user_id, member.display_name, member.avatar_url
             )
 
+            if self.olm:
+                self.olm.update_group_session_member(
+                    room.room_id,
+                    member.user_id,
+                    True
+                )
+
         if room.encrypted and self.olm is not None:
             self.olm.update_tracked_users(room)
 
-    def _handle_room_forget_response(self, response):
-        self.encrypted_rooms.discard(response.room_id)
+        if self.store and self.config.store_sync_state:
+            self.store.save_rooms([room])
+
+    def _remove_room(self, room_id):
+        # type: (str) -> Optional[MatrixRoom]
+        """Remove the state of a room that we left or forgot.
+
+        Returns the removed room if we were joined to it, None otherwise.
+        """
+        self.invited_rooms.pop(room_id, None)
+
+        if isinstance(self.rooms, RoomCache):
+            # Evicted rooms aren't loaded again only to be removed, their
+            # members are looked up in the store instead.
+            evicted = (room_id in self.rooms
+                       and not self.rooms.is_resident(room_id))
+            room = self.rooms.discard(room_id)
+        else:
+            evicted = False
+            room = self.rooms.pop(room_id, None)
 
-        if response.room_id in self.rooms:
-            room = self.rooms.pop(response.room_id)
+        if room:
+            for user_id in room.users:
+                self.encrypted_room_index.remove(user_id, room.room_id)
 
-            if room.encrypted and self.store:
-                self.store.delete_encrypted_room(room.room_id)
+            if room.timeline:
+                room.timeline.clear()
 
-        elif response.room_id in self.invited_rooms:
-            del self.invited_rooms[response.room_id]
+        elif evicted and self.store:
+            for user_id in self.store.load_room_members(room_id):
+                self.encrypted_room_index.remove(user_id, room_id)
+
+        if self.store:
+            self.store.delete_room(room_id)
+
+        return room
+
+    def _handle_room_forget_response(self, response):
+        encrypted = response.room_id in self.encrypted_rooms
+        self.encrypted_rooms.discard(response.room_id)
+        self._remove_room(response.room_id)
+
+        if encrypted and self.store:
+            self.store.delete_encrypted_room(response.room_id)
 
     def receive_response(self, response):
         # type: (Response) -> None
@@ -899,16 +1402,31 @@ class Client(object):
         # type: (Callable[[MatrixRoom, Event], None], Tuple[Type]) -> None
         """Add a callback that will be executed on room events.
 
+        With the AsyncClient the callback can also be a coroutine function.
+        The coroutines are run as tasks, the callbacks of a room are run one
+        after another in the order of the events, while the callbacks of
+        different rooms run concurrently. The number of callbacks that run at
+        the same time is limited by the max_concurrent_callbacks option of the
+        client configuration.
+
+        Coroutine callbacks receive the live MatrixRoom object. Since they may
+        run after the client handled later events of the same or of a
+        following sync response, the room state can already include changes of
+        events that come after the event the callback is called for.
+
+        Exceptions raised by coroutine callbacks are logged.
+
         Args:
-            callback (Callable[MatrixRoom, Event]): A function that will be
-                called if the event type in the filter argument is found in a
-                room timeline.
+            callback (Callable[MatrixRoom, Event]): A function or coroutine
+                function that will be called if the event type in the filter
+                argument is found in a room timeline.
             filter (Type, Tuple[Type]): The event type or a tuple containing
                 multiple types for which the function will be called.
 
         """
         cb = ClientCallback(callback, filter)
         self.event_callbacks.append(cb)
+        self._event_callback_index.clear()
 
     def add_ephermeral_callback(self, callback, filter):
         # type: (Callable[[MatrixRoom, Event], None], Tuple[Type]) -> None
@@ -924,6 +1442,7 @@ class Client(object):
         """
         cb = ClientCallback(callback, filter)
         self.ephemeral_callbacks.append(cb)
+        self._ephemeral_callback_index.clear()
 
     def add_to_device_callback(self, callback, filter):
         # type: (Callable[[ToDeviceEvent], None], Tuple[Type]) -> None
@@ -939,6 +1458,7 @@ class Client(object):
         """
         cb = ClientCallback(callback, filter)
         self.to_device_callbacks.append(cb)
+        self._to_device_callback_index.clear()
 
     @store_loaded
     def create_key_verification(self, device):
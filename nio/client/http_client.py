@@ -483,10 +483,7 @@ class HttpClient(Client):
         Returns a unique uuid that identifies the request and the bytes that
         should be sent to the socket.
         """
-        user_list = [
-            user_id for room in self.rooms.values()
-            if room.encrypted for user_id in room.users
-        ]
+        user_list = list(self.encrypted_room_index)
 
         if not user_list:
             raise LocalProtocolError("No key query required.")
@@ -903,7 +900,13 @@ class HttpClient(Client):
             timeout
         )
 
-        return self._send(request, RequestInfo(SyncResponse))
+        return self._send(
+            request,
+            RequestInfo(
+                SyncResponse,
+                (0, self.config.lazy_timeline, self.sync_executor)
+            )
+        )
 
     @staticmethod
     def _create_response(request_info, transport_response, max_events=0):
@@ -15,7 +15,8 @@
 # CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
 from collections import defaultdict
-from typing import DefaultDict, Dict, Iterator, List, Optional
+from typing import (Callable, DefaultDict, Dict, Iterator, List, Optional,
+                    Tuple)
 
 if False:
     from .sessions import OlmDevice, InboundGroupSession, Session
@@ -26,9 +27,42 @@ class SessionStore(object):
         # type: () -> None
         self._entries = defaultdict(list) \
             # type: DefaultDict[str, List[Session]]
+        # Loaders of sessions that are only unpickled once their sender key
+        # is accessed, see add_pending().
+        self._pending = dict() \
+            # type: Dict[str, List[Callable[[], Session]]]
+
+    def add_pending(self, sender_key, loader):
+        # type: (str, Callable[[], Session]) -> None
+        """Add a session that is only loaded once its sender key is accessed.
+
+        Args:
+            sender_key (str): The curve25519 key of the session owner.
+            loader (Callable[[], Session]): Function returning the session.
+        """
+        self._pending.setdefault(sender_key, []).append(loader)
+
+    def _load_pending(self, sender_key=None):
+        # type: (Optional[str]) -> None
+        if not self._pending:
+            return
+
+        if sender_key is None:
+            keys = list(self._pending)
+        elif sender_key in self._pending:
+            keys = [sender_key]
+        else:
+            return
+
+        for key in keys:
+            sessions = self._entries[key]
+            sessions.extend(loader() for loader in self._pending.pop(key))
+            sessions.sort(key=lambda x: x.id)
 
     def add(self, sender_key, session):
         # type: (str, Session) -> bool
+        self._load_pending(sender_key)
+
         if session in self._entries[sender_key]:
             return False
 
@@ -38,18 +72,24 @@ class SessionStore(object):
 
     def __iter__(self):
         # type: () -> Iterator[Session]
+        self._load_pending()
+
         for session_list in self._entries.values():
             for session in session_list:
                 yield session
 
     def values(self):
+        self._load_pending()
         return self._entries.values()
 
     def items(self):
+        self._load_pending()
         return self._entries.items()
 
     def get(self, sender_key):
         # type: (str) -> Optional[Session]
+        self._load_pending(sender_key)
+
         if self._entries[sender_key]:
             return self._entries[sender_key][0]
 
@@ -57,15 +97,50 @@ class SessionStore(object):
 
     def __getitem__(self, sender_key):
         # type: (str) -> List[Session]
+        self._load_pending(sender_key)
         return self._entries[sender_key]
 
 
 class GroupSessionStore(object):
     def __init__(self):
         self._entries = defaultdict(lambda: defaultdict(dict))
+        # Loaders of sessions that are only unpickled once they are accessed,
+        # see add_pending().
+        self._pending = dict() \
+            # type: Dict[Tuple[str, str, str], Callable[[], InboundGroupSession]]  # noqa
+
+    def add_pending(self, room_id, sender_key, session_id, loader):
+        # type: (str, str, str, Callable[[], InboundGroupSession]) -> None
+        """Add a session that is only loaded once it is accessed.
+
+        Args:
+            room_id (str): The room the session belongs to.
+            sender_key (str): The curve25519 key of the session creator.
+            session_id (str): The unique id of the session.
+            loader (Callable[[], InboundGroupSession]): Function returning
+                the session.
+        """
+        self._pending[(room_id, sender_key, session_id)] = loader
+
+    def _load_pending(self, room_id=None):
+        # type: (Optional[str]) -> None
+        if not self._pending:
+            return
+
+        keys = [
+            key for key in self._pending
+            if room_id is None or key[0] == room_id
+        ]
+
+        for key in keys:
+            room, sender_key, session_id = key
+            session = self._pending.pop(key)()
+            self._entries[room][sender_key][session_id] = session
 
     def __iter__(self):
         # type: () -> Iterator[InboundGroupSession]
+        self._load_pending()
+
         for room_sessions in self._entries.values():
             for sender_sessions in room_sessions.values():
                 for session in sender_sessions.values():
@@ -75,6 +150,9 @@ class GroupSessionStore(object):
         # type: (InboundGroupSession) -> bool
         room_id = session.room_id
         sender_key = session.sender_key
+        # A newly added session replaces a pending one with the same id.
+        self._pending.pop((room_id, sender_key, session.id), None)
+
         if session in self._entries[room_id][sender_key].values():
             return False
 
@@ -83,6 +161,12 @@ class GroupSessionStore(object):
 
     def get(self, room_id, sender_key, session_id):
         # type: (str, str, str) -> Optional[InboundGroupSession]
+        if self._pending:
+            loader = self._pending.pop((room_id, sender_key, session_id), None)
+
+            if loader:
+                self._entries[room_id][sender_key][session_id] = loader()
+
         if session_id in self._entries[room_id][sender_key]:
             return self._entries[room_id][sender_key][session_id]
 
@@ -90,6 +174,7 @@ class GroupSessionStore(object):
 
     def __getitem__(self, room_id):
         # type: (str) -> DefaultDict[str, Dict[str, InboundGroupSession]]
+        self._load_pending(room_id)
         return self._entries[room_id]
 
 
@@ -70,10 +70,15 @@ class Olm(object):
         user_id,    # type: str
         device_id,  # type: str
         store,      # type: MatrixStore
+        event_source_policy="keep",  # type: str
+        load_state=True,  # type: bool
     ):
         # type: (...) -> None
         self.user_id = user_id
         self.device_id = device_id
+        # How much of the source of decrypted events is kept, see
+        # Event.compact_source().
+        self.event_source_policy = event_source_policy
         self.uploaded_key_count = None  # type: Optional[int]
         self.users_for_key_query = set()   # type: Set[str]
 
@@ -107,7 +112,9 @@ class Olm(object):
                         self.user_id, self.device_id))
             account = OlmAccount()
             self.save_account(account)
-        else:
+        elif load_state:
+            # Otherwise the state is restored from a snapshot, see
+            # Client.restore().
             self.load()
 
         self.account = account  # type: OlmAccount
@@ -272,6 +279,7 @@ class Olm(object):
         # type: (KeysQueryResponse) -> None
         changed = defaultdict(dict)  \
             # type: DefaultDict[str, Dict[str, OlmDevice]]
+        new_tracked_users = set()  # type: Set[str]
 
         for user_id, device_dict in response.device_keys.items():
             try:
@@ -279,7 +287,9 @@ class Olm(object):
             except KeyError:
                 pass
 
-            self.tracked_users.add(user_id)
+            if user_id not in self.tracked_users:
+                self.tracked_users.add(user_id)
+                new_tracked_users.add(user_id)
 
             for device_id, payload in device_dict.items():
                 if device_id == self.device_id:
@@ -395,6 +405,8 @@ class Olm(object):
                 changed[user_id][device_id] = device
 
         self.store.save_device_keys(changed)
+        self.store.save_tracked_users(new_tracked_users)
+        self._update_pending_recipients(changed)
         response.changed = changed
 
     def handle_response(self, response):
@@ -415,6 +427,58 @@ class Olm(object):
             self.outgoing_key_requests[response.request_id] = key_request
             self.store.add_outgoing_key_request(key_request)
 
+    def _update_pending_recipients(self, changed):
+        # type: (Dict[str, Dict[str, OlmDevice]]) -> None
+        """Add or remove changed devices from the unshared group sessions."""
+        for session in self.outbound_group_sessions.values():
+            if session.shared or session.recipients is None:
+                continue
+
+            for user_id, devices in changed.items():
+                if user_id not in session.recipients:
+                    continue
+
+                for device in devices.values():
+                    if device.deleted:
+                        session.users_pending.discard((user_id, device.id))
+                    else:
+                        session.add_pending(user_id, device.id)
+
+    def _add_group_session_recipient(self, group_session, user_id):
+        # type: (OutboundGroupSession, str) -> None
+        group_session.recipients.add(user_id)
+
+        for device in self.device_store.active_user_devices(user_id):
+            group_session.add_pending(user_id, device.id)
+
+    def update_group_session_member(self, room_id, user_id, member):
+        # type: (str, str, bool) -> None
+        """Update the recipients of an unshared outbound group session.
+
+        Should be called when the membership of a user in the room changes,
+        the devices of the user are added to or removed from the devices the
+        session still needs to be shared with.
+
+        Args:
+            room_id (str): The room id of the room the session belongs to.
+            user_id (str): The user id of the user whose membership changed.
+            member (bool): Is the user a member of the room now.
+        """
+        group_session = self.outbound_group_sessions.get(room_id, None)
+
+        if (not group_session or group_session.shared
+                or group_session.recipients is None):
+            return
+
+        if member and user_id not in group_session.recipients:
+            self._add_group_session_recipient(group_session, user_id)
+
+        elif not member and user_id in group_session.recipients:
+            group_session.recipients.discard(user_id)
+
+            for device_id in self.device_store[user_id]:
+                group_session.users_pending.discard((user_id, device_id))
+
     def _create_inbound_session(
         self,
         sender,  # type: str
@@ -857,6 +921,9 @@ class Olm(object):
         new_event.sender_key = event.sender_key
         new_event.session_id = event.session_id
 
+        if isinstance(new_event, Event):
+            new_event.compact_source(self.event_source_policy)
+
         return new_event
 
     def decrypt_event(
@@ -1053,31 +1120,47 @@ class Olm(object):
 
         to_device_dict = {"messages": {}}  # type: Dict[str, Any]
 
+        # The recipients are only collected once, afterwards they are kept up
+        # to date by update_group_session_member() and by key queries.
+        if group_session.recipients is None:
+            group_session.recipients = set()
+
+            for user_id in users:
+                self._add_group_session_recipient(group_session, user_id)
+
         already_shared_set = group_session.users_shared_with
         ignored_set = group_session.users_ignored
 
         user_map = []
+        # Pending devices that are ignored or aren't pending anymore, the set
+        # can't be changed while we iterate over it.
+        ignored = []
+        handled = []
+
+        try:
+            for user_id, device_id in group_session.users_pending:
+                user = (user_id, device_id)
+                device = self.device_store[user_id].get(device_id, None)
+
+                if (not device or device.deleted
+                        or user in already_shared_set or user in ignored_set):
+                    handled.append(user)
+                    continue
 
-        for user_id in users:
-            for device in self.device_store.active_user_devices(user_id):
                 # No need to share the session with our own device
                 if device.id == self.device_id:
-                    ignored_set.add((user_id, device.id))
+                    ignored.append(user)
                     continue
 
                 if self.is_device_blacklisted(device):
-                    ignored_set.add((user_id, device.id))
-                    continue
-
-                if ((user_id, device.id) in already_shared_set
-                        or (user_id, device.id) in ignored_set):
+                    ignored.append(user)
                     continue
 
                 session = self.session_store.get(device.curve25519)
 
                 if not session:
                     if ignore_missing_sessions:
-                        ignored_set.add((user_id, device.id))
+                        ignored.append(user)
                         continue
                     else:
                         raise EncryptionError("Missing Olm session for user {}"
@@ -1101,9 +1184,11 @@ class Olm(object):
 
                 if len(user_map) >= self._maxToDeviceMessagesPerRequest:
                     break
+        finally:
+            for user_id, device_id in ignored:
+                group_session.mark_ignored(user_id, device_id)
 
-            if len(user_map) >= self._maxToDeviceMessagesPerRequest:
-                break
+            group_session.users_pending.difference_update(handled)
 
         sharing_with = set()
 
@@ -1146,6 +1231,7 @@ class Olm(object):
         self.inbound_group_store = self.store.load_inbound_group_sessions()
         self.device_store = self.store.load_device_keys()
         self.outgoing_key_requests = self.store.load_outgoing_key_requests()
+        self.tracked_users = self.store.load_tracked_users()
 
     def save_session(self, curve_key, session):
         # type: (str, Session) -> None
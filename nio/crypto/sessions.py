@@ -17,11 +17,12 @@
 
 from builtins import super
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 import attr
 import olm
 
+from .._compat import intern
 from ..exceptions import EncryptionError
 from ..messages import ToDeviceMessage
 
@@ -158,6 +159,11 @@ class OutboundGroupSession(olm.OutboundGroupSession):
     Attributes:
         creation_time (datetime.datetime): Creation time of the session.
         message_count (int): Number of messages encrypted using the session.
+        users_pending (Set[Tuple[str, str]]): The user and device id pairs of
+            the recipients that the session still needs to be shared with.
+        recipients (Set[str], optional): The users whose devices were added
+            to the pending set, None until the session is shared for the
+            first time.
 
     """
 
@@ -168,6 +174,8 @@ class OutboundGroupSession(olm.OutboundGroupSession):
         self.message_count = 0
         self.users_shared_with = set()  # type: Set[Tuple[str, str]]
         self.users_ignored = set()      # type: Set[Tuple[str, str]]
+        self.users_pending = set()      # type: Set[Tuple[str, str]]
+        self.recipients = None          # type: Optional[Set[str]]
         self.shared = False
         super().__init__()
 
@@ -177,6 +185,28 @@ class OutboundGroupSession(olm.OutboundGroupSession):
     def mark_as_shared(self):
         self.shared = True
 
+    def add_pending(self, user_id, device_id):
+        # type: (str, str) -> None
+        """Add a device to the pending recipients if it wasn't handled yet."""
+        user = (user_id, device_id)
+
+        if (user not in self.users_shared_with
+                and user not in self.users_ignored):
+            self.users_pending.add(user)
+
+    def mark_shared_with(self, users):
+        # type: (Iterable[Tuple[str, str]]) -> None
+        """Mark the session as shared with the given devices."""
+        self.users_shared_with.update(users)
+        self.users_pending.difference_update(users)
+
+    def mark_ignored(self, user_id, device_id):
+        # type: (str, str) -> None
+        """Mark a device as one that won't receive the session."""
+        user = (user_id, device_id)
+        self.users_ignored.add(user)
+        self.users_pending.discard(user)
+
     @property
     def expired(self):
         return self.should_rotate()
@@ -212,8 +242,8 @@ class OlmDevice(object):
         deleted=False,    # type: bool
     ):
         # type: (...) -> None
-        self.user_id = user_id
-        self.id = device_id
+        self.user_id = intern(user_id)
+        self.id = intern(device_id)
         self.keys = keys
         self.display_name = display_name
         self.deleted = deleted
@@ -16,7 +16,7 @@
 
 from __future__ import unicode_literals
 
-from typing import Any, Dict
+from typing import Any, Callable, Dict
 
 import attr
 
@@ -24,24 +24,28 @@ from ..schemas import Schemas
 from .misc import verify
 
 
-@attr.s
+@attr.s(slots=True)
 class AccountDataEvent(object):
     """Abstract class for account data events."""
 
+    # Parsers for the account data event types, see register_event_type().
+    _event_parsers = {}  # type: Dict[str, Callable[[Dict], Any]]
+
     @classmethod
     @verify(Schemas.account_data)
     def parse_event(
         cls,
         event_dict,  # type: Dict[Any, Any]
     ):
+        parser = AccountDataEvent._event_parsers.get(
+            event_dict["type"],
+            UnknownAccountDataEvent.from_dict
+        )
 
-        if event_dict["type"] == "m.fully_read":
-            return FullyReadEvent.from_dict(event_dict)
-
-        return UnknownAccountDataEvent.from_dict(event_dict)
+        return parser(event_dict)
 
 
-@attr.s
+@attr.s(slots=True)
 class FullyReadEvent(AccountDataEvent):
     """Read marker location event.
 
@@ -67,7 +71,7 @@ class FullyReadEvent(AccountDataEvent):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class UnknownAccountDataEvent(AccountDataEvent):
     """Account data event of an unknown type.
 
@@ -88,3 +92,8 @@ class UnknownAccountDataEvent(AccountDataEvent):
             event_dict["type"],
             content
         )
+
+
+AccountDataEvent._event_parsers.update({
+    "m.fully_read": FullyReadEvent.from_dict,
+})
@@ -18,12 +18,13 @@ from typing import Optional
 
 import attr
 
+from .._compat import intern
 from ..messages import ToDeviceMessage
 from ..schemas import Schemas
 from .misc import verify
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomEncryptedEvent(object):
     @classmethod
     @verify(Schemas.room_encrypted)
@@ -38,10 +39,10 @@ class RoomEncryptedEvent(object):
         return None
 
 
-@attr.s
+@attr.s(slots=True)
 class OlmEvent(RoomEncryptedEvent):
-    sender = attr.ib()
-    sender_key = attr.ib()
+    sender = attr.ib(converter=intern)
+    sender_key = attr.ib(converter=intern)
     ciphertext = attr.ib()
     transaction_id = attr.ib(default=None)
 
@@ -59,11 +60,11 @@ class OlmEvent(RoomEncryptedEvent):
         return cls(event_dict["sender"], sender_key, ciphertext, tx_id)
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomKeyEvent(object):
-    sender = attr.ib(type=str)
-    sender_key = attr.ib(type=str)
-    room_id = attr.ib(type=str)
+    sender = attr.ib(type=str, converter=intern)
+    sender_key = attr.ib(type=str, converter=intern)
+    room_id = attr.ib(type=str, converter=intern)
     session_id = attr.ib(type=str)
     algorithm = attr.ib(type=str)
 
@@ -81,7 +82,7 @@ class RoomKeyEvent(object):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class ForwardedRoomKeyEvent(RoomKeyEvent):
     """Event containing a room key that got forwarded to us.
 
@@ -116,17 +117,17 @@ class ForwardedRoomKeyEvent(RoomKeyEvent):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class MegolmEvent(RoomEncryptedEvent):
     event_id = attr.ib()
-    sender = attr.ib()
+    sender = attr.ib(converter=intern)
     server_timestamp = attr.ib()
-    sender_key = attr.ib()
-    device_id = attr.ib()
+    sender_key = attr.ib(converter=intern)
+    device_id = attr.ib(converter=intern)
     session_id = attr.ib()
     ciphertext = attr.ib()
     algorithm = attr.ib()
-    room_id = attr.ib(default="")
+    room_id = attr.ib(default="", converter=intern)
     transaction_id = attr.ib(default=None)
 
     decrypted = attr.ib(default=False, init=False)
@@ -14,17 +14,21 @@
 # CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN
 # CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
-from typing import Any, Dict, Optional, Union
+from typing import Any, Callable, Dict, Optional, Union
 
 import attr
 
+from .._compat import intern
 from ..schemas import Schemas
 from .misc import BadEventType, verify
 
 
-@attr.s
+@attr.s(slots=True)
 class InviteEvent(object):
-    sender = attr.ib()
+    # Parsers for the invite state event types, see register_event_type().
+    _event_parsers = {}  # type: Dict[str, Callable[[Dict], Any]]
+
+    sender = attr.ib(converter=intern)
 
     @classmethod
     def parse_event(cls, event_dict):
@@ -33,19 +37,17 @@ class InviteEvent(object):
             if "redacted_because" in event_dict["unsigned"]:
                 return None
 
-        if event_dict["type"] == "m.room.member":
-            return InviteMemberEvent.from_dict(event_dict)
-        elif event_dict["type"] == "m.room.canonical_alias":
-            return InviteAliasEvent.from_dict(event_dict)
-        elif event_dict["type"] == "m.room.name":
-            return InviteNameEvent.from_dict(event_dict)
+        parser = InviteEvent._event_parsers.get(event_dict["type"], None)
+
+        if not parser:
+            return None
 
-        return None
+        return parser(event_dict)
 
 
-@attr.s
+@attr.s(slots=True)
 class InviteMemberEvent(InviteEvent):
-    state_key = attr.ib()
+    state_key = attr.ib(converter=intern)
     content = attr.ib()
     prev_content = attr.ib(default=None)
 
@@ -65,7 +67,7 @@ class InviteMemberEvent(InviteEvent):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class InviteAliasEvent(InviteEvent):
     canonical_alias = attr.ib()
 
@@ -79,7 +81,7 @@ class InviteAliasEvent(InviteEvent):
         return cls(sender, canonical_alias)
 
 
-@attr.s
+@attr.s(slots=True)
 class InviteNameEvent(InviteEvent):
     name = attr.ib()
 
@@ -91,3 +93,10 @@ class InviteNameEvent(InviteEvent):
         canonical_alias = parsed_dict["content"]["name"]
 
         return cls(sender, canonical_alias)
+
+
+InviteEvent._event_parsers.update({
+    "m.room.member": InviteMemberEvent.from_dict,
+    "m.room.canonical_alias": InviteAliasEvent.from_dict,
+    "m.room.name": InviteNameEvent.from_dict,
+})
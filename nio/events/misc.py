@@ -15,12 +15,13 @@
 # CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
 from functools import wraps
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, Optional, Type, Union
 
 import attr
 from jsonschema.exceptions import SchemaError, ValidationError
 from logbook import Logger
 
+from .._compat import intern
 from ..log import logger_group
 from ..schemas import validate_json
 
@@ -45,6 +46,35 @@ def validate_or_badevent(
     return None
 
 
+def register_event_type(event_type, event_class):
+    # type: (str, Type) -> None
+    """Register a class that should be used to parse events of a given type.
+
+    The event class is registered with the closest base class that dispatches
+    on event types, e.g. Event for room events, ToDeviceEvent for to-device
+    events or AccountDataEvent for account data events. Subclasses of
+    RoomMessage are registered for a msgtype instead of an event type.
+
+    Events of the registered type will be parsed using the from_dict() method
+    of the event class.
+
+    Args:
+        event_type (str): The event type, or msgtype for room messages, that
+            should be parsed using the event class.
+        event_class (Type): The class that should be used to parse the events.
+
+    Raises a TypeError if the class isn't a subclass of an event class that
+    dispatches on event types.
+    """
+    for base in event_class.__mro__[1:]:
+        if "_event_parsers" in vars(base):
+            base._event_parsers[event_type] = event_class.from_dict
+            return
+
+    raise TypeError("{} isn't a subclass of an event class that supports "
+                    "event type registration".format(event_class.__name__))
+
+
 def verify(schema):
     def decorator(f):
         @wraps(f)
@@ -60,7 +90,7 @@ def verify(schema):
     return decorator
 
 
-@attr.s
+@attr.s(slots=True)
 class UnknownBadEvent(object):
     source = attr.ib()
     transaction_id = attr.ib(default=None, init=False)
@@ -71,13 +101,13 @@ class UnknownBadEvent(object):
     session_id = attr.ib(default=None, init=False)      # type: Optional[str]
 
 
-@attr.s
+@attr.s(slots=True)
 class BadEvent(object):
     source = attr.ib()
     event_id = attr.ib()
-    sender = attr.ib()
+    sender = attr.ib(converter=intern)
     server_timestamp = attr.ib()
-    type = attr.ib()
+    type = attr.ib(converter=intern)
 
     decrypted = attr.ib(default=False, init=False)
     verified = attr.ib(default=False, init=False)
@@ -18,18 +18,31 @@ from __future__ import unicode_literals
 
 import time
 from builtins import super
-from typing import Any, Dict, Optional, Union
+from typing import Any, Callable, Dict, Optional, Union
 
 import attr
 
+from .._compat import intern
 from ..schemas import Schemas
 from .encrypted_events import RoomEncryptedEvent
 from .misc import BadEventType, UnknownBadEvent, validate_or_badevent, verify
 
 
-@attr.s
+# Keys of the event source that compact_source() keeps, they are cheap to
+# store and can't be reconstructed from the event attributes.
+_SOURCE_KEYS = frozenset(("type", "state_key", "room_id", "redacts"))
+_SHALLOW_SOURCE_KEYS = _SOURCE_KEYS | {"content", "unsigned"}
+
+
+@attr.s(slots=True)
 class Event(object):
-    source = attr.ib()
+    # Parsers for the room event types, see register_event_type().
+    _event_parsers = {}  # type: Dict[str, Callable[[Dict], Any]]
+    # Can the content of the event be rebuilt using _content(), if not the
+    # content is kept when the source is dropped.
+    _rebuilds_content = False
+
+    _source = attr.ib()  # type: Optional[Dict[Any, Any]]
 
     event_id = attr.ib(init=False)
     sender = attr.ib(init=False)
@@ -42,9 +55,78 @@ class Event(object):
     transaction_id = attr.ib(default=None, init=False)  # type: Optional[str]
 
     def __attrs_post_init__(self):
-        self.event_id = self.source["event_id"]
-        self.sender = self.source["sender"]
-        self.server_timestamp = self.source["origin_server_ts"]
+        self.event_id = self._source["event_id"]
+        self.sender = intern(self._source["sender"])
+        self.server_timestamp = self._source["origin_server_ts"]
+
+    @property
+    def source(self):
+        # type: () -> Dict[Any, Any]
+        """The source dictionary of the event.
+
+        If the source was compacted using compact_source() the dictionary is
+        reconstructed from the event attributes and the parts of the source
+        that were kept. The "type", "state_key" and "room_id" keys are always
+        kept, the "content" of a dropped source is rebuilt by the event class.
+        """
+        if self._source is not None and "event_id" in self._source:
+            return self._source
+
+        source = {
+            "event_id": self.event_id,
+            "sender": self.sender,
+            "origin_server_ts": self.server_timestamp,
+        }
+
+        if self.transaction_id:
+            source["unsigned"] = {"transaction_id": self.transaction_id}
+
+        if self._source:
+            source.update(self._source)
+
+        if "content" not in source:
+            source["content"] = self._content()
+
+        return source
+
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        """Rebuild the content dictionary of the event from its attributes."""
+        return {}
+
+    def compact_source(self, policy):
+        # type: (str) -> None
+        """Compact the source dictionary of the event.
+
+        Args:
+            policy (str): One of "keep", "shallow" or "drop". "keep" leaves the
+                source untouched, "shallow" keeps only the "content" and
+                "unsigned" parts of the source and "drop" discards the rest of
+                the source. The "type", "state_key", "room_id" and "redacts"
+                keys of the source are kept by both policies, the "content" is
+                kept by "drop" as well unless the event rebuilds exactly the
+                same content from its attributes.
+        """
+        if policy == "keep" or self._source is None:
+            return
+
+        if policy == "shallow":
+            kept_keys = _SHALLOW_SOURCE_KEYS
+        elif policy == "drop":
+            kept_keys = _SOURCE_KEYS | {"content"}
+
+            # Content keys that the event doesn't parse, e.g. relations or
+            # custom keys, would be lost if the content is rebuilt.
+            if (self._rebuilds_content
+                    and self._source.get("content") == self._content()):
+                kept_keys = _SOURCE_KEYS
+        else:
+            return
+
+        self._source = {
+            key: value for key, value in self._source.items()
+            if key in kept_keys
+        }
 
     @classmethod
     def from_dict(cls, parsed_dict):
@@ -61,41 +143,17 @@ class Event(object):
             if "redacted_because" in event_dict["unsigned"]:
                 return RedactedEvent.from_dict(event_dict)
 
-        if event_dict["type"] == "m.room.message":
-            return RoomMessage.parse_event(event_dict)
-        elif event_dict["type"] == "m.room.create":
-            return RoomCreateEvent.from_dict(event_dict)
-        elif event_dict["type"] == "m.room.guest_access":
-            return RoomGuestAccessEvent.from_dict(event_dict)
-        elif event_dict["type"] == "m.room.join_rules":
-            return RoomJoinRulesEvent.from_dict(event_dict)
-        elif event_dict["type"] == "m.room.history_visibility":
-            return RoomHistoryVisibilityEvent.from_dict(event_dict)
-        elif event_dict["type"] == "m.room.member":
-            return RoomMemberEvent.from_dict(event_dict)
-        elif event_dict["type"] == "m.room.canonical_alias":
-            return RoomAliasEvent.from_dict(event_dict)
-        elif event_dict["type"] == "m.room.name":
-            return RoomNameEvent.from_dict(event_dict)
-        elif event_dict["type"] == "m.room.topic":
-            return RoomTopicEvent.from_dict(event_dict)
-        elif event_dict["type"] == "m.room.power_levels":
-            return PowerLevelsEvent.from_dict(event_dict)
-        elif event_dict["type"] == "m.room.encryption":
-            return RoomEncryptionEvent.from_dict(event_dict)
-        elif event_dict["type"] == "m.room.redaction":
-            return RedactionEvent.from_dict(event_dict)
-        elif event_dict["type"] == "m.room.encrypted":
-            return RoomEncryptedEvent.parse_event(event_dict)
-        elif event_dict["type"].startswith("m.call"):
-            return CallEvent.parse_event(event_dict)
-
-        return UnknownEvent.from_dict(event_dict)
-
-
-@attr.s
+        parser = Event._event_parsers.get(
+            event_dict["type"],
+            UnknownEvent.from_dict
+        )
+
+        return parser(event_dict)
+
+
+@attr.s(slots=True)
 class UnknownEvent(Event):
-    type = attr.ib()
+    type = attr.ib(converter=intern)
 
     @classmethod
     def from_dict(cls, event_dict):
@@ -105,8 +163,11 @@ class UnknownEvent(Event):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class EncryptedEvent(Event):
+    # Parsers for decrypted event types that differ from the unencrypted ones.
+    _event_parsers = {}  # type: Dict[str, Callable[[Dict], Any]]
+
     @classmethod
     def parse_event(
         cls,
@@ -117,17 +178,25 @@ class EncryptedEvent(Event):
             if "redacted_because" in event_dict["unsigned"]:
                 return RedactedEvent.from_dict(event_dict)
 
-        if event_dict["type"] == "m.room.message":
-            return RoomEncryptedMessage.parse_event(event_dict)
+        parser = EncryptedEvent._event_parsers.get(event_dict["type"], None)
+
+        if parser:
+            return parser(event_dict)
 
         return super().parse_event(event_dict)
 
 
-@attr.s
+@attr.s(slots=True)
 class CallEvent(Event):
     call_id = attr.ib()
     version = attr.ib()
 
+    _rebuilds_content = True
+
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        return {"call_id": self.call_id, "version": self.version}
+
     @staticmethod
     def parse_event(event_dict):
         if event_dict["type"] == "m.call.candidates":
@@ -144,14 +213,20 @@ class CallEvent(Event):
         return event
 
 
-@attr.s
+@attr.s(slots=True)
 class CallCandidatesEvent(CallEvent):
     candidates = attr.ib()
 
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        content = CallEvent._content(self)
+        content["candidates"] = self.candidates
+        return content
+
     @classmethod
     @verify(Schemas.call_candidates)
     def from_dict(cls, event_dict):
-        content = event_dict.pop("content")
+        content = event_dict["content"]
         return cls(
             event_dict,
             content["call_id"],
@@ -160,11 +235,18 @@ class CallCandidatesEvent(CallEvent):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class CallInviteEvent(CallEvent):
     lifetime = attr.ib()
     offer = attr.ib()
 
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        content = CallEvent._content(self)
+        content["lifetime"] = self.lifetime
+        content["offer"] = self.offer
+        return content
+
     @property
     def expired(self):
         """Property marking if the invite event expired."""
@@ -174,7 +256,7 @@ class CallInviteEvent(CallEvent):
     @classmethod
     @verify(Schemas.call_invite)
     def from_dict(cls, event_dict):
-        content = event_dict.pop("content")
+        content = event_dict["content"]
         return cls(
             event_dict,
             content["call_id"],
@@ -184,14 +266,20 @@ class CallInviteEvent(CallEvent):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class CallAnswerEvent(CallEvent):
     answer = attr.ib()
 
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        content = CallEvent._content(self)
+        content["answer"] = self.answer
+        return content
+
     @classmethod
     @verify(Schemas.call_answer)
     def from_dict(cls, event_dict):
-        content = event_dict.pop("content")
+        content = event_dict["content"]
         return cls(
             event_dict,
             content["call_id"],
@@ -200,12 +288,12 @@ class CallAnswerEvent(CallEvent):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class CallHangupEvent(CallEvent):
     @classmethod
     @verify(Schemas.call_hangup)
     def from_dict(cls, event_dict):
-        content = event_dict.pop("content")
+        content = event_dict["content"]
         return cls(
             event_dict,
             content["call_id"],
@@ -213,12 +301,15 @@ class CallHangupEvent(CallEvent):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class RedactedEvent(Event):
     event_type = attr.ib()
     redacter = attr.ib()
     reason = attr.ib()
 
+    # The content of redacted events is empty.
+    _rebuilds_content = True
+
     def __str__(self):
         reason = ", reason: {}".format(self.reason) if self.reason else ""
         return "Redacted event of type {}, by {}{}.".format(
@@ -241,17 +332,27 @@ class RedactedEvent(Event):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomEncryptionEvent(Event):
     pass
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomCreateEvent(Event):
     creator = attr.ib()
     federate = attr.ib(default=True)
     room_version = attr.ib(default="1")
 
+    _rebuilds_content = True
+
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        return {
+            "creator": self.creator,
+            "m.federate": self.federate,
+            "room_version": self.room_version,
+        }
+
     @classmethod
     @verify(Schemas.room_create)
     def from_dict(cls, parsed_dict):
@@ -263,10 +364,16 @@ class RoomCreateEvent(Event):
         return cls(parsed_dict, creator, federate, version)
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomGuestAccessEvent(Event):
     guest_access = attr.ib(default="forbidden")
 
+    _rebuilds_content = True
+
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        return {"guest_access": self.guest_access}
+
     @classmethod
     @verify(Schemas.room_guest_access)
     def from_dict(cls, parsed_dict):
@@ -276,10 +383,16 @@ class RoomGuestAccessEvent(Event):
         return cls(parsed_dict, guest_access)
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomJoinRulesEvent(Event):
     join_rule = attr.ib(default="invite")
 
+    _rebuilds_content = True
+
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        return {"join_rule": self.join_rule}
+
     @classmethod
     @verify(Schemas.room_join_rules)
     def from_dict(cls, parsed_dict):
@@ -289,10 +402,16 @@ class RoomJoinRulesEvent(Event):
         return cls(parsed_dict, join_rule)
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomHistoryVisibilityEvent(Event):
     history_visibility = attr.ib(default="shared")
 
+    _rebuilds_content = True
+
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        return {"history_visibility": self.history_visibility}
+
     @classmethod
     @verify(Schemas.room_history_visibility)
     def from_dict(cls,
@@ -304,10 +423,16 @@ class RoomHistoryVisibilityEvent(Event):
         return cls(parsed_dict, history_visibility)
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomAliasEvent(Event):
     canonical_alias = attr.ib()
 
+    _rebuilds_content = True
+
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        return {"alias": self.canonical_alias}
+
     @classmethod
     @verify(Schemas.room_canonical_alias)
     def from_dict(cls, parsed_dict):
@@ -317,10 +442,16 @@ class RoomAliasEvent(Event):
         return cls(parsed_dict, canonical_alias)
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomNameEvent(Event):
     name = attr.ib()
 
+    _rebuilds_content = True
+
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        return {"name": self.name}
+
     @classmethod
     @verify(Schemas.room_name)
     def from_dict(cls, parsed_dict):
@@ -330,10 +461,16 @@ class RoomNameEvent(Event):
         return cls(parsed_dict, room_name)
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomTopicEvent(Event):
     topic = attr.ib()
 
+    _rebuilds_content = True
+
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        return {"topic": self.topic}
+
     @classmethod
     @verify(Schemas.room_topic)
     def from_dict(cls, parsed_dict):
@@ -343,30 +480,20 @@ class RoomTopicEvent(Event):
         return cls(parsed_dict, canonical_alias)
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomMessage(Event):
+    # Parsers for the message types, see register_event_type().
+    _event_parsers = {}  # type: Dict[str, Callable[[Dict], Any]]
+
     @classmethod
     @verify(Schemas.room_message)
     def parse_event(cls, parsed_dict):
         # type: (Dict[Any, Any]) -> Union[RoomMessage, BadEventType]
-        content_dict = parsed_dict["content"]
-
-        if content_dict["msgtype"] == "m.text":
-            event = RoomMessageText.from_dict(parsed_dict)
-        elif content_dict["msgtype"] == "m.emote":
-            event = RoomMessageEmote.from_dict(parsed_dict)
-        elif content_dict["msgtype"] == "m.notice":
-            event = RoomMessageNotice.from_dict(parsed_dict)
-        elif content_dict["msgtype"] == "m.image":
-            event = RoomMessageImage.from_dict(parsed_dict)
-        elif content_dict["msgtype"] == "m.audio":
-            event = RoomMessageAudio.from_dict(parsed_dict)
-        elif content_dict["msgtype"] == "m.video":
-            event = RoomMessageVideo.from_dict(parsed_dict)
-        elif content_dict["msgtype"] == "m.file":
-            event = RoomMessageFile.from_dict(parsed_dict)
-        else:
-            event = RoomMessageUnknown.from_dict(parsed_dict)
+        parser = RoomMessage._event_parsers.get(
+            parsed_dict["content"]["msgtype"],
+            RoomMessageUnknown.from_dict
+        )
+        event = parser(parsed_dict)
 
         if "unsigned" in parsed_dict:
             txn_id = parsed_dict["unsigned"].get("transaction_id", None)
@@ -375,24 +502,20 @@ class RoomMessage(Event):
         return event
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomEncryptedMessage(RoomMessage):
+    # Parsers for the message types whose encrypted form differs.
+    _event_parsers = {}  # type: Dict[str, Callable[[Dict], Any]]
+
     @classmethod
     @verify(Schemas.room_message)
     def parse_event(cls, parsed_dict):
         # type: (Dict[Any, Any]) -> Union[RoomMessage, BadEventType]
-        msgtype = parsed_dict["content"]["msgtype"]
-
-        if msgtype == "m.image":
-            event = RoomEncryptedImage.from_dict(parsed_dict)
-        elif msgtype == "m.audio":
-            event = RoomEncryptedAudio.from_dict(parsed_dict)
-        elif msgtype == "m.video":
-            event = RoomEncryptedVideo.from_dict(parsed_dict)
-        elif msgtype == "m.file":
-            event = RoomEncryptedFile.from_dict(parsed_dict)
-        else:
-            event = RoomMessage.parse_event(parsed_dict)
+        parser = RoomEncryptedMessage._event_parsers.get(
+            parsed_dict["content"]["msgtype"],
+            RoomMessage.parse_event
+        )
+        event = parser(parsed_dict)
 
         if "unsigned" in parsed_dict:
             txn_id = parsed_dict["unsigned"].get("transaction_id", None)
@@ -401,11 +524,18 @@ class RoomEncryptedMessage(RoomMessage):
         return event
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomMessageMedia(RoomMessage):
     url = attr.ib()
     body = attr.ib()
 
+    _rebuilds_content = True
+    _msgtype = None  # type: Optional[str]
+
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        return {"msgtype": self._msgtype, "url": self.url, "body": self.body}
+
     @classmethod
     @verify(Schemas.room_message_media)
     def from_dict(cls, parsed_dict):
@@ -416,7 +546,7 @@ class RoomMessageMedia(RoomMessage):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomEncryptedMedia(RoomMessage):
     url = attr.ib()
     body = attr.ib()
@@ -424,6 +554,22 @@ class RoomEncryptedMedia(RoomMessage):
     hashes = attr.ib()
     iv = attr.ib()
 
+    _rebuilds_content = True
+    _msgtype = None  # type: Optional[str]
+
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        return {
+            "msgtype": self._msgtype,
+            "body": self.body,
+            "file": {
+                "url": self.url,
+                "key": self.key,
+                "hashes": self.hashes,
+                "iv": self.iv,
+            },
+        }
+
     @classmethod
     @verify(Schemas.room_encrypted_media)
     def from_dict(cls, parsed_dict):
@@ -437,65 +583,77 @@ class RoomEncryptedMedia(RoomMessage):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomEncryptedImage(RoomEncryptedMedia):
-    pass
+    _msgtype = "m.image"
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomEncryptedAudio(RoomEncryptedMedia):
-    pass
+    _msgtype = "m.audio"
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomEncryptedVideo(RoomEncryptedMedia):
-    pass
+    _msgtype = "m.video"
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomEncryptedFile(RoomEncryptedMedia):
-    pass
+    _msgtype = "m.file"
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomMessageImage(RoomMessageMedia):
-    pass
+    _msgtype = "m.image"
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomMessageAudio(RoomMessageMedia):
-    pass
+    _msgtype = "m.audio"
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomMessageVideo(RoomMessageMedia):
-    pass
+    _msgtype = "m.video"
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomMessageFile(RoomMessageMedia):
-    pass
+    _msgtype = "m.file"
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomMessageUnknown(RoomMessage):
     type = attr.ib()
     content = attr.ib()
 
+    _rebuilds_content = True
+
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        return self.content
+
     @classmethod
     def from_dict(cls, parsed_dict):
         # type: (Dict[Any, Any]) -> RoomMessage
         return cls(
             parsed_dict,
             parsed_dict["content"]["msgtype"],
-            parsed_dict.pop("content"),
+            parsed_dict["content"],
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomMessageNotice(RoomMessage):
     body = attr.ib()
 
+    _rebuilds_content = True
+
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        return {"msgtype": "m.notice", "body": self.body}
+
     @classmethod
     @verify(Schemas.room_message_notice)
     def from_dict(cls, parsed_dict):
@@ -505,16 +663,31 @@ class RoomMessageNotice(RoomMessage):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomMessageText(RoomMessage):
     body = attr.ib()
     formatted_body = attr.ib()
     format = attr.ib()
 
+    _rebuilds_content = True
+    _msgtype = "m.text"
+
     def __str__(self):
         # type: () -> str
         return "{}: {}".format(self.sender, self.body)
 
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        content = {"msgtype": self._msgtype, "body": self.body}
+
+        if self.formatted_body is not None:
+            content["formatted_body"] = self.formatted_body
+
+        if self.format is not None:
+            content["format"] = self.format
+
+        return content
+
     @staticmethod
     def _validate(parsed_dict):
         # type: (Dict[Any, Any]) -> Optional[BadEventType]
@@ -548,15 +721,17 @@ class RoomMessageText(RoomMessage):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomMessageEmote(RoomMessageText):
+    _msgtype = "m.emote"
+
     @staticmethod
     def _validate(parsed_dict):
         # type: (Dict[Any, Any]) -> Optional[BadEventType]
         return validate_or_badevent(parsed_dict, Schemas.room_message_emote)
 
 
-@attr.s
+@attr.s(slots=True)
 class DefaultLevels(object):
     ban = attr.ib(default=50, type=int)
     invite = attr.ib(default=50, type=int)
@@ -580,7 +755,7 @@ class DefaultLevels(object):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class PowerLevels(object):
     defaults = attr.ib(default=attr.Factory(DefaultLevels))
     users = attr.ib(default=attr.Factory(dict), type=Dict[str, int])
@@ -602,17 +777,26 @@ class PowerLevels(object):
         self.users.update(new_levels.users)
 
 
-@attr.s
+@attr.s(slots=True)
 class PowerLevelsEvent(Event):
     power_levels = attr.ib()
 
+    _rebuilds_content = True
+
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        content = attr.asdict(self.power_levels.defaults)
+        content["users"] = self.power_levels.users
+        content["events"] = self.power_levels.events
+        return content
+
     @classmethod
     @verify(Schemas.room_power_levels)
     def from_dict(cls, parsed_dict):
         default_levels = DefaultLevels.from_dict(parsed_dict)
 
-        users = parsed_dict["content"].pop("users")
-        events = parsed_dict["content"].pop("events")
+        users = parsed_dict["content"]["users"]
+        events = parsed_dict["content"]["events"]
 
         levels = PowerLevels(default_levels, users, events)
 
@@ -622,11 +806,17 @@ class PowerLevelsEvent(Event):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class RedactionEvent(Event):
     redacts = attr.ib()
     reason = attr.ib(default=None)
 
+    _rebuilds_content = True
+
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        return {"reason": self.reason} if self.reason else {}
+
     @classmethod
     @verify(Schemas.room_redaction)
     def from_dict(cls, parsed_dict):
@@ -641,17 +831,23 @@ class RedactionEvent(Event):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class RoomMemberEvent(Event):
-    state_key = attr.ib()
+    state_key = attr.ib(converter=intern)
     content = attr.ib()
     prev_content = attr.ib(default=None)
 
+    _rebuilds_content = True
+
+    def _content(self):
+        # type: () -> Dict[Any, Any]
+        return self.content
+
     @classmethod
     @verify(Schemas.room_membership)
     def from_dict(cls, parsed_dict):
         # type: (Dict[Any, Any]) -> Union[RoomMemberEvent, BadEventType]
-        content = parsed_dict.pop("content")
+        content = parsed_dict["content"]
         unsigned = parsed_dict.get("unsigned", {})
         prev_content = unsigned.get("prev_content", None)
 
@@ -661,3 +857,45 @@ class RoomMemberEvent(Event):
             content,
             prev_content,
         )
+
+
+Event._event_parsers.update({
+    "m.room.message": RoomMessage.parse_event,
+    "m.room.create": RoomCreateEvent.from_dict,
+    "m.room.guest_access": RoomGuestAccessEvent.from_dict,
+    "m.room.join_rules": RoomJoinRulesEvent.from_dict,
+    "m.room.history_visibility": RoomHistoryVisibilityEvent.from_dict,
+    "m.room.member": RoomMemberEvent.from_dict,
+    "m.room.canonical_alias": RoomAliasEvent.from_dict,
+    "m.room.name": RoomNameEvent.from_dict,
+    "m.room.topic": RoomTopicEvent.from_dict,
+    "m.room.power_levels": PowerLevelsEvent.from_dict,
+    "m.room.encryption": RoomEncryptionEvent.from_dict,
+    "m.room.redaction": RedactionEvent.from_dict,
+    "m.room.encrypted": RoomEncryptedEvent.parse_event,
+    "m.call.candidates": CallCandidatesEvent.from_dict,
+    "m.call.invite": CallInviteEvent.from_dict,
+    "m.call.answer": CallAnswerEvent.from_dict,
+    "m.call.hangup": CallHangupEvent.from_dict,
+})
+
+EncryptedEvent._event_parsers.update({
+    "m.room.message": RoomEncryptedMessage.parse_event,
+})
+
+RoomMessage._event_parsers.update({
+    "m.text": RoomMessageText.from_dict,
+    "m.emote": RoomMessageEmote.from_dict,
+    "m.notice": RoomMessageNotice.from_dict,
+    "m.image": RoomMessageImage.from_dict,
+    "m.audio": RoomMessageAudio.from_dict,
+    "m.video": RoomMessageVideo.from_dict,
+    "m.file": RoomMessageFile.from_dict,
+})
+
+RoomEncryptedMessage._event_parsers.update({
+    "m.image": RoomEncryptedImage.from_dict,
+    "m.audio": RoomEncryptedAudio.from_dict,
+    "m.video": RoomEncryptedVideo.from_dict,
+    "m.file": RoomEncryptedFile.from_dict,
+})
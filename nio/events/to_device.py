@@ -14,19 +14,23 @@
 # CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN
 # CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Union
 
 import attr
 
+from .._compat import intern
 from ..schemas import Schemas
 from .encrypted_events import RoomEncryptedEvent
 from .misc import BadEventType, verify
 
 
-@attr.s
+@attr.s(slots=True)
 class ToDeviceEvent(object):
+    # Parsers for the to-device event types, see register_event_type().
+    _event_parsers = {}  # type: Dict[str, Callable[[Dict], Any]]
+
     source = attr.ib()
-    sender = attr.ib()
+    sender = attr.ib(converter=intern)
 
     @classmethod
     @verify(Schemas.to_device)
@@ -39,28 +43,20 @@ class ToDeviceEvent(object):
         if not event_dict["content"]:
             return None
 
-        if event_dict["type"] == "m.room.encrypted":
-            return RoomEncryptedEvent.parse_event(event_dict)
-        elif event_dict["type"] == "m.key.verification.start":
-            return KeyVerificationStart.from_dict(event_dict)
-        elif event_dict["type"] == "m.key.verification.accept":
-            return KeyVerificationAccept.from_dict(event_dict)
-        elif event_dict["type"] == "m.key.verification.key":
-            return KeyVerificationKey.from_dict(event_dict)
-        elif event_dict["type"] == "m.key.verification.mac":
-            return KeyVerificationMac.from_dict(event_dict)
-        elif event_dict["type"] == "m.key.verification.cancel":
-            return KeyVerificationCancel.from_dict(event_dict)
+        parser = ToDeviceEvent._event_parsers.get(event_dict["type"], None)
+
+        if not parser:
+            return None
 
-        return None
+        return parser(event_dict)
 
 
-@attr.s
+@attr.s(slots=True)
 class KeyVerificationEvent(ToDeviceEvent):
     transaction_id = attr.ib(type=str)
 
 
-@attr.s
+@attr.s(slots=True)
 class KeyVerificationStart(KeyVerificationEvent):
     from_device = attr.ib(type=str)
     method = attr.ib(type=str)
@@ -86,7 +82,7 @@ class KeyVerificationStart(KeyVerificationEvent):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class KeyVerificationAccept(KeyVerificationEvent):
     commitment = attr.ib(type=str)
     key_agreement_protocol = attr.ib(type=str)
@@ -110,7 +106,7 @@ class KeyVerificationAccept(KeyVerificationEvent):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class KeyVerificationKey(KeyVerificationEvent):
     key = attr.ib(type=str)
 
@@ -126,7 +122,7 @@ class KeyVerificationKey(KeyVerificationEvent):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class KeyVerificationMac(KeyVerificationEvent):
     mac = attr.ib(type=Dict[str, str])
     keys = attr.ib(type=str)
@@ -144,7 +140,7 @@ class KeyVerificationMac(KeyVerificationEvent):
         )
 
 
-@attr.s
+@attr.s(slots=True)
 class KeyVerificationCancel(KeyVerificationEvent):
     code = attr.ib(type=str)
     reason = attr.ib(type=str)
@@ -160,3 +156,13 @@ class KeyVerificationCancel(KeyVerificationEvent):
             content["code"],
             content["reason"],
         )
+
+
+ToDeviceEvent._event_parsers.update({
+    "m.room.encrypted": RoomEncryptedEvent.parse_event,
+    "m.key.verification.start": KeyVerificationStart.from_dict,
+    "m.key.verification.accept": KeyVerificationAccept.from_dict,
+    "m.key.verification.key": KeyVerificationKey.from_dict,
+    "m.key.verification.mac": KeyVerificationMac.from_dict,
+    "m.key.verification.cancel": KeyVerificationCancel.from_dict,
+})
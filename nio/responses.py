@@ -16,23 +16,82 @@
 
 from __future__ import unicode_literals
 
+import codecs
+import json
+import re
 from builtins import str
 from datetime import datetime
 from functools import wraps
-from typing import Any, Dict, List, Optional, Set, Tuple, Union
+from itertools import repeat
+from typing import (Any, Dict, Iterable, Iterator, List, Optional, Set,
+                    Tuple, Union)
 
 import attr
 from jsonschema.exceptions import SchemaError, ValidationError
 from logbook import Logger
 
-from .events import (AccountDataEvent, BadEventType, Event, InviteEvent,
+from ._compat import intern
+from . import schemas
+from .events import (AccountDataEvent, BadEventType, EncryptedEvent, Event,
+                     InviteEvent, RoomEncryptedMessage, RoomMessage,
                      ToDeviceEvent, UnknownBadEvent)
 from .log import logger_group
-from .schemas import Schemas, validate_json
+from .schemas import Schemas, use_compiled_validation, validate_json
+
+if False:
+    from concurrent.futures import Executor
 
 logger = Logger("nio.responses")
 logger_group.add_logger(logger)
 
+# The number of joined rooms that are sent to a worker process at once if a
+# sync response is parsed in parallel.
+_PARSE_CHUNK_SIZE = 50
+
+# The event classes that dispatch on event types, see register_event_type().
+_EVENT_REGISTRIES = (
+    Event,
+    EncryptedEvent,
+    RoomMessage,
+    RoomEncryptedMessage,
+    ToDeviceEvent,
+    AccountDataEvent,
+    InviteEvent,
+)
+
+
+def _parser_state():
+    # type: () -> Tuple[List[Dict[str, Any]], bool]
+    """Get the parsing state of this process.
+
+    The state consists of the registered event types and of the validation
+    mode, it is sent along with the rooms that a worker process parses.
+    """
+    return (
+        [dict(registry._event_parsers) for registry in _EVENT_REGISTRIES],
+        schemas._compiled_validation,
+    )
+
+
+def _get_joined_room_in_worker(room_dict, max_events, lazy, parser_state):
+    # type: (Dict[Any, Any], int, bool, Tuple[List[Dict[str, Any]], bool]) -> Tuple[RoomInfo, Optional[RoomInfo]]  # noqa
+    """Parse a joined room using the parsing state of the calling process.
+
+    Worker processes don't see event types that were registered, or a
+    validation mode that was changed, after they were started.
+    """
+    parsers, compiled_validation = parser_state
+
+    for registry, registered in zip(_EVENT_REGISTRIES, parsers):
+        if registry._event_parsers != registered:
+            registry._event_parsers.clear()
+            registry._event_parsers.update(registered)
+
+    if schemas._compiled_validation != compiled_validation:
+        use_compiled_validation(compiled_validation)
+
+    return _SyncResponse._get_joined_room(room_dict, max_events, lazy)
+
 
 __all__ = [
     "DeleteDevicesAuthResponse",
@@ -55,6 +114,7 @@ __all__ = [
     "KeysQueryError",
     "KeysUploadResponse",
     "KeysUploadError",
+    "LazyEventList",
     "LoginResponse",
     "LoginError",
     "Response",
@@ -83,6 +143,7 @@ __all__ = [
     "SyncResponse",
     "PartialSyncResponse",
     "SyncError",
+    "SyncStream",
     "Timeline",
     "TypingNoticeEvent",
     "UpdateDeviceResponse",
@@ -147,6 +208,130 @@ class DeviceList(object):
     left = attr.ib(type=List[str])
 
 
+def _parse_room_event(event_dict):
+    # type: (Dict[Any, Any]) -> Union[Event, BadEventType]
+    try:
+        validate_json(event_dict, Schemas.room_event)
+    except (SchemaError, ValidationError) as e:
+        logger.error("Error validating event: {}".format(str(e)))
+        return UnknownBadEvent(event_dict)
+
+    return Event.parse_event(event_dict)
+
+
+class LazyEventList(object):
+    """A list of room events that are parsed on first access.
+
+    The list keeps the raw event dictionaries of a sync response and only
+    validates and parses an event the first time it is accessed. Parsed events
+    replace their raw dictionary so every event is parsed at most once.
+
+    Events that couldn't be parsed into an event object are removed from the
+    list once they are parsed, like they are dropped from eagerly parsed
+    timelines. The length of the list includes the events that weren't parsed
+    yet.
+
+    Args:
+        event_dicts (List[Dict]): The raw event dictionaries of the list.
+    """
+
+    def __init__(self, event_dicts):
+        # type: (List[Dict[Any, Any]]) -> None
+        self._events = list(event_dicts)  # type: List[Any]
+
+    def _parse(self, index):
+        # type: (int) -> Optional[Union[Event, BadEventType]]
+        event = self._events[index]
+
+        if isinstance(event, dict):
+            event = _parse_room_event(event)
+
+            if not event:
+                # Drop events that don't parse into an event object so the
+                # length and the indices of the list agree with iteration.
+                del self._events[index]
+                return None
+
+            self._events[index] = event
+
+        return event
+
+    def _parse_all(self):
+        # type: () -> None
+        for _ in self.items():
+            pass
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._events)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            self._parse_all()
+            return self._events[index]
+
+        while True:
+            event = self._parse(index)
+
+            if event is not None:
+                return event
+
+    def __setitem__(self, index, event):
+        self._events[index] = event
+
+    def __iter__(self):
+        # type: () -> Iterator[Union[Event, BadEventType]]
+        for _, event in self.items():
+            yield event
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "LazyEventList({})".format(list(self))
+
+    def append(self, event):
+        self._events.append(event)
+
+    @property
+    def parsed(self):
+        # type: () -> int
+        """The number of events that have been parsed so far."""
+        return sum(
+            1 for event in self._events if not isinstance(event, dict)
+        )
+
+    def items(self, event_types=None):
+        # type: (Optional[Iterable[str]]) -> Iterator[Tuple[int, Any]]
+        """Iterate over the index and parsed event of the events in the list.
+
+        Args:
+            event_types (Set[str], optional): If given only events with one
+                of the given types are parsed and returned, events that were
+                already parsed are always returned.
+        """
+        index = 0
+
+        while index < len(self._events):
+            event = self._events[index]
+
+            if (event_types is not None and isinstance(event, dict)
+                    and event.get("type") not in event_types):
+                index += 1
+                continue
+
+            event = self._parse(index)
+
+            if event is None:
+                continue
+
+            yield index, event
+            index += 1
+
+
 @attr.s
 class Timeline(object):
     events = attr.ib(type=List)
@@ -192,7 +377,7 @@ class RoomInfo(object):
 
 @attr.s
 class RoomMember(object):
-    user_id = attr.ib(type=str)
+    user_id = attr.ib(type=str, converter=intern)
     display_name = attr.ib(type=str)
     avatar_url = attr.ib(type=str)
 
@@ -927,21 +1112,21 @@ class _SyncResponse(Response):
     @staticmethod
     def _get_room_events(
             parsed_dict,  # type: List[Dict[Any, Any]]
-            max_events=0  # type: int
+            max_events=0,  # type: int
+            lazy=False    # type: bool
     ):
         # type: (...) -> Tuple[int, List[Union[Event, BadEventType]]]
+        if lazy:
+            if max_events > 0:
+                parsed_dict = parsed_dict[:max_events]
+
+            return len(parsed_dict), LazyEventList(parsed_dict)  # type: ignore
+
         events = []  # type: List[Union[Event, BadEventType]]
         counter = 0
 
         for counter, event_dict in enumerate(parsed_dict, 1):
-            try:
-                validate_json(event_dict, Schemas.room_event)
-            except (SchemaError, ValidationError) as e:
-                logger.error("Error validating event: {}".format(str(e)))
-                events.append(UnknownBadEvent(event_dict))
-                continue
-
-            event = Event.parse_event(event_dict)
+            event = _parse_room_event(event_dict)
 
             if event:
                 events.append(event)
@@ -964,13 +1149,14 @@ class _SyncResponse(Response):
         return events
 
     @staticmethod
-    def _get_timeline(parsed_dict, max_events=0):
-        # type: (Dict[Any, Any], int) -> Tuple[int, Timeline]
+    def _get_timeline(parsed_dict, max_events=0, lazy=False):
+        # type: (Dict[Any, Any], int, bool) -> Tuple[int, Timeline]
         validate_json(parsed_dict, Schemas.room_timeline)
 
         counter, events = _SyncResponse._get_room_events(
             parsed_dict["events"],
-            max_events
+            max_events,
+            lazy
         )
 
         return counter, Timeline(
@@ -978,11 +1164,12 @@ class _SyncResponse(Response):
         )
 
     @staticmethod
-    def _get_state(parsed_dict, max_events=0):
+    def _get_state(parsed_dict, max_events=0, lazy=False):
         validate_json(parsed_dict, Schemas.room_state)
         counter, events = _SyncResponse._get_room_events(
             parsed_dict["events"],
-            max_events
+            max_events,
+            lazy
         )
 
         return counter, events
@@ -1030,12 +1217,14 @@ class _SyncResponse(Response):
         ephemeral_events,     # type: List[Any]
         summary_events,       # type: Dict[str, Any]
         account_data_events,  # type: List[Any]
-        max_events=0          # type: int
+        max_events=0,         # type: int
+        lazy=False            # type: bool
     ):
         # type: (...) -> Tuple[RoomInfo, Optional[RoomInfo]]
         counter, state = _SyncResponse._get_room_events(
             state_events,
-            max_events
+            max_events,
+            lazy
         )
 
         unhandled_state = state_events[counter:]
@@ -1051,7 +1240,7 @@ class _SyncResponse(Response):
             counter = 0
         else:
             counter, events = _SyncResponse._get_room_events(
-                timeline_events, timeline_max
+                timeline_events, timeline_max, lazy
             )
             timeline = Timeline(events, limited, prev_batch)
 
@@ -1094,8 +1283,28 @@ class _SyncResponse(Response):
         return join_info, unhandled_info
 
     @staticmethod
-    def _get_room_info(parsed_dict, max_events=0):
-        # type: (Dict[Any, Any], int) -> Tuple[Rooms, Dict[str, RoomInfo]]
+    def _get_joined_room(room_dict, max_events=0, lazy=False):
+        # type: (Dict[Any, Any], int, bool) -> Tuple[RoomInfo, Any]
+        return _SyncResponse._get_join_info(
+            room_dict["state"]["events"],
+            room_dict["timeline"]["events"],
+            room_dict["timeline"]["prev_batch"],
+            room_dict["timeline"]["limited"],
+            room_dict["ephemeral"]["events"],
+            room_dict.get("summary", {}),
+            room_dict["account_data"]["events"],
+            max_events,
+            lazy
+        )
+
+    @staticmethod
+    def _get_room_info(
+        parsed_dict,   # type: Dict[Any, Any]
+        max_events=0,  # type: int
+        lazy=False,    # type: bool
+        executor=None  # type: Optional[Executor]
+    ):
+        # type: (...) -> Tuple[Rooms, Dict[str, RoomInfo]]
         joined_rooms = {
             key: None for key in parsed_dict["join"].keys()
         }  # type: Dict[str, Optional[RoomInfo]]
@@ -1109,23 +1318,36 @@ class _SyncResponse(Response):
             invited_rooms[room_id] = invite_info
 
         for room_id, room_dict in parsed_dict["leave"].items():
-            _, state = _SyncResponse._get_state(room_dict["state"])
-            _, timeline = _SyncResponse._get_timeline(room_dict["timeline"])
+            _, state = _SyncResponse._get_state(
+                room_dict["state"],
+                lazy=lazy
+            )
+            _, timeline = _SyncResponse._get_timeline(
+                room_dict["timeline"],
+                lazy=lazy
+            )
             leave_info = RoomInfo(timeline, state, [], [])
             left_rooms[room_id] = leave_info
 
-        for room_id, room_dict in parsed_dict["join"].items():
-            join_info, unhandled_info = _SyncResponse._get_join_info(
-                room_dict["state"]["events"],
-                room_dict["timeline"]["events"],
-                room_dict["timeline"]["prev_batch"],
-                room_dict["timeline"]["limited"],
-                room_dict["ephemeral"]["events"],
-                room_dict.get("summary", {}),
-                room_dict["account_data"]["events"],
-                max_events
+        if executor and len(parsed_dict["join"]) > 1:
+            room_infos = executor.map(
+                _get_joined_room_in_worker,
+                parsed_dict["join"].values(),
+                repeat(max_events),
+                repeat(lazy),
+                repeat(_parser_state()),
+                chunksize=_PARSE_CHUNK_SIZE
+            )
+        else:
+            room_infos = (
+                _SyncResponse._get_joined_room(room_dict, max_events, lazy)
+                for room_dict in parsed_dict["join"].values()
             )
 
+        for room_id, (join_info, unhandled_info) in zip(
+            parsed_dict["join"],
+            room_infos
+        ):
             if unhandled_info:
                 unhandled_rooms[room_id] = unhandled_info
 
@@ -1137,8 +1359,10 @@ class _SyncResponse(Response):
     @verify(Schemas.sync, SyncError, False)
     def from_dict(
         cls,
-        parsed_dict,  # type: Dict[Any, Any]
-        max_events=0,  # type: int
+        parsed_dict,    # type: Dict[Any, Any]
+        max_events=0,   # type: int
+        lazy=False,     # type: bool
+        executor=None,  # type: Optional[Executor]
     ):
         # type: (...) -> Union[SyncType, ErrorResponse]
         to_device = cls._get_to_device(parsed_dict["to_device"])
@@ -1155,7 +1379,7 @@ class _SyncResponse(Response):
         )
 
         rooms, unhandled_rooms = _SyncResponse._get_room_info(
-            parsed_dict["rooms"], max_events)
+            parsed_dict["rooms"], max_events, lazy, executor)
 
         if unhandled_rooms:
             return PartialSyncResponse(
@@ -1180,30 +1404,109 @@ class SyncResponse(_SyncResponse):
     pass
 
 
+@attr.s(frozen=True)
+class _PartialSyncCursor(object):
+    """Positions of the next unhandled events of a partial sync response.
+
+    Attributes:
+        rooms (List[Tuple[str, int, int]]): The room id and the offsets of the
+            next unhandled state and timeline event of every room that still
+            has unhandled events.
+    """
+
+    rooms = attr.ib(type=List[Tuple[str, int, int]])
+
+
 @attr.s
 class PartialSyncResponse(_SyncResponse):
+    """Part of a sync response whose events are handled in multiple steps.
+
+    Attributes:
+        unhandled_rooms (Dict[str, RoomInfo]): The rooms that had unhandled
+            events after the first part of the response was parsed. The
+            unhandled rooms are shared between all the parts of a response,
+            every part keeps a cursor that points to the next events of
+            every room that need to be handled.
+    """
+
     unhandled_rooms = attr.ib(type=Dict[str, RoomInfo])
+    _cursor = attr.ib(
+        default=None,
+        repr=False,
+        type=Optional[_PartialSyncCursor]
+    )
+
+    @staticmethod
+    def _next_events(
+        events,      # type: List[Any]
+        offset,      # type: int
+        max_events,  # type: int
+    ):
+        # type: (...) -> Tuple[List[Union[Event, BadEventType]], int]
+        end = len(events)
+
+        if max_events > 0:
+            end = min(end, offset + max_events)
+
+        _, parsed_events = _SyncResponse._get_room_events(events[offset:end])
+
+        return parsed_events, end
 
     def next_part(self, max_events=0):
         # type: (int) -> SyncType
-        unhandled_rooms = {}
+        """Parse the next part of the unhandled events.
+
+        Args:
+            max_events (int, optional): The maximum number of events that the
+                next part should contain for every room. Defaults to 0, which
+                handles all the remaining events.
+
+        Returns a PartialSyncResponse if there are still unhandled events
+        after this part, a SyncResponse otherwise.
+        """
+        if self._cursor:
+            rooms = self._cursor.rooms
+        else:
+            rooms = [(room_id, 0, 0) for room_id in self.unhandled_rooms]
+
+        unhandled_rooms = []  # type: List[Tuple[str, int, int]]
         joined_rooms = {}
-        for room_id, room_info in self.unhandled_rooms.items():
-            join_info, unhandled_info = _SyncResponse._get_join_info(
+
+        for room_id, state_offset, timeline_offset in rooms:
+            room_info = self.unhandled_rooms[room_id]
+
+            state, state_end = self._next_events(
                 room_info.state,
-                room_info.timeline.events,
-                room_info.timeline.prev_batch,
-                room_info.timeline.limited,
-                [],
-                {},
-                [],
+                state_offset,
                 max_events
             )
 
-            if unhandled_info:
-                unhandled_rooms[room_id] = unhandled_info
+            timeline_max = max_events - (state_end - state_offset)
+
+            if timeline_max <= 0 and max_events > 0:
+                events = []  # type: List[Union[Event, BadEventType]]
+                timeline_end = timeline_offset
+            else:
+                events, timeline_end = self._next_events(
+                    room_info.timeline.events,
+                    timeline_offset,
+                    timeline_max
+                )
+
+            joined_rooms[room_id] = RoomInfo(
+                Timeline(
+                    events,
+                    room_info.timeline.limited,
+                    room_info.timeline.prev_batch
+                ),
+                state,
+                [],
+                []
+            )
 
-            joined_rooms[room_id] = join_info
+            if (state_end < len(room_info.state)
+                    or timeline_end < len(room_info.timeline.events)):
+                unhandled_rooms.append((room_id, state_end, timeline_end))
 
         new_rooms = Rooms({}, joined_rooms, {})
 
@@ -1214,7 +1517,8 @@ class PartialSyncResponse(_SyncResponse):
                 self.device_key_count,
                 DeviceList([], []),
                 [],
-                unhandled_rooms,
+                self.unhandled_rooms,
+                _PartialSyncCursor(unhandled_rooms)
             )  # type: SyncType
         else:
             next_response = SyncResponse(
@@ -1236,3 +1540,289 @@ class PartialSyncResponse(_SyncResponse):
 
 
 SyncType = Union[SyncResponse, PartialSyncResponse]
+
+
+class _JsonMemberSplitter(object):
+    """Incrementally split the members of a nested JSON object out of a body.
+
+    The splitter is fed the raw bytes of a JSON document, every member of the
+    object found under the given path is returned as soon as its value is
+    complete. The rest of the document is kept as a skeleton where the values
+    of the split out members are replaced with 0.
+
+    Args:
+        path (Tuple[str]): The keys leading to the object whose members should
+            be split out.
+    """
+
+    _token = re.compile(
+        r'\s*(?:("(?:[^"\\]|\\.)*")|([{}\[\]:,])|([^\s{}\[\]:,"]+)|("))'
+    )
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, path):
+        # type: (Tuple[str, ...]) -> None
+        self.path = list(path)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        # Chunks that weren't appended to the buffer yet, see feed().
+        self._chunks = []  # type: List[str]
+        self._chunks_size = 0
+        self._skeleton = []  # type: List[str]
+        # One [bracket, key, expect_key] entry for every open container.
+        self._stack = []  # type: List[List[Any]]
+        self._member = None  # type: Optional[str]
+        self._attempted = 0
+
+    def _at_split_object(self):
+        # type: () -> bool
+        if len(self._stack) != len(self.path) + 1:
+            return False
+
+        top = self._stack[-1]
+
+        if top[0] != "{" or top[2]:
+            return False
+
+        return [entry[1] for entry in self._stack[:-1]] == self.path
+
+    def _split(self, final):
+        # type: (bool) -> Optional[Tuple[str, Any]]
+        # Decoding an incomplete value fails only after the whole buffer has
+        # been scanned, only try again once the buffer doubled in size so the
+        # work stays linear in the size of the value.
+        if not final and len(self._buffer) < 2 * self._attempted:
+            return None
+
+        try:
+            value, end = self._decoder.raw_decode(self._buffer)
+        except ValueError:
+            if final:
+                raise
+
+            self._attempted = len(self._buffer)
+            return None
+
+        member = self._member
+        self._buffer = self._buffer[end:]
+        self._member = None
+        self._attempted = 0
+        self._skeleton.append("0")
+
+        return member, value
+
+    def feed(self, data, final=False):
+        # type: (bytes, bool) -> List[Tuple[str, Any]]
+        """Feed data to the splitter.
+
+        Args:
+            data (bytes): The next chunk of the JSON document.
+            final (bool): True if this is the last chunk of the document.
+
+        Returns a list of (key, value) tuples for the members that were
+        completed by this chunk. Raises a ValueError if the document is
+        invalid.
+        """
+        text = self._utf8.decode(data, final)
+
+        # While a member value is incomplete the chunks are only collected,
+        # they are joined once decoding the value is attempted again.
+        if (self._member is not None and not final
+                and len(self._buffer) + self._chunks_size + len(text)
+                < 2 * self._attempted):
+            self._chunks.append(text)
+            self._chunks_size += len(text)
+            return []
+
+        if self._chunks:
+            self._chunks.append(text)
+            text = "".join(self._chunks)
+            self._chunks = []
+            self._chunks_size = 0
+
+        self._buffer += text
+        members = []
+        position = 0
+
+        while True:
+            if self._member is not None:
+                member = self._split(final)
+
+                if not member:
+                    return members
+
+                members.append(member)
+                continue
+
+            match = self._token.match(self._buffer, position)
+
+            if not match or match.group(4):
+                break
+
+            string, structural, scalar = match.group(1, 2, 3)
+
+            if scalar and match.end() == len(self._buffer) and not final:
+                break
+
+            top = self._stack[-1] if self._stack else None
+
+            if structural == "{" and self._at_split_object():
+                start = match.start(2)
+                self._skeleton.append(self._buffer[position:start])
+                self._buffer = self._buffer[start:]
+                position = 0
+                self._member = top[1]
+                continue
+
+            self._skeleton.append(self._buffer[position:match.end()])
+            position = match.end()
+
+            if structural in ("{", "["):
+                self._stack.append([structural, None, structural == "{"])
+            elif structural in ("}", "]"):
+                self._stack.pop()
+            elif structural == ":" and top:
+                top[2] = False
+            elif structural == "," and top and top[0] == "{":
+                top[2] = True
+            elif string and top and top[2]:
+                top[1] = json.loads(string)
+
+        self._buffer = self._buffer[position:]
+        return members
+
+    def skeleton(self):
+        # type: () -> Any
+        """Parse the rest of the document.
+
+        This should be called after the last chunk of the document has been
+        fed with the final flag set.
+
+        Returns the decoded document without the members that were split out.
+        Raises a ValueError if the document is incomplete or invalid.
+        """
+        self._skeleton.append(self._buffer)
+        return json.loads("".join(self._skeleton))
+
+
+class SyncStream(object):
+    """Incremental parser for sync response bodies.
+
+    The body of a sync response is fed to the stream in chunks, every joined
+    room is parsed as soon as its part of the body is complete. The raw JSON
+    text and dictionary of a room are dropped once the room has been parsed,
+    so the response body never needs to be held in memory as a whole.
+
+    The parsed rooms are kept until `finish()` returns the rest of the
+    response, unless they are released using `release()`. Rooms that were
+    already handled, e.g. because they don't contain events that need keys
+    from the to-device events that can follow the rooms in the body, should be
+    released so the memory stays bounded by the rooms that are held back.
+
+    Args:
+        lazy (bool, optional): Should the room events be parsed lazily, see
+            `LazyEventList`.
+
+    Attributes:
+        rooms (Dict[str, RoomInfo]): The joined rooms that were parsed so far
+            and weren't released.
+        error (bool): True if the body turned out to be invalid, no more rooms
+            will be parsed in that case and `finish()` returns a SyncError.
+    """
+
+    def __init__(self, lazy=False):
+        # type: (bool) -> None
+        self.lazy = lazy
+        self.rooms = {}  # type: Dict[str, RoomInfo]
+        self.error = False
+        self._splitter = _JsonMemberSplitter(("rooms", "join"))
+
+    def _get_room(self, room_id, room_dict):
+        # type: (str, Dict[Any, Any]) -> PartialSyncResponse
+        validate_json(
+            {room_id: room_dict},
+            Schemas.sync["properties"]["rooms"]["properties"]["join"]
+        )
+
+        join_info, _ = _SyncResponse._get_joined_room(
+            room_dict,
+            lazy=self.lazy
+        )
+
+        self.rooms[room_id] = join_info
+
+        return PartialSyncResponse(
+            "",
+            Rooms({}, {room_id: join_info}, {}),
+            DeviceOneTimeKeyCount(None, None),
+            DeviceList([], []),
+            [],
+            {}
+        )
+
+    def feed(self, data, final=False):
+        # type: (bytes, bool) -> List[PartialSyncResponse]
+        """Feed a chunk of the response body to the stream.
+
+        Args:
+            data (bytes): The next chunk of the response body.
+            final (bool): True if this is the last chunk of the response body.
+
+        Returns a list of PartialSyncResponse objects, one for every joined
+        room that was completed by this chunk.
+        """
+        if self.error:
+            return []
+
+        try:
+            return [
+                self._get_room(room_id, room_dict)
+                for room_id, room_dict in self._splitter.feed(data, final)
+            ]
+        except (SchemaError, ValidationError, ValueError) as e:
+            logger.error("Error parsing sync response: {}".format(str(e)))
+            self.error = True
+            return []
+
+    def release(self, room_id):
+        # type: (str) -> None
+        """Drop a parsed room that doesn't need to be part of the response.
+
+        Args:
+            room_id (str): The room id of the room that should be released.
+        """
+        self.rooms.pop(room_id, None)
+
+    def finish(self):
+        # type: () -> Union[SyncResponse, SyncError]
+        """Parse the rest of the response body.
+
+        This should be called after the last chunk of the response body has
+        been fed with the final flag set.
+
+        Returns a SyncResponse that contains the joined rooms of the stream
+        that weren't released, or a SyncError if the response isn't a valid
+        sync response.
+        """
+        parsed_dict = {}  # type: Dict[Any, Any]
+
+        if not self.error:
+            try:
+                parsed_dict = self._splitter.skeleton()
+            except ValueError as e:
+                logger.error("Error parsing sync response: {}".format(str(e)))
+
+        if not isinstance(parsed_dict, dict):
+            parsed_dict = {}
+
+        rooms = parsed_dict.get("rooms", None)
+
+        if isinstance(rooms, dict) and isinstance(rooms.get("join"), dict):
+            rooms["join"] = {}
+
+        response = SyncResponse.from_dict(parsed_dict, 0, self.lazy)
+
+        if isinstance(response, SyncResponse):
+            response.rooms.join.update(self.rooms)
+
+        return response
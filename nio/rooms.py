@@ -17,12 +17,16 @@
 from __future__ import unicode_literals
 
 from builtins import super
-from collections import defaultdict
-from typing import Any, DefaultDict, Dict, List, NamedTuple, Optional
+from collections import OrderedDict
+from heapq import nsmallest
+from typing import (Any, Callable, Dict, FrozenSet, Iterator, List,
+                    NamedTuple, Optional, Set)
 
+import attr
 from jsonschema.exceptions import SchemaError, ValidationError
 from logbook import Logger
 
+from ._compat import intern
 from .events import (Event, InviteAliasEvent, InviteMemberEvent,
                      InviteNameEvent, PowerLevels, PowerLevelsEvent,
                      RoomAliasEvent, RoomCreateEvent, RoomEncryptionEvent,
@@ -32,19 +36,456 @@ from .events import (Event, InviteAliasEvent, InviteMemberEvent,
 from .log import logger_group
 from .responses import RoomSummary, TypingNoticeEvent
 
+try:
+    from collections.abc import MutableMapping
+except ImportError:  # pragma: no cover
+    from collections import MutableMapping
+
 logger = Logger("nio.rooms")
 logger_group.add_logger(logger)
 
 
+class EncryptedRoomIndex(object):
+    """Index of the encrypted rooms that users are members of.
+
+    The index is shared between the rooms of a client and updated by the
+    rooms as their member list changes.
+    """
+
+    def __init__(self):
+        # type: () -> None
+        self._rooms = dict()  # type: Dict[str, Set[str]]
+
+    def __contains__(self, user_id):
+        # type: (str) -> bool
+        return user_id in self._rooms
+
+    def __iter__(self):
+        # type: () -> Iterator[str]
+        """Iterate over the users that are members of an encrypted room."""
+        return iter(self._rooms)
+
+    def add(self, user_id, room_id):
+        # type: (str, str) -> None
+        """Mark the user as a member of the encrypted room."""
+        self._rooms.setdefault(user_id, set()).add(room_id)
+
+    def remove(self, user_id, room_id):
+        # type: (str, str) -> None
+        """Remove the encrypted room from the rooms of the user."""
+        rooms = self._rooms.get(user_id, None)
+
+        if rooms is None:
+            return
+
+        rooms.discard(room_id)
+
+        if not rooms:
+            del self._rooms[user_id]
+
+    def rooms(self, user_id):
+        # type: (str) -> FrozenSet[str]
+        """Get the ids of the encrypted rooms the user is a member of."""
+        return frozenset(self._rooms.get(user_id, ()))
+
+
+class RoomCache(MutableMapping):
+    """Mapping of room ids to rooms that keeps a bounded number of rooms.
+
+    Once more than max_rooms rooms are resident, the least recently used
+    rooms are evicted using the save function. Evicted rooms stay part of the
+    mapping and are loaded again using the load function once they are
+    accessed. Iterating over the keys or checking if a room is part of the
+    mapping doesn't load evicted rooms.
+
+    Args:
+        max_rooms (int): The maximum number of resident rooms, 0 disables
+            the eviction of rooms.
+        load (Callable[[str], Optional[MatrixRoom]]): Function loading an
+            evicted room, returns None if the room can't be loaded.
+        save (Callable[[MatrixRoom], bool]): Function saving a room that
+            should be evicted, returns False if the room couldn't be saved.
+            The room stays resident in that case.
+    """
+
+    def __init__(self, max_rooms, load, save):
+        # type: (int, Callable[[str], Optional[MatrixRoom]], Callable[[MatrixRoom], bool]) -> None  # noqa
+        self.max_rooms = max_rooms
+        self._load = load
+        self._save = save
+        # Resident rooms, ordered from the least to the most recently used.
+        self._resident = OrderedDict()  # type: OrderedDict[str, MatrixRoom]
+        self._evicted = set()  # type: Set[str]
+
+    def is_resident(self, room_id):
+        # type: (str) -> bool
+        """Check if the room is currently held in memory."""
+        return room_id in self._resident
+
+    def discard(self, room_id):
+        # type: (str) -> Optional[MatrixRoom]
+        """Remove a room from the mapping without loading it.
+
+        Returns the room if it was resident, None if it was evicted or isn't
+        part of the mapping.
+        """
+        self._evicted.discard(room_id)
+        return self._resident.pop(room_id, None)
+
+    def add_stored(self, rooms):
+        # type: (Dict[str, MatrixRoom]) -> None
+        """Add rooms that are already saved.
+
+        Rooms are kept resident as long as there is space for them, the rest
+        is marked as evicted without saving them again.
+        """
+        for room_id, room in rooms.items():
+            if not self.max_rooms or len(self._resident) < self.max_rooms:
+                self._resident[room_id] = room
+            else:
+                self._evicted.add(room_id)
+
+    def _evict(self):
+        # type: () -> None
+        if not self.max_rooms:
+            return
+
+        while len(self._resident) > self.max_rooms:
+            room_id, room = next(iter(self._resident.items()))
+
+            if not self._save(room):
+                return
+
+            logger.debug("Evicting room {}".format(room_id))
+            del self._resident[room_id]
+            self._evicted.add(room_id)
+
+    def __getitem__(self, room_id):
+        # type: (str) -> MatrixRoom
+        if room_id in self._resident:
+            room = self._resident.pop(room_id)
+            self._resident[room_id] = room
+            return room
+
+        if room_id not in self._evicted:
+            raise KeyError(room_id)
+
+        room = self._load(room_id)
+
+        if room is None:
+            raise KeyError(room_id)
+
+        logger.debug("Loading evicted room {}".format(room_id))
+        self._evicted.discard(room_id)
+        self._resident[room.room_id] = room
+        self._evict()
+
+        return room
+
+    def __setitem__(self, room_id, room):
+        # type: (str, MatrixRoom) -> None
+        self._evicted.discard(room_id)
+        self._resident.pop(room_id, None)
+        self._resident[room_id] = room
+        self._evict()
+
+    def __delitem__(self, room_id):
+        # type: (str) -> None
+        if room_id in self._resident:
+            del self._resident[room_id]
+        elif room_id in self._evicted:
+            self._evicted.remove(room_id)
+        else:
+            raise KeyError(room_id)
+
+    def __contains__(self, room_id):
+        # type: (object) -> bool
+        return room_id in self._resident or room_id in self._evicted
+
+    def __iter__(self):
+        # type: () -> Iterator[str]
+        # Accessing the rooms while iterating changes the order of the
+        # resident rooms, iterate over a copy of the keys.
+        return iter(list(self._resident) + list(self._evicted))
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._resident) + len(self._evicted)
+
+
+@attr.s
+class TimelineGap(object):
+    """Marker for events that are missing from a room timeline.
+
+    Attributes:
+        prev_batch (str): The token that can be used to paginate backwards
+            from this point of the timeline to fetch the missing events.
+    """
+
+    prev_batch = attr.ib(type=str)
+
+
+class TimelineBudget(object):
+    """Limit for the number of events of a group of room timelines.
+
+    Once the limit is exceeded, the oldest entries of the least recently
+    updated timelines are dropped.
+
+    Args:
+        max_events (int): The maximum number of entries of all the timelines
+            combined.
+    """
+
+    def __init__(self, max_events):
+        # type: (int) -> None
+        self.max_events = max_events
+        self.event_count = 0
+        # Timelines with entries, ordered from the least to the most recently
+        # updated one.
+        self._timelines = OrderedDict()  # type: OrderedDict[int, RoomTimeline]
+
+    def _added(self, timeline):
+        # type: (RoomTimeline) -> None
+        self.event_count += 1
+        key = id(timeline)
+        self._timelines.pop(key, None)
+        self._timelines[key] = timeline
+
+        while self.event_count > self.max_events:
+            oldest = next(iter(self._timelines.values()))
+            oldest._pop_oldest()
+
+    def _removed(self, timeline, count=1):
+        # type: (RoomTimeline, int) -> None
+        self.event_count -= count
+
+        if not len(timeline):
+            self._timelines.pop(id(timeline), None)
+
+
+class RoomTimeline(object):
+    """Bounded timeline of the most recent events of a room.
+
+    The timeline is a ring buffer holding up to max_events entries. An entry
+    is either an event or a TimelineGap marking events that are missing from
+    the timeline. Events can be looked up by their event id in constant
+    time, the oldest entries are dropped once the timeline is full.
+
+    Args:
+        max_events (int): The maximum number of entries of the timeline.
+        budget (TimelineBudget, optional): A limit for the number of entries
+            that is shared with the timelines of other rooms.
+    """
+
+    def __init__(self, max_events, budget=None):
+        # type: (int, Optional[TimelineBudget]) -> None
+        self.max_events = max_events
+        self.budget = budget
+        self._slots = [None] * max_events  # type: List[Any]
+        # Sequence numbers of the oldest entry and of the next appended
+        # entry, the slot of an entry is its sequence number modulo the size
+        # of the buffer.
+        self._first = 0
+        self._next = 0
+        self._index = dict()  # type: Dict[str, int]
+        self._gap_token = None  # type: Optional[str]
+
+    def __len__(self):
+        # type: () -> int
+        return self._next - self._first
+
+    def __iter__(self):
+        # type: () -> Iterator[Any]
+        """Iterate over the entries from the oldest to the newest one."""
+        for sequence in range(self._first, self._next):
+            yield self._slots[sequence % self.max_events]
+
+    def __contains__(self, event_id):
+        # type: (str) -> bool
+        return event_id in self._index
+
+    def get(self, event_id):
+        # type: (str) -> Optional[Event]
+        """Get an event of the timeline by its event id.
+
+        Returns the event, or None if the event isn't part of the timeline.
+        """
+        sequence = self._index.get(event_id, None)
+
+        if sequence is None:
+            return None
+
+        return self._slots[sequence % self.max_events]
+
+    def _store(self, sequence, entry):
+        # type: (int, Any) -> None
+        self._slots[sequence % self.max_events] = entry
+        event_id = getattr(entry, "event_id", None)
+
+        if event_id:
+            self._index[event_id] = sequence
+
+        if self.budget:
+            self.budget._added(self)
+
+    def _pop_oldest(self):
+        # type: () -> Any
+        slot = self._first % self.max_events
+        entry = self._slots[slot]
+        self._slots[slot] = None
+
+        event_id = getattr(entry, "event_id", None)
+
+        if event_id and self._index.get(event_id, None) == self._first:
+            del self._index[event_id]
+
+        self._first += 1
+
+        if self.budget:
+            self.budget._removed(self)
+
+        return entry
+
+    def append(self, entry):
+        # type: (Any) -> None
+        """Add an event or a gap as the newest entry of the timeline.
+
+        Events that are already part of the timeline are ignored.
+        """
+        if getattr(entry, "event_id", None) in self._index:
+            return
+
+        if len(self) == self.max_events:
+            self._pop_oldest()
+
+        self._next += 1
+        self._store(self._next - 1, entry)
+
+    def add_gap(self, prev_batch):
+        # type: (str) -> None
+        """Mark that events are missing before the following entries.
+
+        The entries of the timeline that are older than the gap aren't
+        contiguous with the following events anymore, they are removed so
+        that the gap becomes the oldest entry and can be filled using
+        fill_gap().
+
+        Args:
+            prev_batch (str): The token that can be used to paginate
+                backwards to fetch the missing events.
+        """
+        # A gap for the token was already added, e.g. by an earlier part of
+        # a partial sync response.
+        if prev_batch == self._gap_token:
+            return
+
+        self.clear()
+        self._gap_token = prev_batch
+        self.append(TimelineGap(prev_batch))
+
+    def fill_gap(self, prev_batch, events, end=None):
+        # type: (str, List[Any], Optional[str]) -> bool
+        """Fill the gap at the start of the timeline with older events.
+
+        Only a gap that is the oldest entry of the timeline can be filled,
+        events that don't fit into the timeline anymore are dropped.
+
+        Args:
+            prev_batch (str): The token of the gap, the start token of the
+                backwards pagination.
+            events (List[Event]): The events of the pagination, ordered from
+                the newest to the oldest one.
+            end (str, optional): The token to continue the pagination from,
+                a new gap is added for it if there is space left.
+
+        Returns True if the gap was filled, False if the oldest entry isn't a
+        gap for the given token.
+        """
+        if not len(self):
+            return False
+
+        oldest = self._slots[self._first % self.max_events]
+
+        if (not isinstance(oldest, TimelineGap)
+                or oldest.prev_batch != prev_batch):
+            return False
+
+        self._pop_oldest()
+
+        for event in events:
+            if len(self) == self.max_events:
+                return True
+
+            self._prepend(event)
+
+        if events and end and len(self) < self.max_events:
+            self._prepend(TimelineGap(end))
+
+        return True
+
+    def _prepend(self, entry):
+        # type: (Any) -> None
+        if getattr(entry, "event_id", None) in self._index:
+            return
+
+        self._first -= 1
+        self._store(self._first, entry)
+
+    def clear(self):
+        # type: () -> None
+        """Remove all the entries of the timeline."""
+        count = len(self)
+        self._slots = [None] * self.max_events
+        self._first = self._next = 0
+        self._index.clear()
+        self._gap_token = None
+
+        if self.budget and count:
+            self.budget._removed(self, count)
+
+
 class MatrixRoom(object):
     """Represents a Matrix room."""
 
-    def __init__(self, room_id, own_user_id, encrypted=False):
-        # type: (str, str, bool) -> None
-        """Initialize a MatrixRoom object."""
+    # The event types that change the state of the room.
+    state_event_types = frozenset([
+        "m.room.create",
+        "m.room.guest_access",
+        "m.room.history_visibility",
+        "m.room.join_rules",
+        "m.room.name",
+        "m.room.canonical_alias",
+        "m.room.topic",
+        "m.room.encryption",
+        "m.room.power_levels",
+        "m.room.member",
+    ])
+
+    def __init__(
+        self,
+        room_id,                     # type: str
+        own_user_id,                 # type: str
+        encrypted=False,             # type: bool
+        encrypted_room_index=None,   # type: Optional[EncryptedRoomIndex]
+    ):
+        # type: (...) -> None
+        """Initialize a MatrixRoom object.
+
+        Args:
+            room_id (str): The id of the room.
+            own_user_id (str): The user id of our own user.
+            encrypted (bool, optional): Is the room encrypted.
+            encrypted_room_index (EncryptedRoomIndex, optional): An index that
+                the room should keep up to date with its members while it is
+                encrypted.
+        """
         # yapf: disable
-        self.room_id = room_id        # type: str
-        self.own_user_id = own_user_id
+        # Cached display names of the room and of its members, invalidated
+        # when the name, alias or the member list of the room changes.
+        self._display_name = None     # type: Optional[str]
+        self._user_names = dict()     # type: Dict[str, str]
+        self.room_id = intern(room_id)  # type: str
+        self.own_user_id = intern(own_user_id)
         self.creator = ""             # type: str
         self.federate = True          # type: bool
         self.room_version = "1"       # type: str
@@ -55,13 +496,56 @@ class MatrixRoom(object):
         self.topic = None             # type: Optional[str]
         self.name = None              # type: Optional[str]
         self.users = dict()           # type: Dict[str, MatrixUser]
-        self.names = defaultdict(list)  # type: DefaultDict[str, List[str]]
+        self.names = dict()           # type: Dict[str, Set[str]]
         self.encrypted = encrypted    # type: bool
         self.power_levels = PowerLevels()  # type: PowerLevels
         self.typing_users = []        # type: List[str]
         self.summary = None           # type: Optional[RoomSummary]
+        self.encrypted_room_index = encrypted_room_index \
+            # type: Optional[EncryptedRoomIndex]
+        # The recent events of the room, only kept if the client is
+        # configured to do so.
+        self.timeline = None          # type: Optional[RoomTimeline]
         # yapf: enable
 
+    @property
+    def name(self):
+        # type: () -> Optional[str]
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        # type: (Optional[str]) -> None
+        self._name = name
+        self._display_name = None
+
+    @property
+    def canonical_alias(self):
+        # type: () -> Optional[str]
+        return self._canonical_alias
+
+    @canonical_alias.setter
+    def canonical_alias(self, canonical_alias):
+        # type: (Optional[str]) -> None
+        self._canonical_alias = canonical_alias
+        self._display_name = None
+
+    def _invalidate_names(self, name, user_id):
+        # type: (str, str) -> None
+        """Invalidate the cached names after the users of a name changed.
+
+        The user was either added to or removed from the users of the name.
+        The names of the other users sharing the name only change if the name
+        switched between being unique and being shared.
+        """
+        self._display_name = None
+        self._user_names.pop(user_id, None)
+        user_ids = self.names.get(name, ())
+
+        if len(user_ids) <= 2:
+            for other_id in user_ids:
+                self._user_names.pop(other_id, None)
+
     @property
     def display_name(self):
         """Calculate display name for a room.
@@ -75,11 +559,17 @@ class MatrixRoom(object):
         An exception is that we prepend '#' before the room name to make it
         visually distinct from private messages and unnamed groups of users
         ("direct chats") in weechat's buffer list.
+
+        The display name is cached until the name, the canonical alias or the
+        members of the room change.
         """
-        if self.is_named:
-            return self.named_room_name()
-        else:
-            return self.group_name()
+        if self._display_name is None:
+            if self.is_named:
+                self._display_name = self.named_room_name()
+            else:
+                self._display_name = self.group_name()
+
+        return self._display_name
 
     def named_room_name(self):
         """Return the name of the room, if it's a named room.
@@ -102,14 +592,19 @@ class MatrixRoom(object):
         is used for ad-hoc groups of people (usually direct chats).
         """
         # Sort user display names, excluding our own user and using the
-        # mxid as the sorting key.
+        # mxid as the sorting key. Only the first two names are ever used.
 
         user_names = [
             self.user_name(u)
-            for u in sorted(self.users.keys())
-            if u != self.own_user_id
+            for u in nsmallest(
+                2,
+                (u for u in self.users if u != self.own_user_id)
+            )
         ]
-        num_users = len(user_names)
+        num_users = len(self.users)
+
+        if self.own_user_id in self.users:
+            num_users -= 1
 
         if num_users == 1:
             return user_names[0]
@@ -129,17 +624,28 @@ class MatrixRoom(object):
         a display name in form "<display name> (<matrix id>)" if there is
         more than one user with same display name.
         """
+        try:
+            return self._user_names[user_id]
+        except KeyError:
+            pass
+
         if user_id not in self.users:
             return None
 
         user = self.users[user_id]
-        if len(self.names[user.name]) > 1:
-            return user.disambiguated_name
-        return user.name
+
+        if len(self.names.get(user.name, ())) > 1:
+            name = user.disambiguated_name
+        else:
+            name = user.name
+
+        self._user_names[user_id] = name
+        return name
 
     def user_name_clashes(self, name):
+        # type: (str) -> List[str]
         """Get a list of users that have same display name."""
-        return self.names[name]
+        return list(self.names.get(name, ()))
 
     def avatar_url(self, user_id):
         # type: (str) -> Optional[str]
@@ -180,10 +686,29 @@ class MatrixRoom(object):
         """
         return not self.is_named
 
+    def _add_name(self, name, user_id):
+        # type: (str, str) -> None
+        self.names.setdefault(name, set()).add(user_id)
+
+    def _remove_name(self, name, user_id):
+        # type: (str, str) -> None
+        user_ids = self.names.get(name, None)
+
+        if user_ids is None:
+            return
+
+        user_ids.discard(user_id)
+
+        if not user_ids:
+            del self.names[name]
+
     def add_member(self, user_id, display_name, avatar_url):
         if user_id in self.users:
             return
 
+        user_id = intern(user_id)
+        display_name = intern(display_name)
+
         level = self.power_levels.users.get(
             user_id,
             self.power_levels.defaults.users_default
@@ -193,13 +718,21 @@ class MatrixRoom(object):
         self.users[user_id] = user
 
         name = display_name if display_name else user_id
-        self.names[name].append(user_id)
+        self._add_name(name, user_id)
+        self._invalidate_names(name, user_id)
+
+        if self.encrypted and self.encrypted_room_index is not None:
+            self.encrypted_room_index.add(user_id, self.room_id)
 
     def remove_member(self, user_id):
         if user_id in self.users:
             user = self.users[user_id]
-            self.names[user.name].remove(user.user_id)
+            self._remove_name(user.name, user.user_id)
             del self.users[user_id]
+            self._invalidate_names(user.name, user.user_id)
+
+            if self.encrypted_room_index is not None:
+                self.encrypted_room_index.remove(user_id, self.room_id)
 
     def handle_membership(self, event):
         # type: (RoomMemberEvent) -> bool
@@ -223,9 +756,12 @@ class MatrixRoom(object):
             # Handle profile changes
             user = self.users[event.sender]
             if "displayname" in event.content:
-                self.names[user.name].remove(user.user_id)
+                old_name = user.name
+                self._remove_name(old_name, user.user_id)
                 user.display_name = event.content["displayname"]
-                self.names[user.name].append(user.user_id)
+                self._add_name(user.name, user.user_id)
+                self._invalidate_names(old_name, user.user_id)
+                self._invalidate_names(user.name, user.user_id)
                 return False
 
             if "avatar_url" in event.content:
@@ -275,6 +811,10 @@ class MatrixRoom(object):
             self.topic = event.topic
 
         elif isinstance(event, RoomEncryptionEvent):
+            if not self.encrypted and self.encrypted_room_index is not None:
+                for user_id in self.users:
+                    self.encrypted_room_index.add(user_id, self.room_id)
+
             self.encrypted = True
 
         elif isinstance(event, PowerLevelsEvent):
@@ -374,6 +914,9 @@ class MatrixInvitedRoom(MatrixRoom):
 
 
 class MatrixUser(object):
+    # Rooms can have a huge number of members, avoid a per member __dict__.
+    __slots__ = ("user_id", "display_name", "avatar_url", "power_level")
+
     def __init__(
         self, user_id, display_name=None, avatar_url=None, power_level=0
     ):
@@ -16,7 +16,17 @@
 
 from __future__ import unicode_literals
 
+import numbers
+import re
+from typing import Any, Callable, Dict, List, Tuple
+
 from jsonschema import Draft4Validator, FormatChecker, validators
+from jsonschema.exceptions import ValidationError
+
+try:
+    _string_types = (basestring, )  # type: ignore # noqa: F821
+except NameError:
+    _string_types = (str, )
 
 RoomRegex = "^!.+:.+$"
 UserIdRegex = "^@.*:.+$"
@@ -59,8 +69,312 @@ def check_user_id(value):
     return True
 
 
+_format_checker = FormatChecker()
+
+# Validators keyed by the id of the schema they were built for. The schema
+# itself is kept alongside the validator so the id can't be recycled for a
+# different dict while the entry is alive.
+_validator_cache = {}  # type: Dict[int, Tuple[Dict[Any, Any], Any]]
+
+
+def _get_validator(schema):
+    # type: (Dict[Any, Any]) -> Any
+    """Get a validator for the given schema, creating one if necessary."""
+    try:
+        cached_schema, validator = _validator_cache[id(schema)]
+        if cached_schema is schema:
+            return validator
+    except KeyError:
+        pass
+
+    validator = Validator(schema, format_checker=_format_checker)
+    _validator_cache[id(schema)] = (schema, validator)
+
+    return validator
+
+
+class _UnsupportedSchema(Exception):
+    pass
+
+
+class _SchemaCompiler(object):
+    """Turn a JSON schema into the source code of a python checker function.
+
+    Only the subset of draft 4 that our schemas use is supported, schemas
+    that use other draft 4 keywords raise an _UnsupportedSchema exception.
+    Like in draft 4 unknown keywords (e.g. const) are ignored. Properties with
+    a default value are filled in the same way the extend_with_default
+    validator does it.
+    """
+
+    type_checks = {
+        "object": "isinstance({0}, dict)",
+        "array": "isinstance({0}, list)",
+        "string": "isinstance({0}, _string_types)",
+        "integer": "(isinstance({0}, _Integral) "
+                   "and not isinstance({0}, bool))",
+        "number": "(isinstance({0}, _Number) and not isinstance({0}, bool))",
+        "boolean": "isinstance({0}, bool)",
+        "null": "{0} is None",
+    }
+
+    ignored_keywords = ["default", "const"]
+
+    def __init__(self):
+        self.lines = []  # type: List[str]
+        self.namespace = {
+            "_string_types": _string_types,
+            "_Integral": numbers.Integral,
+            "_Number": numbers.Number,
+            "_error": _compiled_error,
+            "_format_checker": _format_checker,
+            "_get_validator": _get_validator,
+        }  # type: Dict[str, Any]
+        self.counter = 0
+
+    def compile(self, schema):
+        # type: (Dict[Any, Any]) -> Callable[[Any], None]
+        self.lines.append("def validate(instance):")
+        self.emit_schema(schema, "instance", 1)
+        self.lines.append("    return None")
+
+        code = compile(
+            "\n".join(self.lines),
+            "<nio.schemas compiled validator>",
+            "exec"
+        )
+        exec(code, self.namespace)
+        return self.namespace["validate"]
+
+    def new_name(self, prefix):
+        # type: (str) -> str
+        self.counter += 1
+        return "{}{}".format(prefix, self.counter)
+
+    def constant(self, value):
+        # type: (Any) -> str
+        name = self.new_name("_const")
+        self.namespace[name] = value
+        return name
+
+    def emit(self, indent, line):
+        # type: (int, str) -> None
+        self.lines.append("    " * indent + line)
+
+    def emit_schema(self, schema, var, indent):
+        # type: (Dict[Any, Any], str, int) -> None
+        # Some of our schemas contain malformed subschemas, leave those to
+        # jsonschema so they behave exactly the same.
+        if not isinstance(schema, dict):
+            self.emit(indent, "_get_validator({}).validate({})".format(
+                self.constant(schema), var
+            ))
+            return
+
+        # Keywords are handled in the order of the schema so the first
+        # error we raise is the same one the interpreting validator reports.
+        for keyword, value in schema.items():
+            if keyword in self.ignored_keywords:
+                continue
+
+            method = getattr(self, "emit_" + keyword, None)
+
+            if method:
+                method(value, schema, var, indent)
+            elif keyword in Draft4Validator.VALIDATORS:
+                raise _UnsupportedSchema(
+                    "Unsupported keyword {}".format(keyword)
+                )
+
+    def emit_type(self, value, schema, var, indent):
+        types = value if isinstance(value, list) else [value]
+
+        try:
+            checks = [self.type_checks[t].format(var) for t in types]
+        except KeyError as e:
+            raise _UnsupportedSchema("Unsupported type {}".format(e))
+
+        self.emit(indent, "if not ({}):".format(" or ".join(checks)))
+        self.emit(indent + 1, "_error('%r is not of type %s', {}, {})".format(
+            var, self.constant(", ".join(types))
+        ))
+
+    def emit_properties(self, value, schema, var, indent):
+        self.emit(indent, "if isinstance({}, dict):".format(var))
+
+        for name, subschema in value.items():
+            if "default" in subschema:
+                self.emit(indent + 1, "{}.setdefault({}, {})".format(
+                    var, self.constant(name),
+                    self.constant(subschema["default"])
+                ))
+
+        for name, subschema in value.items():
+            key = self.constant(name)
+            item = self.new_name("v")
+            self.emit(indent + 1, "if {} in {}:".format(key, var))
+            self.emit(indent + 2, "{} = {}[{}]".format(item, var, key))
+            self.emit_schema(subschema, item, indent + 2)
+
+        self.emit(indent + 1, "pass")
+
+    def emit_required(self, value, schema, var, indent):
+        self.emit(indent, "if isinstance({}, dict):".format(var))
+
+        for name in value:
+            key = self.constant(name)
+            self.emit(indent + 1, "if {} not in {}:".format(key, var))
+            self.emit(indent + 2, "_error('%r is a required property', "
+                                  "{})".format(key))
+
+        self.emit(indent + 1, "pass")
+
+    def emit_patternProperties(self, value, schema, var, indent):
+        key = self.new_name("k")
+        item = self.new_name("v")
+
+        self.emit(indent, "if isinstance({}, dict):".format(var))
+        self.emit(indent + 1, "for {}, {} in {}.items():".format(
+            key, item, var
+        ))
+
+        for pattern, subschema in value.items():
+            regex = self.constant(re.compile(pattern))
+            self.emit(indent + 2, "if {}.search({}):".format(regex, key))
+            self.emit_schema(subschema, item, indent + 3)
+            self.emit(indent + 3, "pass")
+
+    def emit_additionalProperties(self, value, schema, var, indent):
+        if value is True or value == {}:
+            return
+
+        properties = self.constant(frozenset(schema.get("properties", {})))
+        patterns = self.constant([
+            re.compile(p) for p in schema.get("patternProperties", {})
+        ])
+        key = self.new_name("k")
+
+        self.emit(indent, "if isinstance({}, dict):".format(var))
+        self.emit(indent + 1, "for {} in {}:".format(key, var))
+        self.emit(indent + 2, "if {} in {}:".format(key, properties))
+        self.emit(indent + 3, "continue")
+        self.emit(indent + 2, "if any(p.search({}) for p in {}):".format(
+            key, patterns
+        ))
+        self.emit(indent + 3, "continue")
+
+        if value is False:
+            self.emit(indent + 2, "_error('Additional property %r is not "
+                                  "allowed', {})".format(key))
+        else:
+            item = self.new_name("v")
+            self.emit(indent + 2, "{} = {}[{}]".format(item, var, key))
+            self.emit_schema(value, item, indent + 2)
+
+    def emit_items(self, value, schema, var, indent):
+        if not isinstance(value, dict):
+            raise _UnsupportedSchema("Only a single items schema is supported")
+
+        item = self.new_name("v")
+        self.emit(indent, "if isinstance({}, list):".format(var))
+        self.emit(indent + 1, "for {} in {}:".format(item, var))
+        self.emit_schema(value, item, indent + 2)
+        self.emit(indent + 2, "pass")
+
+    def emit_enum(self, value, schema, var, indent):
+        self.emit(indent, "if {} not in {}:".format(var, self.constant(value)))
+        self.emit(indent + 1, "_error('%r is not one of %r', {}, {})".format(
+            var, self.constant(value)
+        ))
+
+    def emit_minimum(self, value, schema, var, indent):
+        operator = "<=" if schema.get("exclusiveMinimum", False) else "<"
+        self.emit(indent, "if ({} and {} {} {}):".format(
+            self.type_checks["number"].format(var), var, operator,
+            self.constant(value)
+        ))
+        self.emit(indent + 1, "_error('%r is less than the minimum of %r', "
+                              "{}, {})".format(var, self.constant(value)))
+
+    def emit_exclusiveMinimum(self, value, schema, var, indent):
+        # Handled together with the minimum keyword.
+        pass
+
+    def emit_format(self, value, schema, var, indent):
+        # Formats that the format checker doesn't know are ignored.
+        if value not in _format_checker.checkers:
+            return
+
+        self.emit(indent, "if not _format_checker.conforms({}, {}):".format(
+            var, self.constant(value)
+        ))
+        self.emit(indent + 1, "_error('%r is not a %r', {}, {})".format(
+            var, self.constant(value)
+        ))
+
+
+def _compiled_error(message, *args):
+    raise ValidationError(message % args)
+
+
+def compile_schema(schema):
+    # type: (Dict[Any, Any]) -> Callable[[Any], None]
+    """Compile a JSON schema into a specialized validation function.
+
+    The returned function raises a ValidationError if the instance doesn't
+    match the schema, defaults of the schema are filled in the same way as
+    for the ``Validator`` class.
+
+    If the schema uses keywords that the compiler doesn't support the
+    validate method of a regular ``Validator`` is returned instead.
+    """
+    try:
+        return _SchemaCompiler().compile(schema)
+    except _UnsupportedSchema:
+        return _get_validator(schema).validate
+
+
+# Compiled validators use the same caching scheme as the validator cache.
+_compiled_cache = {}  # type: Dict[int, Tuple[Dict[Any, Any], Any]]
+_compiled_validation = False
+
+
+def _get_compiled_validator(schema):
+    # type: (Dict[Any, Any]) -> Callable[[Any], None]
+    try:
+        cached_schema, validate = _compiled_cache[id(schema)]
+        if cached_schema is schema:
+            return validate
+    except KeyError:
+        pass
+
+    validate = compile_schema(schema)
+    _compiled_cache[id(schema)] = (schema, validate)
+
+    return validate
+
+
+def use_compiled_validation(enabled=True):
+    # type: (bool) -> None
+    """Enable or disable compiled validation for validate_json().
+
+    If enabled, every schema passed to validate_json() is compiled into a
+    specialized checker function on first use instead of being interpreted
+    by jsonschema for every validation.
+
+    Args:
+        enabled (bool): True if compiled validators should be used, False to
+            go back to the jsonschema validators.
+    """
+    global _compiled_validation
+    _compiled_validation = enabled
+
+
 def validate_json(instance, schema):
-    Validator(schema, format_checker=FormatChecker()).validate(instance)
+    if _compiled_validation:
+        _get_compiled_validator(schema)(instance)
+    else:
+        _get_validator(schema).validate(instance)
 
 
 class Schemas(object):
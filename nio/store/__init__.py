@@ -23,7 +23,11 @@ if package_installed("olm"):
         DeviceTrustField,
         StoreVersion,
         TrustState,
-        Keys
+        Keys,
+        SyncTokens,
+        TrackedUsers,
+        Rooms,
+        RoomMembers,
     )
     from .database import (
         DefaultStore,
@@ -34,3 +38,4 @@ if package_installed("olm"):
         use_database,
         use_database_atomic
     )
+    from .snapshot import read_snapshot, write_snapshot
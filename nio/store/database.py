@@ -14,7 +14,7 @@
 import os
 from builtins import super
 from functools import wraps
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 import attr
 from peewee import DoesNotExist, SqliteDatabase
@@ -25,10 +25,14 @@ from . import (Accounts, DeviceKeys, DeviceKeys_v1, DeviceTrustState,
                LegacyForwardedChains, LegacyMegolmInboundSessions,
                LegacyOlmSessions, LegacyOutgoingKeyRequests,
                MegolmInboundSessions, OlmSessions, OutgoingKeyRequests,
-               StoreVersion, TrustState)
+               RoomMembers, Rooms, StoreVersion, SyncTokens, TrackedUsers,
+               TrustState)
 from ..crypto import (DeviceStore, GroupSessionStore, InboundGroupSession,
                       OlmAccount, OlmDevice, OutgoingKeyRequest, Session,
                       SessionStore)
+from ..events import DefaultLevels, PowerLevels
+from ..responses import RoomSummary
+from ..rooms import EncryptedRoomIndex, MatrixInvitedRoom, MatrixRoom
 
 
 def use_database(fn):
@@ -410,7 +414,11 @@ class MatrixStore(object):
         EncryptedRooms,
         OutgoingKeyRequests,
         StoreVersion,
-        Keys
+        Keys,
+        SyncTokens,
+        TrackedUsers,
+        Rooms,
+        RoomMembers,
     ]
     store_version = 2
 
@@ -863,6 +871,296 @@ class MatrixStore(object):
         if db_room:
             db_room.delete_instance()
 
+    @use_database
+    def load_tracked_users(self):
+        # type: () -> Set[str]
+        """Load the set of users whose device keys we track.
+
+        Returns:
+            ``Set`` containing the user ids of the tracked users.
+
+        """
+        account = self._get_account()
+
+        if not account:
+            return set()
+
+        return {user.user_id for user in account.tracked_users}
+
+    @use_database_atomic
+    def save_tracked_users(self, users):
+        # type: (Iterable[str]) -> None
+        """Add the given users to the set of tracked users."""
+        account = self._get_account()
+        assert account
+
+        data = [(user_id, account) for user_id in users]
+
+        for idx in range(0, len(data), 400):
+            rows = data[idx:idx + 400]
+            TrackedUsers.insert_many(rows, fields=[
+                TrackedUsers.user_id,
+                TrackedUsers.account
+            ]).on_conflict_ignore().execute()
+
+    @use_database
+    def load_sync_token(self):
+        # type: () -> Optional[str]
+        """Load the sync token of the last handled sync response.
+
+        Returns the sync token or None if no token was stored.
+        """
+        account = self._get_account()
+
+        if not account:
+            return None
+
+        token = SyncTokens.get_or_none(SyncTokens.account == account)
+
+        return token.token if token else None
+
+    @use_database
+    def save_sync_token(self, token):
+        # type: (str) -> None
+        """Save the sync token of the last handled sync response."""
+        account = self._get_account()
+        assert account
+
+        SyncTokens.replace(account=account, token=token).execute()
+
+    @use_database
+    def load_rooms(self, encrypted_room_index=None):
+        # type: (Optional[EncryptedRoomIndex]) -> Tuple[Dict[str, MatrixRoom], Dict[str, MatrixInvitedRoom]]  # noqa
+        """Load the joined and invited rooms of this account.
+
+        Args:
+            encrypted_room_index (EncryptedRoomIndex, optional): The index of
+                encrypted rooms the loaded joined rooms should update.
+
+        Returns a tuple containing a mapping of room ids to the joined rooms
+        and a mapping of room ids to the invited rooms.
+        """
+        rooms = dict()  # type: Dict[str, MatrixRoom]
+        invited_rooms = dict()  # type: Dict[str, MatrixInvitedRoom]
+        account = self._get_account()
+
+        if not account:
+            return rooms, invited_rooms
+
+        loaded = dict()  # type: Dict[int, MatrixRoom]
+
+        for db_room in account.rooms:
+            if db_room.invited:
+                room = MatrixInvitedRoom(db_room.room_id, self.user_id)
+                room.inviter = db_room.inviter
+                invited_rooms[room.room_id] = room
+            else:
+                room = MatrixRoom(
+                    db_room.room_id,
+                    self.user_id,
+                    db_room.encrypted,
+                    encrypted_room_index
+                )
+                rooms[room.room_id] = room
+
+            self._load_room_state(room, db_room)
+            loaded[db_room.id] = room
+
+        members = RoomMembers.select().join(Rooms).where(
+            Rooms.account == account
+        )
+
+        for member in members:
+            loaded[member.room_id].add_member(
+                member.user_id,
+                member.display_name,
+                member.avatar_url
+            )
+
+        return rooms, invited_rooms
+
+    @use_database
+    def load_room(self, room_id, encrypted_room_index=None):
+        # type: (str, Optional[EncryptedRoomIndex]) -> Optional[MatrixRoom]
+        """Load a single joined room of this account.
+
+        Args:
+            room_id (str): The id of the room that should be loaded.
+            encrypted_room_index (EncryptedRoomIndex, optional): The index of
+                encrypted rooms the loaded room should update.
+
+        Returns the room, or None if no joined room with the given id was
+        saved.
+        """
+        account = self._get_account()
+
+        if not account:
+            return None
+
+        db_room = Rooms.get_or_none(
+            Rooms.room_id == room_id,
+            Rooms.account == account
+        )
+
+        if not db_room or db_room.invited:
+            return None
+
+        room = MatrixRoom(
+            db_room.room_id,
+            self.user_id,
+            db_room.encrypted,
+            encrypted_room_index
+        )
+        self._load_room_state(room, db_room)
+
+        for member in db_room.members:
+            room.add_member(
+                member.user_id,
+                member.display_name,
+                member.avatar_url
+            )
+
+        return room
+
+    @use_database
+    def load_room_members(self, room_id):
+        # type: (str) -> List[str]
+        """Load the user ids of the saved members of a room.
+
+        Args:
+            room_id (str): The id of the room whose members should be loaded.
+
+        Returns a list of user ids, empty if the room wasn't saved.
+        """
+        account = self._get_account()
+
+        if not account:
+            return []
+
+        members = RoomMembers.select(RoomMembers.user_id).join(Rooms).where(
+            (Rooms.room_id == room_id) & (Rooms.account == account)
+        )
+
+        return [member.user_id for member in members]
+
+    @staticmethod
+    def _load_room_state(room, db_room):
+        # type: (MatrixRoom, Rooms) -> None
+        room.creator = db_room.creator
+        room.federate = db_room.federate
+        room.room_version = db_room.room_version
+        room.guest_access = db_room.guest_access
+        room.join_rule = db_room.join_rule
+        room.history_visibility = db_room.history_visibility
+        room.canonical_alias = db_room.canonical_alias
+        room.topic = db_room.topic
+        room.name = db_room.name
+
+        levels = db_room.power_levels
+        room.power_levels = PowerLevels(
+            DefaultLevels(**levels["defaults"]),
+            levels["users"],
+            levels["events"]
+        )
+
+        if db_room.summary is not None:
+            room.summary = RoomSummary(**db_room.summary)
+
+    @use_database_atomic
+    def save_rooms(self, rooms, changed_members=None):
+        # type: (Iterable[MatrixRoom], Optional[Dict[str, Set[str]]]) -> None
+        """Save the state of the given rooms.
+
+        Args:
+            rooms (Iterable[MatrixRoom]): The rooms that should be saved.
+            changed_members (Dict[str, Set[str]], optional): A mapping of room
+                ids to the ids of the users whose membership changed. Only the
+                listed members are updated, the members of rooms that aren't
+                part of the mapping are left untouched. If not given, the
+                whole member list of the rooms is saved.
+        """
+        account = self._get_account()
+        assert account
+
+        for room in rooms:
+            power_levels = room.power_levels
+            fields = {
+                "invited": isinstance(room, MatrixInvitedRoom),
+                "inviter": getattr(room, "inviter", None),
+                "creator": room.creator,
+                "federate": room.federate,
+                "room_version": room.room_version,
+                "guest_access": room.guest_access,
+                "join_rule": room.join_rule,
+                "history_visibility": room.history_visibility,
+                "canonical_alias": room.canonical_alias,
+                "topic": room.topic,
+                "name": room.name,
+                "encrypted": room.encrypted,
+                "power_levels": {
+                    "defaults": attr.asdict(power_levels.defaults),
+                    "users": power_levels.users,
+                    "events": power_levels.events,
+                },
+                "summary": attr.asdict(room.summary) if room.summary else None,
+            }
+
+            db_room = Rooms.get_or_none(
+                Rooms.room_id == room.room_id,
+                Rooms.account == account
+            )
+
+            if db_room:
+                Rooms.update(**fields).where(Rooms.id == db_room.id).execute()
+            else:
+                db_room = Rooms.create(
+                    room_id=room.room_id,
+                    account=account,
+                    **fields
+                )
+
+            if changed_members is None:
+                RoomMembers.delete().where(
+                    RoomMembers.room == db_room
+                ).execute()
+                user_ids = list(room.users)
+            else:
+                user_ids = list(changed_members.get(room.room_id, ()))
+
+            rows = []
+
+            for user_id in user_ids:
+                user = room.users.get(user_id, None)
+
+                if user:
+                    rows.append({
+                        "room": db_room,
+                        "user_id": user_id,
+                        "display_name": user.display_name,
+                        "avatar_url": user.avatar_url,
+                    })
+                else:
+                    RoomMembers.delete().where(
+                        (RoomMembers.room == db_room)
+                        & (RoomMembers.user_id == user_id)
+                    ).execute()
+
+            for idx in range(0, len(rows), 100):
+                RoomMembers.replace_many(rows[idx:idx + 100]).execute()
+
+    @use_database
+    def delete_room(self, room_id):
+        # type: (str) -> None
+        """Delete the state of the room, including its members."""
+        account = self._get_account()
+
+        if not account:
+            return
+
+        Rooms.delete().where(
+            (Rooms.room_id == room_id) & (Rooms.account == account)
+        ).execute()
+
     def blacklist_device(self, device):
         # type: (OlmDevice) -> bool
         raise NotImplementedError
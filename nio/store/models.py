@@ -11,6 +11,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
 import time
 from builtins import bytes
 from datetime import datetime
@@ -65,6 +66,22 @@ class DateField(TextField):
         return value.strftime("%Y-%m-%d %H:%M:%S.%f")
 
 
+class JsonField(TextField):
+    """Database field to hold a JSON serializable value."""
+
+    def python_value(self, value):
+        if value is None:
+            return None
+
+        return json.loads(value)
+
+    def db_value(self, value):
+        if value is None:
+            return None
+
+        return json.dumps(value)
+
+
 class LegacyAccounts(Model):
     account = ByteField()
     device_id = TextField(unique=True)
@@ -328,3 +345,45 @@ class TrackedUsers(Model):
 
     class Meta:
         constraints = [SQL("UNIQUE(account_id,user_id)")]
+
+
+class Rooms(Model):
+    room_id = TextField()
+    account = ForeignKeyField(
+        model=Accounts,
+        column_name="account_id",
+        on_delete="CASCADE",
+        backref="rooms",
+    )
+    invited = BooleanField(default=False)
+    inviter = TextField(null=True)
+    creator = TextField()
+    federate = BooleanField()
+    room_version = TextField()
+    guest_access = TextField()
+    join_rule = TextField()
+    history_visibility = TextField()
+    canonical_alias = TextField(null=True)
+    topic = TextField(null=True)
+    name = TextField(null=True)
+    encrypted = BooleanField()
+    power_levels = JsonField()
+    summary = JsonField(null=True)
+
+    class Meta:
+        constraints = [SQL("UNIQUE(room_id,account_id)")]
+
+
+class RoomMembers(Model):
+    user_id = TextField()
+    display_name = TextField(null=True)
+    avatar_url = TextField(null=True)
+    room = ForeignKeyField(
+        model=Rooms,
+        column_name="room_id",
+        on_delete="CASCADE",
+        backref="members",
+    )
+
+    class Meta:
+        constraints = [SQL("UNIQUE(room_id,user_id)")]
@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 Damir Jelić <poljar@termina.org.uk>
+#
+# Permission to use, copy, modify, and/or distribute this software for
+# any purpose with or without fee is hereby granted, provided that the
+# above copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER
+# RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF
+# CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN
+# CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""nio client state snapshots.
+
+A snapshot is a single binary file containing the in-memory state of a
+client: the rooms and their members, the encrypted rooms, the sync token and
+the Olm device, session and group session stores.
+
+The file starts with a fixed size header followed by a JSON index of the
+sections of the file. Every section except the pickles section is JSON
+encoded. The pickles section contains the Olm and Megolm session pickles,
+which are only sliced out of the memory mapped file and unpickled once the
+session is accessed.
+"""
+
+from __future__ import unicode_literals
+
+import json
+import mmap
+import struct
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+import attr
+from atomicwrites import atomic_write
+
+from ..crypto import (DeviceStore, GroupSessionStore, InboundGroupSession,
+                      OlmDevice, OutgoingKeyRequest, Session, SessionStore)
+from ..events import DefaultLevels, PowerLevels
+from ..exceptions import LocalProtocolError
+from ..responses import RoomSummary
+from ..rooms import MatrixInvitedRoom, MatrixRoom
+
+if False:
+    from ..client import Client
+
+SNAPSHOT_MAGIC = b"NIOSNAP"
+SNAPSHOT_VERSION = 1
+
+# Magic, version and the length of the section index.
+_HEADER = struct.Struct(str("<7sBI"))
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _timestamp(date):
+    # type: (datetime) -> int
+    delta = date - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 10**6 + delta.microseconds
+
+
+def _datetime(timestamp):
+    # type: (int) -> datetime
+    return _EPOCH + timedelta(microseconds=timestamp)
+
+
+def _encode(data):
+    # type: (Any) -> bytes
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+def _room_to_dict(room):
+    # type: (MatrixRoom) -> Dict[str, Any]
+    power_levels = room.power_levels
+
+    return {
+        "room_id": room.room_id,
+        "inviter": getattr(room, "inviter", None),
+        "creator": room.creator,
+        "federate": room.federate,
+        "room_version": room.room_version,
+        "guest_access": room.guest_access,
+        "join_rule": room.join_rule,
+        "history_visibility": room.history_visibility,
+        "canonical_alias": room.canonical_alias,
+        "topic": room.topic,
+        "name": room.name,
+        "encrypted": room.encrypted,
+        "power_levels": {
+            "defaults": attr.asdict(power_levels.defaults),
+            "users": power_levels.users,
+            "events": power_levels.events,
+        },
+        "summary": attr.asdict(room.summary) if room.summary else None,
+        "members": [
+            [user.user_id, user.display_name, user.avatar_url]
+            for user in room.users.values()
+        ],
+    }
+
+
+def _room_from_dict(room, data):
+    # type: (MatrixRoom, Dict[str, Any]) -> MatrixRoom
+    room.creator = data["creator"]
+    room.federate = data["federate"]
+    room.room_version = data["room_version"]
+    room.guest_access = data["guest_access"]
+    room.join_rule = data["join_rule"]
+    room.history_visibility = data["history_visibility"]
+    room.canonical_alias = data["canonical_alias"]
+    room.topic = data["topic"]
+    room.name = data["name"]
+
+    levels = data["power_levels"]
+    room.power_levels = PowerLevels(
+        DefaultLevels(**levels["defaults"]),
+        levels["users"],
+        levels["events"]
+    )
+
+    if data["summary"] is not None:
+        room.summary = RoomSummary(**data["summary"])
+
+    for user_id, display_name, avatar_url in data["members"]:
+        room.add_member(user_id, display_name, avatar_url)
+
+    return room
+
+
+def write_snapshot(client, path):
+    # type: (Client, str) -> None
+    """Write a snapshot of the client state to a file.
+
+    The file is replaced atomically, a snapshot that is being restored by
+    another process stays intact.
+
+    Args:
+        client (Client): The client whose state should be saved, the store of
+            the client needs to be loaded.
+        path (str): The path of the snapshot file.
+    """
+    olm = client.olm
+    pickle_key = client.store.pickle_key
+
+    pickles = []  # type: List[bytes]
+    offset = 0
+
+    olm_sessions = []  # type: List[List[Any]]
+
+    for sender_key, sessions in olm.session_store.items():
+        for session in sessions:
+            pickle = session.pickle(pickle_key)
+            olm_sessions.append([
+                sender_key,
+                _timestamp(session.creation_time),
+                _timestamp(session.use_time),
+                offset,
+                len(pickle)
+            ])
+            pickles.append(pickle)
+            offset += len(pickle)
+
+    group_sessions = []  # type: List[List[Any]]
+
+    for session in olm.inbound_group_store:
+        pickle = session.pickle(pickle_key)
+        group_sessions.append([
+            session.room_id,
+            session.sender_key,
+            session.id,
+            session.ed25519,
+            session.forwarding_chain,
+            offset,
+            len(pickle)
+        ])
+        pickles.append(pickle)
+        offset += len(pickle)
+
+    sections = [
+        ("client", _encode({
+            "user_id": client.user_id,
+            "device_id": client.device_id,
+            "identity_key": olm.account.identity_keys["curve25519"],
+            "next_batch": client.next_batch,
+            "encrypted_rooms": sorted(client.encrypted_rooms),
+            "tracked_users": sorted(olm.tracked_users),
+        })),
+        ("rooms", _encode(
+            [_room_to_dict(room) for room in client.rooms.values()]
+        )),
+        ("invited_rooms", _encode(
+            [_room_to_dict(room) for room in client.invited_rooms.values()]
+        )),
+        ("devices", _encode([
+            [device.user_id, device.id, device.keys, device.display_name,
+             device.deleted]
+            for device in olm.device_store
+        ])),
+        ("key_requests", _encode([
+            attr.asdict(request)
+            for request in olm.outgoing_key_requests.values()
+        ])),
+        ("olm_sessions", _encode(olm_sessions)),
+        ("group_sessions", _encode(group_sessions)),
+        ("pickles", b"".join(pickles)),
+    ]  # type: List[Tuple[str, bytes]]
+
+    index = dict()  # type: Dict[str, Tuple[int, int]]
+    offset = 0
+
+    for name, data in sections:
+        index[name] = (offset, len(data))
+        offset += len(data)
+
+    encoded_index = _encode(index)
+
+    with atomic_write(path, mode="wb", overwrite=True) as f:
+        f.write(_HEADER.pack(
+            SNAPSHOT_MAGIC,
+            SNAPSHOT_VERSION,
+            len(encoded_index)
+        ))
+        f.write(encoded_index)
+
+        for _, data in sections:
+            f.write(data)
+
+
+def read_snapshot(client, path):
+    # type: (Client, str) -> None
+    """Restore the client state from a snapshot file.
+
+    The file is memory mapped, the Olm and Megolm sessions are added to the
+    session stores of the client as pending sessions which are only
+    unpickled once they are needed. The client state is only replaced once
+    the whole snapshot was read, it stays untouched if reading fails.
+
+    Args:
+        client (Client): The client whose state should be restored, the store
+            of the client needs to be loaded.
+        path (str): The path of the snapshot file.
+
+    Raises LocalProtocolError if the file isn't a valid snapshot or if the
+        snapshot was taken for a different account.
+    """
+    with open(path, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise LocalProtocolError("Invalid snapshot file {}".format(path))
+
+    try:
+        restore = _read_snapshot(client, path, buf)
+    except (KeyError, TypeError, ValueError, struct.error):
+        buf.close()
+        raise LocalProtocolError("Invalid snapshot file {}".format(path))
+    except BaseException:
+        buf.close()
+        raise
+
+    restore()
+
+
+def _read_snapshot(client, path, buf):
+    # type: (Client, str, mmap.mmap) -> Callable[[], None]
+    """Read a memory mapped snapshot file.
+
+    Returns a function that replaces the client state with the state of the
+    snapshot, the client isn't modified before it is called.
+    """
+    magic, version, index_length = _HEADER.unpack_from(buf, 0)
+
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise LocalProtocolError("Invalid snapshot file {}".format(path))
+
+    data_start = _HEADER.size + index_length
+    index = json.loads(buf[_HEADER.size:data_start].decode("utf-8"))
+
+    def section(name):
+        # type: (str) -> Any
+        offset, length = index[name]
+        start = data_start + offset
+        return json.loads(buf[start:start + length].decode("utf-8"))
+
+    olm = client.olm
+    state = section("client")
+
+    if (state["user_id"] != client.user_id
+            or state["device_id"] != client.device_id
+            or state["identity_key"]
+            != olm.account.identity_keys["curve25519"]):
+        raise LocalProtocolError(
+            "The snapshot {} doesn't belong to the Olm account of {} on "
+            "device {}".format(path, client.user_id, client.device_id)
+        )
+
+    # The rooms are only connected to the encrypted room index of the client
+    # once the whole snapshot was read.
+    rooms = [
+        _room_from_dict(
+            MatrixRoom(data["room_id"], client.user_id, data["encrypted"]),
+            data
+        ) for data in section("rooms")
+    ]
+
+    invited_rooms = []  # type: List[MatrixInvitedRoom]
+
+    for data in section("invited_rooms"):
+        room = MatrixInvitedRoom(data["room_id"], client.user_id)
+        room.inviter = data["inviter"]
+        invited_rooms.append(_room_from_dict(room, data))
+
+    device_store = DeviceStore()
+
+    for user_id, device_id, keys, display_name, deleted in section("devices"):
+        device_store.add(
+            OlmDevice(user_id, device_id, keys, display_name, deleted)
+        )
+
+    outgoing_key_requests = {
+        data["request_id"]: OutgoingKeyRequest(**data)
+        for data in section("key_requests")
+    }
+
+    pickles_start = data_start + index["pickles"][0]
+    pickle_key = client.store.pickle_key
+
+    def olm_loader(offset, length, creation_time, use_time):
+        # type: (int, int, int, int) -> Callable[[], Session]
+        start = pickles_start + offset
+
+        return lambda: Session.from_pickle(
+            buf[start:start + length],
+            _datetime(creation_time),
+            pickle_key,
+            _datetime(use_time)
+        )
+
+    def megolm_loader(offset, length, room_id, sender_key, ed25519, chain):
+        # type: (int, int, str, str, str, List[str]) -> Callable[[], InboundGroupSession]  # noqa
+        start = pickles_start + offset
+
+        return lambda: InboundGroupSession.from_pickle(
+            buf[start:start + length],
+            ed25519,
+            sender_key,
+            room_id,
+            pickle_key,
+            chain
+        )
+
+    session_store = SessionStore()
+
+    for (sender_key, creation_time, use_time, offset,
+         length) in section("olm_sessions"):
+        session_store.add_pending(
+            sender_key,
+            olm_loader(offset, length, creation_time, use_time)
+        )
+
+    inbound_group_store = GroupSessionStore()
+
+    for (room_id, sender_key, session_id, ed25519, chain, offset,
+         length) in section("group_sessions"):
+        inbound_group_store.add_pending(
+            room_id,
+            sender_key,
+            session_id,
+            megolm_loader(offset, length, room_id, sender_key, ed25519, chain)
+        )
+
+    def restore():
+        # type: () -> None
+        client.next_batch = state["next_batch"]
+        client.encrypted_rooms = set(state["encrypted_rooms"])
+        olm.tracked_users = set(state["tracked_users"])
+
+        for room in rooms:
+            room.encrypted_room_index = client.encrypted_room_index
+
+            if room.encrypted:
+                for user_id in room.users:
+                    client.encrypted_room_index.add(user_id, room.room_id)
+
+            client.rooms[room.room_id] = room
+
+        for room in invited_rooms:
+            client.invited_rooms[room.room_id] = room
+
+        olm.device_store = device_store
+        olm.outgoing_key_requests = outgoing_key_requests
+        olm.session_store = session_store
+        olm.inbound_group_store = inbound_group_store
+
+    return restore
@@ -11,7 +11,7 @@ setup(
     description=("A Python Matrix client library, designed according to sans "
                  "I/O principles."),
     license="ISC",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks"]),
     install_requires=[
         "attrs",
         "future",
@@ -1,4 +1,5 @@
 import json
+import re
 import sys
 from os import path
 
@@ -8,9 +9,10 @@ from nio import (DeviceList, DeviceOneTimeKeyCount, GroupEncryptionError,
                  JoinedMembersResponse, KeysClaimResponse, KeysQueryResponse,
                  KeysUploadResponse, LocalProtocolError, LoginError,
                  LoginResponse, MegolmEvent, MembersSyncError, OlmTrustError,
-                 RoomEncryptionEvent, RoomInfo, RoomMemberEvent, Rooms,
-                 RoomSendResponse, RoomSummary, ShareGroupSessionResponse,
-                 SyncResponse, Timeline)
+                 PartialSyncResponse, RoomEncryptionEvent, RoomInfo,
+                 RoomMemberEvent, Rooms, RoomSendResponse, RoomSummary,
+                 ShareGroupSessionResponse, SyncResponse, Timeline,
+                 TypingNoticeEvent)
 from nio.crypto import OlmDevice
 
 TEST_ROOM_ID = "!testroom:example.org"
@@ -20,7 +22,7 @@ ALICE_DEVICE_ID = "JLAFKJWSCS"
 
 if sys.version_info >= (3, 5):
     import asyncio
-    from nio import AsyncClient
+    from nio import AsyncClient, ClientConfig
 
 
 @pytest.mark.skipif(sys.version_info < (3, 5), reason="Python 3 specific asyncio tests")
@@ -157,6 +159,181 @@ class TestClass(object):
         assert isinstance(resp, LoginResponse)
         assert isinstance(resp2, SyncResponse)
 
+    def test_sync_stream(self, async_client, aioresponse):
+        loop = asyncio.get_event_loop()
+
+        aioresponse.post(
+            "https://example.org/_matrix/client/r0/login",
+            status=200,
+            payload=self.login_response
+        )
+        aioresponse.get(
+            "https://example.org/_matrix/client/r0/sync?access_token=abc123",
+            status=200,
+            payload=self.sync_response
+        )
+
+        room_id = list(self.sync_response["rooms"]["join"])[0]
+
+        async def collect():
+            responses = []
+
+            async for response in async_client.sync_stream(chunk_size=16):
+                # Rooms without encrypted events are handled right away.
+                assert room_id in async_client.rooms
+                responses.append(response)
+
+            return responses
+
+        loop.run_until_complete(async_client.login("wordpass"))
+        responses = loop.run_until_complete(collect())
+
+        *parts, response = responses
+
+        assert len(parts) == 1
+        assert isinstance(parts[0], PartialSyncResponse)
+        assert list(parts[0].rooms.join) == [room_id]
+
+        assert isinstance(response, SyncResponse)
+        assert not response.rooms.join
+        assert async_client.next_batch == response.next_batch
+
+    def test_sync_stream_megolm_room(self, async_client, aioresponse):
+        loop = asyncio.get_event_loop()
+
+        sync_response = self.sync_response
+        room_id = list(sync_response["rooms"]["join"])[0]
+        timeline = sync_response["rooms"]["join"][room_id]["timeline"]
+        timeline["events"].append({
+            "type": "m.room.encrypted",
+            "event_id": "$megolm:example.org",
+            "sender": "@alice:example.org",
+            "origin_server_ts": 1516809890615,
+            "content": {
+                "algorithm": "m.megolm.v1.aes-sha2",
+                "sender_key": "sender_key",
+                "device_id": "ALICEDEVICE",
+                "session_id": "session_id",
+                "ciphertext": "ciphertext",
+            },
+        })
+
+        aioresponse.post(
+            "https://example.org/_matrix/client/r0/login",
+            status=200,
+            payload=self.login_response
+        )
+        aioresponse.get(
+            "https://example.org/_matrix/client/r0/sync?access_token=abc123",
+            status=200,
+            payload=sync_response
+        )
+
+        async def collect():
+            responses = []
+
+            async for response in async_client.sync_stream(chunk_size=16):
+                responses.append((response, room_id in async_client.rooms))
+
+            return responses
+
+        loop.run_until_complete(async_client.login("wordpass"))
+        (part, applied), (response, _) = loop.run_until_complete(collect())
+
+        # The session of the Megolm event is unknown, the room is held back
+        # until the to-device events of the response were handled.
+        assert isinstance(part, PartialSyncResponse)
+        assert not applied
+        assert isinstance(response, SyncResponse)
+        assert response.rooms.join[room_id] == part.rooms.join[room_id]
+        assert room_id in async_client.rooms
+        assert isinstance(
+            response.rooms.join[room_id].timeline.events[-1],
+            MegolmEvent
+        )
+
+    def test_sync_parallel(self, tempdir, aioresponse):
+        loop = asyncio.get_event_loop()
+        client = AsyncClient(
+            "https://example.org",
+            "ephemeral",
+            "DEVICEID",
+            tempdir,
+            config=ClientConfig(
+                encryption_enabled=False,
+                sync_parse_processes=1
+            )
+        )
+        client.receive_response(LoginResponse.from_dict(self.login_response))
+
+        url = re.compile(r"^https://example\.org/_matrix/client/r0/sync\?.*")
+        aioresponse.get(url, status=200, payload=self.sync_response)
+
+        try:
+            response = loop.run_until_complete(client.sync())
+        finally:
+            loop.run_until_complete(client.close())
+
+        assert isinstance(response, SyncResponse)
+        assert response.transport_response
+        assert client.next_batch == response.next_batch
+        assert set(client.rooms) == set(self.sync_response["rooms"]["join"])
+
+    def test_sync_forever_pipelined(self, tempdir, aioresponse):
+        loop = asyncio.get_event_loop()
+        client = AsyncClient(
+            "https://example.org",
+            "ephemeral",
+            "DEVICEID",
+            tempdir,
+            config=ClientConfig(encryption_enabled=False)
+        )
+        client.receive_response(LoginResponse.from_dict(self.login_response))
+
+        url = re.compile(r"^https://example\.org/_matrix/client/r0/sync\?.*")
+        tokens = ["token1", "token2", "token3"]
+
+        for token in tokens:
+            payload = self.sync_response
+            payload["next_batch"] = token
+            aioresponse.get(url, status=200, payload=payload)
+
+        applied = []
+        sent_requests = []
+
+        async def cb(response):
+            # Give the fetching task the chance to run ahead.
+            await asyncio.sleep(0.01)
+            sent_requests.append(
+                sum(len(calls) for calls in aioresponse.requests.values())
+            )
+            applied.append(response.next_batch)
+
+            if len(applied) == len(tokens):
+                sync_task.cancel()
+
+        client.add_response_callback(cb, SyncResponse)
+
+        async def sync():
+            tasks = asyncio.all_tasks()
+            await client.sync_forever(30000, pipeline_depth=1)
+            # The task fetching ahead was cancelled and waited for.
+            return [
+                task for task in asyncio.all_tasks()
+                if task not in tasks and not task.done()
+            ]
+
+        sync_task = asyncio.ensure_future(sync())
+        assert not loop.run_until_complete(asyncio.wait_for(sync_task, 5))
+
+        # The responses were applied in order, while the next request was
+        # already sent, but never more than one request ahead.
+        assert applied == tokens
+        assert client.next_batch == "token3"
+        assert sent_requests[:2] == [2, 3]
+
+        loop.run_until_complete(client.close())
+
     def test_keys_upload(self, async_client, aioresponse):
         loop = asyncio.get_event_loop()
 
@@ -424,6 +601,208 @@ class TestClass(object):
 
         assert "session_id_123" in async_client.outgoing_key_requests
 
+    def test_async_event_callbacks(self, async_client):
+        loop = asyncio.get_event_loop()
+        async_client.receive_response(
+            LoginResponse.from_dict(self.login_response)
+        )
+
+        calls = []
+
+        async def cb(room, event):
+            calls.append(("start", room.room_id, event.event_id))
+            await asyncio.sleep(0)
+            calls.append(("end", room.room_id, event.event_id))
+
+        async_client.add_event_callback(cb, (RoomMemberEvent,
+                                             RoomEncryptionEvent))
+
+        response = self.encryption_sync_response
+        other_room_id = "!otherroom:example.org"
+        response.rooms.join[other_room_id] = response.rooms.join[TEST_ROOM_ID]
+
+        async_client.receive_response(response)
+
+        # Nothing ran yet, the callbacks are only scheduled.
+        assert not calls
+        assert len(async_client.callback_tasks) == 4
+
+        loop.run_until_complete(async_client.wait_for_callbacks())
+
+        assert not len(async_client.callback_tasks)
+        assert len(calls) == 8
+
+        # Different rooms run concurrently.
+        assert calls[0][0] == calls[1][0] == "start"
+        assert {calls[0][1], calls[1][1]} == {TEST_ROOM_ID, other_room_id}
+
+        # The callbacks of a room run one after another in event order.
+        for room_id in (TEST_ROOM_ID, other_room_id):
+            assert [call for call in calls if call[1] == room_id] == [
+                ("start", room_id, "event_id_1"),
+                ("end", room_id, "event_id_1"),
+                ("start", room_id, "event_id_2"),
+                ("end", room_id, "event_id_2"),
+            ]
+
+    def test_async_event_callback_limit(self, tempdir):
+        loop = asyncio.get_event_loop()
+        config = ClientConfig(max_concurrent_callbacks=1)
+        client = AsyncClient(
+            "https://example.org",
+            "ephemeral",
+            "DEVICEID",
+            tempdir,
+            config=config
+        )
+        client.receive_response(LoginResponse.from_dict(self.login_response))
+
+        running = []
+        concurrent = []
+        sync_calls = []
+
+        async def cb(room, event):
+            running.append(room.room_id)
+            concurrent.append(len(running))
+            await asyncio.sleep(0)
+            running.remove(room.room_id)
+
+            if room.room_id == TEST_ROOM_ID:
+                raise ValueError("Callback error")
+
+        client.add_event_callback(cb, RoomMemberEvent)
+        client.add_event_callback(
+            lambda room, event: sync_calls.append(event), RoomMemberEvent
+        )
+
+        response = self.encryption_sync_response
+        response.rooms.join["!otherroom:example.org"] = (
+            response.rooms.join[TEST_ROOM_ID]
+        )
+
+        client.receive_response(response)
+
+        # Plain functions are still called right away.
+        assert len(sync_calls) == 2
+
+        # The callbacks are queued, only a single runner task was started.
+        assert len(client.callback_tasks) == 2
+        assert len(client.callback_tasks._runners) == 1
+
+        # Errors of the callbacks don't propagate.
+        loop.run_until_complete(client.wait_for_callbacks())
+        assert concurrent == [1, 1]
+        assert not running
+        assert not len(client.callback_tasks)
+
+    def test_event_streams(self, async_client):
+        loop = asyncio.get_event_loop()
+        async_client.receive_response(
+            LoginResponse.from_dict(self.login_response)
+        )
+
+        other_room_id = "!otherroom:example.org"
+
+        all_events = async_client.events()
+        encryption = async_client.events(RoomEncryptionEvent)
+        other_room = async_client.room_events(other_room_id)
+
+        response = self.encryption_sync_response
+        room_info = response.rooms.join[TEST_ROOM_ID]
+        room_info.ephemeral.append(TypingNoticeEvent([ALICE_ID]))
+        response.rooms.join[other_room_id] = room_info
+
+        async_client.receive_response(response)
+
+        assert len(all_events) == 6
+        assert len(encryption) == 2
+        assert len(other_room) == 3
+
+        async def collect(stream):
+            return [
+                (room.room_id, type(event)) async for room, event in stream
+            ]
+
+        for stream in (all_events, encryption, other_room):
+            stream.close()
+
+        assert not async_client.event_streams
+        assert loop.run_until_complete(collect(encryption)) == [
+            (TEST_ROOM_ID, RoomEncryptionEvent),
+            (other_room_id, RoomEncryptionEvent),
+        ]
+        assert loop.run_until_complete(collect(other_room)) == [
+            (other_room_id, RoomMemberEvent),
+            (other_room_id, RoomEncryptionEvent),
+            (other_room_id, TypingNoticeEvent),
+        ]
+        assert len(loop.run_until_complete(collect(all_events))) == 6
+
+        # Closed streams don't get new events.
+        response.next_batch = "token456"
+        async_client.receive_response(response)
+        assert not len(all_events)
+
+    def test_event_stream_overflow(self, async_client):
+        loop = asyncio.get_event_loop()
+        async_client.receive_response(
+            LoginResponse.from_dict(self.login_response)
+        )
+
+        drop_oldest = async_client.events(max_size=2, overflow="drop_oldest")
+        drop_ephemeral = async_client.events(
+            max_size=2,
+            overflow="drop_ephemeral"
+        )
+        blocking = async_client.events(max_size=2)
+
+        with pytest.raises(ValueError):
+            async_client.events(overflow="drop_newest")
+
+        response = self.encryption_sync_response
+        response.rooms.join[TEST_ROOM_ID].ephemeral.append(
+            TypingNoticeEvent([ALICE_ID])
+        )
+        async_client.receive_response(response)
+
+        async def take(stream):
+            return await stream.__anext__()
+
+        assert len(drop_oldest) == 2
+        assert drop_oldest.dropped == 1
+        _, event = loop.run_until_complete(take(drop_oldest))
+        assert isinstance(event, RoomEncryptionEvent)
+
+        assert len(drop_ephemeral) == 2
+        assert drop_ephemeral.dropped == 1
+        _, event = loop.run_until_complete(take(drop_ephemeral))
+        assert isinstance(event, RoomMemberEvent)
+
+        # The blocking stream keeps all events, the sync loop waits until
+        # the consumer caught up.
+        assert len(blocking) == 3
+        assert blocking.full
+
+        async def wait():
+            waiter = asyncio.ensure_future(
+                async_client.wait_for_event_streams()
+            )
+            await asyncio.sleep(0)
+            assert not waiter.done()
+
+            await take(blocking)
+            await asyncio.sleep(0)
+            assert not waiter.done()
+
+            await take(blocking)
+            await asyncio.wait_for(waiter, 1)
+
+        loop.run_until_complete(wait())
+        assert len(blocking) == 1
+
+        loop.run_until_complete(async_client.close())
+        assert not async_client.event_streams
+
     def test_key_exports(self, async_client, tempdir):
         file = path.join(tempdir, "keys_file")
 
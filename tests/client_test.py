@@ -1,19 +1,23 @@
 # -*- coding: utf-8 -*-
 import json
+import os
 
 import pytest
 
 from helpers import FrameFactory, ephemeral, ephemeral_dir, faker
-from nio import (Client, DeviceList, DeviceOneTimeKeyCount, EncryptionError,
-                 HttpClient, JoinedMembersResponse, KeysQueryResponse,
-                 KeysUploadResponse, LocalProtocolError, LoginResponse,
+from nio import (Client, ClientConfig, DeviceList, DeviceOneTimeKeyCount,
+                 EncryptionError, Event, HttpClient, JoinedMembersResponse,
+                 KeysQueryResponse, KeysUploadResponse, LocalProtocolError,
+                 LoginResponse,
                  MegolmEvent, ProfileGetAvatarResponse,
                  ProfileSetAvatarResponse, RoomEncryptionEvent,
                  RoomForgetResponse, RoomInfo, RoomKeyRequestResponse,
                  RoomMember, RoomMemberEvent, Rooms, RoomSummary,
                  ShareGroupSessionResponse, SyncResponse, Timeline,
                  TransportType, TypingNoticeEvent)
+from nio.crypto import OlmAccount, OutboundSession
 from nio.messages import ToDeviceMessage
+from nio.rooms import TimelineGap
 
 HOST = "example.org"
 USER = "example"
@@ -363,6 +367,176 @@ class TestClass(object):
         alice_device = client.device_store[ALICE_ID][ALICE_DEVICE_ID]
         assert alice_device
 
+    def test_sync_state_persistence(self, tempdir):
+        config = ClientConfig(store_sync_state=True)
+        client = Client("ephemeral", "DEVICEID", tempdir, config)
+        client.receive_response(self.login_response)
+        client.receive_response(self.sync_response)
+        client.receive_response(self.joined_members)
+
+        client = Client("ephemeral", "DEVICEID", tempdir, config)
+        client.receive_response(self.login_response)
+
+        assert client.next_batch == "token123"
+        assert TEST_ROOM_ID in client.encrypted_rooms
+
+        room = client.rooms[TEST_ROOM_ID]
+        assert room.encrypted
+        assert room.summary == RoomSummary(1, 2, [])
+        assert set(room.users) == set([ALICE_ID, BOB_ID])
+        assert client.encrypted_room_index.rooms(BOB_ID) == set(
+            [TEST_ROOM_ID]
+        )
+
+        client = Client("ephemeral", "DEVICEID", tempdir)
+        client.receive_response(self.login_response)
+
+        assert not client.next_batch
+        assert not client.rooms
+
+    def test_room_cache_eviction(self, tempdir):
+        other_room_id = "!otherroom:example.org"
+        config = ClientConfig(max_resident_rooms=1)
+        client = Client("ephemeral", "DEVICEID", tempdir, config)
+        client.receive_response(self.login_response)
+        client.receive_response(self.sync_response)
+        client.receive_response(self.joined_members)
+
+        timeline = Timeline([], False, "prev_batch_token")
+        other_room = RoomInfo(timeline, [], [], [], RoomSummary(1, 0, []))
+        client.receive_response(SyncResponse(
+            "token456",
+            Rooms({}, {other_room_id: other_room}, {}),
+            DeviceOneTimeKeyCount(49, 50),
+            DeviceList([], []),
+            []
+        ))
+
+        assert not client.rooms.is_resident(TEST_ROOM_ID)
+        assert TEST_ROOM_ID in client.rooms
+        assert len(client.rooms) == 2
+        assert client.encrypted_room_index.rooms(BOB_ID) == set(
+            [TEST_ROOM_ID]
+        )
+
+        room = client.rooms[TEST_ROOM_ID]
+        assert room.encrypted
+        assert set(room.users) == set([ALICE_ID, BOB_ID])
+        assert not client.rooms.is_resident(other_room_id)
+
+        # Leaving an evicted room doesn't load it again.
+        assert client.rooms[other_room_id]
+        assert not client.rooms.is_resident(TEST_ROOM_ID)
+
+        client.receive_response(SyncResponse(
+            "token789",
+            Rooms({}, {}, {TEST_ROOM_ID: RoomInfo(timeline, [], [], [])}),
+            DeviceOneTimeKeyCount(49, 50),
+            DeviceList([], []),
+            []
+        ))
+
+        assert TEST_ROOM_ID not in client.rooms
+        assert BOB_ID not in client.encrypted_room_index
+        assert list(client.rooms) == [other_room_id]
+        assert client.rooms.is_resident(other_room_id)
+
+    def test_room_timeline(self):
+        config = ClientConfig(encryption_enabled=False, timeline_size=10)
+        client = Client("ephemeral", "DEVICEID", config=config)
+        client.receive_response(self.login_response)
+        client.receive_response(self.sync_response)
+
+        timeline = client.rooms[TEST_ROOM_ID].timeline
+        events = self.sync_response.rooms.join[TEST_ROOM_ID].timeline.events
+
+        assert [event.event_id for event in timeline] == [
+            event.event_id for event in events
+        ]
+        assert timeline.get("event_id_2").sender == ALICE_ID
+
+        # A limited sync replaces the older entries with a gap.
+        response = self.second_sync
+        response.next_batch = "token456"
+        client.receive_response(response)
+        events = response.rooms.join[TEST_ROOM_ID].timeline.events
+        assert list(timeline) == [TimelineGap("prev_batch_token")] + events
+        assert timeline.fill_gap("prev_batch_token", [])
+
+    def test_snapshot_restore(self, tempdir):
+        client = Client("ephemeral", "DEVICEID", tempdir)
+        client.receive_response(self.login_response)
+        client.receive_response(self.sync_response)
+        client.receive_response(self.joined_members)
+        client.receive_response(self.keys_query_response)
+        client.olm.create_outbound_group_session(TEST_ROOM_ID)
+
+        bob = OlmAccount()
+        bob.generate_one_time_keys(1)
+        bob_key = bob.identity_keys["curve25519"]
+        one_time_key = list(bob.one_time_keys["curve25519"].values())[0]
+        session = OutboundSession(client.olm.account, bob_key, one_time_key)
+        client.olm.session_store.add(bob_key, session)
+
+        path = os.path.join(tempdir, "snapshot")
+        client.snapshot(path)
+
+        restored = Client("ephemeral", "DEVICEID", tempdir)
+        restored.user_id = client.user_id
+        restored.restore(path)
+
+        assert restored.next_batch == "token123"
+        assert restored.encrypted_rooms == set([TEST_ROOM_ID])
+        assert restored.olm.tracked_users == set([ALICE_ID])
+        assert list(restored.device_store.users) == [ALICE_ID]
+
+        room = restored.rooms[TEST_ROOM_ID]
+        assert room.encrypted
+        assert set(room.users) == set([ALICE_ID, BOB_ID])
+        assert restored.encrypted_room_index.rooms(BOB_ID) == set(
+            [TEST_ROOM_ID]
+        )
+
+        # Sessions are only unpickled once they are accessed.
+        assert restored.olm.session_store._pending
+        assert restored.olm.session_store.get(bob_key).id == session.id
+        assert not restored.olm.session_store._pending
+
+        group_session = client.olm.outbound_group_sessions[TEST_ROOM_ID]
+        own_key = client.olm.account.identity_keys["curve25519"]
+        inbound = restored.olm.inbound_group_store.get(
+            TEST_ROOM_ID,
+            own_key,
+            group_session.id
+        )
+        assert inbound.id == group_session.id
+        assert not restored.olm.inbound_group_store._pending
+
+        other = Client("@other:example.org", "DEVICEID", tempdir)
+        other.user_id = "@other:example.org"
+
+        with pytest.raises(LocalProtocolError):
+            other.restore(path)
+
+        # A broken snapshot leaves the client state untouched.
+        with open(path, "rb") as f:
+            data = f.read()
+
+        broken_path = os.path.join(tempdir, "broken_snapshot")
+
+        with open(broken_path, "wb") as f:
+            f.write(data[:len(data) // 2])
+
+        broken = Client("ephemeral", "DEVICEID", tempdir)
+        broken.user_id = client.user_id
+
+        with pytest.raises(LocalProtocolError):
+            broken.restore(broken_path)
+
+        assert not broken.rooms
+        assert not broken.next_batch
+        assert not broken.encrypted_room_index.rooms(BOB_ID)
+
     def test_client_key_query(self, client):
         assert not client.should_query_keys
 
@@ -419,7 +593,6 @@ class TestClass(object):
         client = Client("ephemeral", "DEVICEID", ephemeral_dir)
         client.receive_response(self.login_response)
         assert not client.should_upload_keys
-        assert not client.should_query_keys
 
         assert list(client.device_store.users) == [ALICE_ID]
         assert client.device_store.active_user_devices(ALICE_ID)
@@ -427,20 +600,55 @@ class TestClass(object):
         alice_device = client.device_store[ALICE_ID][ALICE_DEVICE_ID]
         assert alice_device
 
-        client.receive_response(self.second_sync)
-        assert client.should_query_keys
+        assert client.olm.tracked_users == set([ALICE_ID])
 
-        client.users_for_key_query == set([ALICE_ID])
+        # There is no sync token to catch up on the device changes of the
+        # tracked users, so they are queried again.
+        assert client.users_for_key_query == set([ALICE_ID])
+        client.receive_response(self.keys_query_response)
+        assert not client.should_query_keys
+
+        client.receive_response(self.second_sync)
+        assert not client.should_query_keys
 
         client.receive_response(self.joined_members)
 
-        client.users_for_key_query == set([ALICE_ID, BOB_ID])
+        assert client.users_for_key_query == set([BOB_ID])
+        assert client.should_query_keys
 
         client.receive_response(self.keys_query_response)
         assert client.olm.tracked_users == set([ALICE_ID])
         assert client.users_for_key_query == set([BOB_ID])
         assert client.should_query_keys
 
+    def test_tracked_users_restart(self, tempdir):
+        config = ClientConfig(store_sync_state=True)
+        client = Client("ephemeral", "DEVICEID", tempdir, config)
+        client.receive_response(self.login_response)
+        client.receive_response(self.sync_response)
+        client.receive_response(self.keys_query_response)
+        assert client.olm.tracked_users == set([ALICE_ID])
+        assert not client.should_query_keys
+
+        client = Client("ephemeral", "DEVICEID", tempdir, config)
+        client.receive_response(self.login_response)
+
+        assert client.next_batch == "token123"
+        assert client.olm.tracked_users == set([ALICE_ID])
+        assert not client.should_query_keys
+
+        # Alice changed her devices while the client wasn't running, the
+        # incremental sync from the restored token reports the change.
+        client.receive_response(SyncResponse(
+            "token456",
+            Rooms({}, {}, {}),
+            DeviceOneTimeKeyCount(49, 50),
+            DeviceList([ALICE_ID], []),
+            []
+        ))
+
+        assert client.users_for_key_query == set([ALICE_ID])
+
     @ephemeral
     def test_early_store_loading(self):
         client = Client("ephemeral")
@@ -503,6 +711,49 @@ class TestClass(object):
 
         assert session.shared
 
+    def test_pending_recipients_from_member_events(self, client):
+        client.receive_response(self.login_response)
+        client.receive_response(self.sync_response)
+
+        room = client.rooms[TEST_ROOM_ID]
+        client.olm.share_group_session(TEST_ROOM_ID, room.users, True)
+
+        session = client.olm.outbound_group_sessions[TEST_ROOM_ID]
+        assert session.recipients == set([ALICE_ID])
+        assert not session.users_pending
+
+        # New devices of the recipients are found by key queries.
+        client.receive_response(self.keys_query_response)
+        assert session.users_pending == set([(ALICE_ID, ALICE_DEVICE_ID)])
+
+        timeline = Timeline(
+            [
+                RoomMemberEvent(
+                    {"event_id": "event_id_3",
+                     "sender": ALICE_ID,
+                     "origin_server_ts": 1516809890615},
+                    ALICE_ID,
+                    {"membership": "leave"}
+                )
+            ],
+            False,
+            "prev_batch_token"
+        )
+        client.receive_response(SyncResponse(
+            "token456",
+            Rooms({}, {TEST_ROOM_ID: RoomInfo(timeline, [], [], [])}, {}),
+            DeviceOneTimeKeyCount(49, 50),
+            DeviceList([], []),
+            []
+        ))
+
+        assert session.recipients == set()
+        assert not session.users_pending
+
+        client.receive_response(self.joined_members)
+        assert session.recipients == set([ALICE_ID, BOB_ID])
+        assert session.users_pending == set([(ALICE_ID, ALICE_DEVICE_ID)])
+
     def test_storing_room_encryption_state(self, client):
         client.receive_response(self.login_response)
         assert not client.encrypted_rooms
@@ -706,6 +957,93 @@ class TestClass(object):
         with pytest.raises(CallbackException):
             client.receive_response(self.sync_response)
 
+    def test_callback_dispatch_index(self, client):
+        client.receive_response(self.login_response)
+
+        members = []
+        events = []
+
+        client.add_event_callback(
+            lambda _, event: members.append(event),
+            RoomMemberEvent
+        )
+        client.receive_response(self.sync_response)
+
+        assert members
+        assert client._event_callback_index[RoomMemberEvent] == (
+            client.event_callbacks
+        )
+
+        client.add_event_callback(lambda _, event: events.append(event), Event)
+        assert not client._event_callback_index
+
+        response = self.sync_response
+        response.next_batch = "token456"
+        client.receive_response(response)
+
+        assert len(members) == 2
+        assert members[1] in events
+        assert len(client._event_callback_index[RoomMemberEvent]) == 2
+        assert all(
+            len(callbacks) == 1
+            for event_class, callbacks in client._event_callback_index.items()
+            if event_class is not RoomMemberEvent
+        )
+
+    def test_lazy_timeline(self, tempdir):
+        config = ClientConfig(encryption_enabled=False, lazy_timeline=True)
+        client = Client(USER, DEVICE_ID, tempdir, config)
+        client.receive_response(self.login_response)
+
+        response = SyncResponse.from_dict(
+            self._load_response("tests/data/sync.json"),
+            0,
+            config.lazy_timeline
+        )
+        client.receive_response(response)
+
+        room_id = list(response.rooms.join)[0]
+        room = client.rooms[room_id]
+        timeline = response.rooms.join[room_id].timeline.events
+
+        assert room.join_rule == "public"
+        assert len(room.users) == 2
+        assert timeline.parsed == 0
+
+        events = []
+        client.add_event_callback(lambda _, event: events.append(event), Event)
+
+        response = SyncResponse.from_dict(
+            self._load_response("tests/data/sync.json"),
+            0,
+            config.lazy_timeline
+        )
+        response.next_batch = "token123"
+        client.receive_response(response)
+
+        timeline = response.rooms.join[room_id].timeline.events
+        assert events == list(timeline)
+        assert timeline.parsed == 1
+
+    def test_event_source_policy(self, tempdir):
+        with pytest.raises(ValueError):
+            ClientConfig(event_source_policy="compact")
+
+        config = ClientConfig(encryption_enabled=False,
+                              event_source_policy="drop")
+        client = Client(USER, DEVICE_ID, tempdir, config)
+        client.receive_response(self.login_response)
+
+        events = []
+        client.add_event_callback(lambda _, event: events.append(event), Event)
+        client.receive_response(self.sync_response)
+
+        assert events
+        for event in events:
+            assert "event_id" not in event._source
+            assert event.source["event_id"] == event.event_id
+            assert "content" in event.source
+
     def test_no_encryption(self, client_no_e2e):
         client_no_e2e.receive_response(self.login_response)
         assert client_no_e2e.logged_in
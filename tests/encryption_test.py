@@ -331,6 +331,9 @@ class TestClass(object):
 
         alice.verify_device(bob_device)
 
+        # malory joins the room
+        alice.update_group_session_member("!test:example.org", MaloryId, True)
+
         # alice shares the group session with bob and malory, but malory isn't
         # blocked
         with pytest.raises(OlmTrustError):
@@ -482,8 +485,13 @@ class TestClass(object):
 
         assert len(sharing_with) == 1
         assert not group_session.users_shared_with
+        assert group_session.users_pending == set([
+            (BobId, Bob_device),
+            (MaloryId, Malory_device)
+        ])
 
-        group_session.users_shared_with.update(sharing_with)
+        group_session.mark_shared_with(sharing_with)
+        assert len(group_session.users_pending) == 1
 
         sharing_with, to_device = alice.share_group_session(
             "!test:example.org",
@@ -492,6 +500,9 @@ class TestClass(object):
 
         assert len(sharing_with) == 1
 
+        group_session.mark_shared_with(sharing_with)
+        assert not group_session.users_pending
+
         os.remove(os.path.join(
             ephemeral_dir,
             "{}_{}.db".format(AliceId, Alice_device)
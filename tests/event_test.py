@@ -4,13 +4,20 @@ from __future__ import unicode_literals
 
 import json
 import pdb
+import tracemalloc
+from copy import copy, deepcopy
 
-from nio.events import (BadEvent, OlmEvent, PowerLevelsEvent, RedactedEvent,
-                        RedactionEvent, RoomAliasEvent, RoomCreateEvent,
-                        RoomGuestAccessEvent, RoomHistoryVisibilityEvent,
-                        RoomJoinRulesEvent, RoomMemberEvent, RoomMessageEmote,
+import attr
+import pytest
+
+from nio.events import (BadEvent, Event, OlmEvent, PowerLevelsEvent,
+                        RedactedEvent, RedactionEvent, RoomAliasEvent,
+                        RoomCreateEvent, RoomGuestAccessEvent,
+                        RoomHistoryVisibilityEvent, RoomJoinRulesEvent,
+                        RoomMemberEvent, RoomMessage, RoomMessageEmote,
                         RoomMessageNotice, RoomMessageText, RoomNameEvent,
-                        RoomTopicEvent, ToDeviceEvent, UnknownBadEvent)
+                        RoomTopicEvent, ToDeviceEvent, UnknownBadEvent,
+                        UnknownEvent, register_event_type)
 
 
 class TestClass(object):
@@ -120,3 +127,149 @@ class TestClass(object):
         parsed_dict = {}
         response = RedactedEvent.from_dict(parsed_dict)
         assert isinstance(response, UnknownBadEvent)
+
+    def test_event_type_registration(self):
+        @attr.s
+        class CustomEvent(Event):
+            pass
+
+        @attr.s
+        class CustomMessage(RoomMessage):
+            pass
+
+        parsed_dict = TestClass._load_response(
+            "tests/data/events/message_text.json")
+        custom_dict = dict(parsed_dict, type="org.example.custom")
+
+        event = Event.parse_event(dict(custom_dict))
+        assert isinstance(event, UnknownEvent)
+        assert event.type == "org.example.custom"
+
+        register_event_type("org.example.custom", CustomEvent)
+        register_event_type("org.example.message", CustomMessage)
+
+        try:
+            event = Event.parse_event(dict(custom_dict))
+            assert isinstance(event, CustomEvent)
+
+            message_dict = dict(parsed_dict)
+            message_dict["content"] = dict(
+                parsed_dict["content"],
+                msgtype="org.example.message"
+            )
+            event = Event.parse_event(message_dict)
+            assert isinstance(event, CustomMessage)
+
+            event = Event.parse_event(dict(parsed_dict))
+            assert isinstance(event, RoomMessageText)
+        finally:
+            Event._event_parsers.pop("org.example.custom")
+            RoomMessage._event_parsers.pop("org.example.message")
+
+        with pytest.raises(TypeError):
+            register_event_type("org.example.invalid", object)
+
+    def test_source_compaction(self):
+        parsed_dict = TestClass._load_response(
+            "tests/data/events/message_text.json")
+        event = Event.parse_event(parsed_dict)
+        assert event.source is parsed_dict
+
+        event.compact_source("keep")
+        assert event.source is parsed_dict
+
+        event.compact_source("shallow")
+        assert event.source is not parsed_dict
+        assert event.source["event_id"] == parsed_dict["event_id"]
+        assert event.source["sender"] == parsed_dict["sender"]
+        assert event.source["unsigned"] == parsed_dict["unsigned"]
+
+        event.transaction_id = "txn1"
+        event.compact_source("drop")
+        assert event.source == {
+            "event_id": parsed_dict["event_id"],
+            "sender": parsed_dict["sender"],
+            "origin_server_ts": parsed_dict["origin_server_ts"],
+            "type": parsed_dict["type"],
+            "content": parsed_dict["content"],
+            "unsigned": {"transaction_id": "txn1"},
+        }
+        assert event.body == "is dancing"
+
+    @pytest.mark.parametrize("policy", ["keep", "shallow", "drop"])
+    @pytest.mark.parametrize("name", [
+        "create",
+        "guest_access",
+        "join_rules",
+        "history_visibility",
+        "alias",
+        "topic",
+        "message_text",
+        "message_emote",
+        "message_notice",
+        "power_levels",
+        "redaction",
+        "member",
+    ])
+    def test_compacted_source_content(self, name, policy):
+        path = "tests/data/events/{}.json".format(name)
+        event = Event.parse_event(TestClass._load_response(path))
+        parsed_dict = TestClass._load_response(path)
+
+        event.compact_source(policy)
+
+        assert event.source["type"] == parsed_dict["type"]
+        assert event.source["content"] == parsed_dict["content"]
+
+        if "state_key" in parsed_dict:
+            assert event.source["state_key"] == parsed_dict["state_key"]
+
+        if "room_id" in parsed_dict:
+            assert event.source["room_id"] == parsed_dict["room_id"]
+
+    @pytest.mark.parametrize("name,extra_content", [
+        ("message_text", {
+            "m.relates_to": {"rel_type": "m.replace", "event_id": "$1"},
+            "m.new_content": {"msgtype": "m.text", "body": "is singing"},
+        }),
+        ("message_notice", {"org.example.custom": 1}),
+        ("power_levels", {"org.example.custom": 1}),
+    ])
+    def test_dropped_source_keeps_unparsed_content(self, name, extra_content):
+        path = "tests/data/events/{}.json".format(name)
+        event = Event.parse_event(TestClass._load_response(path))
+        event.compact_source("drop")
+        assert "content" not in event._source
+
+        parsed_dict = TestClass._load_response(path)
+        parsed_dict["content"].update(extra_content)
+        event = Event.parse_event(deepcopy(parsed_dict))
+
+        event.compact_source("drop")
+        assert event.source["content"] == parsed_dict["content"]
+
+    def test_timeline_memory(self, benchmark):
+        events = [
+            Event.parse_event(TestClass._load_response(
+                "tests/data/events/{}.json".format(name)
+            )) for name in ["message_text", "member", "name", "topic"]
+        ]
+
+        for event in events:
+            assert not hasattr(event, "__dict__")
+
+        def timeline():
+            return [copy(events[i % len(events)]) for i in range(100000)]
+
+        tracemalloc.start()
+
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            events = timeline()
+            after = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+        bytes_per_event = (after - before) / len(events)
+        benchmark.extra_info["bytes_per_event"] = bytes_per_event
+        benchmark.pedantic(timeline, rounds=1)
@@ -3,21 +3,33 @@
 from __future__ import unicode_literals
 
 import json
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
 
+import attr
+
+from nio.events import Event, register_event_type
 from nio.responses import (DeleteDevicesAuthResponse, DevicesResponse,
                            ErrorResponse, JoinedMembersError,
                            JoinedMembersResponse, KeysClaimResponse,
-                           KeysQueryResponse, KeysUploadResponse, LoginError,
-                           LoginResponse, PartialSyncResponse,
+                           KeysQueryResponse, KeysUploadResponse,
+                           LazyEventList, LoginError, LoginResponse,
+                           PartialSyncResponse,
                            ProfileGetAvatarResponse,
                            ProfileGetDisplayNameResponse, RoomKeyRequestError,
                            RoomKeyRequestResponse, RoomMessagesResponse,
-                           SyncError, SyncResponse, ToDeviceError,
+                           SyncError, SyncResponse, SyncStream, ToDeviceError,
                            ToDeviceResponse, UploadResponse)
+from nio.schemas import Schemas, _get_validator
 
 TEST_ROOM_ID = "!test:example.org"
 
 
+@attr.s
+class CustomEvent(Event):
+    pass
+
+
 class TestClass(object):
     @staticmethod
     def _load_response(filename):
@@ -100,6 +112,19 @@ class TestClass(object):
         response = UploadResponse.from_dict(parsed_dict)
         assert isinstance(response, UploadResponse)
 
+    @staticmethod
+    def _scaled_sync(room_count):
+        parsed_dict = TestClass._load_response(
+            "tests/data/sync.json")
+        room_id, room_dict = parsed_dict["rooms"]["join"].popitem()
+
+        for i in range(room_count):
+            parsed_dict["rooms"]["join"]["!room{}:localhost".format(i)] = (
+                deepcopy(room_dict)
+            )
+
+        return parsed_dict
+
     def test_sync_fail(self):
         parsed_dict = {}
         response = SyncResponse.from_dict(parsed_dict, 0)
@@ -111,6 +136,169 @@ class TestClass(object):
         response = SyncResponse.from_dict(parsed_dict)
         assert type(response) == SyncResponse
 
+    def test_sync_parse_lazy(self):
+        parsed_dict = TestClass._load_response(
+            "tests/data/sync.json")
+        eager = SyncResponse.from_dict(deepcopy(parsed_dict))
+        response = SyncResponse.from_dict(parsed_dict, 0, True)
+        assert type(response) == SyncResponse
+
+        room_id = list(response.rooms.join)[0]
+        room_info = response.rooms.join[room_id]
+        timeline = room_info.timeline.events
+
+        assert isinstance(timeline, LazyEventList)
+        assert timeline.parsed == 0
+        assert len(timeline) == 1
+
+        assert timeline[0] == eager.rooms.join[room_id].timeline.events[0]
+        assert timeline[0] is timeline[0]
+        assert timeline.parsed == 1
+
+        state = room_info.state
+        types = {"m.room.member"}
+        members = [event for _, event in state.items(types)]
+        assert len(members) == 2
+        assert state.parsed == 2
+        assert state == eager.rooms.join[room_id].state
+
+        # Events that don't parse into an event object are dropped, like in
+        # eagerly parsed timelines.
+        @attr.s
+        class IgnoredEvent(Event):
+            @classmethod
+            def from_dict(cls, parsed_dict):
+                return None
+
+        parsed_dict = TestClass._load_response("tests/data/sync.json")
+        room_dict = parsed_dict["rooms"]["join"][room_id]
+        room_dict["timeline"]["events"].insert(0, {
+            "type": "org.example.ignored",
+            "event_id": "$ignored:example.org",
+            "sender": "@alice:example.org",
+            "origin_server_ts": 1516809890615,
+            "content": {},
+        })
+
+        register_event_type("org.example.ignored", IgnoredEvent)
+
+        try:
+            eager = SyncResponse.from_dict(deepcopy(parsed_dict))
+            response = SyncResponse.from_dict(deepcopy(parsed_dict), 0, True)
+            indexed = SyncResponse.from_dict(parsed_dict, 0, True)
+            timeline = response.rooms.join[room_id].timeline.events
+            indexed_timeline = indexed.rooms.join[room_id].timeline.events
+            # Parse the events while the event type is registered.
+            items = list(timeline.items())
+            first = indexed_timeline[0]
+        finally:
+            Event._event_parsers.pop("org.example.ignored")
+
+        eager_timeline = eager.rooms.join[room_id].timeline.events
+
+        assert len(eager_timeline) == 1
+        assert items == [(0, eager_timeline[0])]
+        assert list(timeline) == eager_timeline
+        assert len(timeline) == len(eager_timeline)
+        assert timeline[0] == eager_timeline[0]
+        assert first == eager_timeline[0]
+        assert len(indexed_timeline) == len(eager_timeline)
+
+    def test_sync_parse_parallel(self):
+        with ProcessPoolExecutor(2) as executor:
+            response = SyncResponse.from_dict(
+                TestClass._scaled_sync(20),
+                executor=executor
+            )
+            assert response == SyncResponse.from_dict(
+                TestClass._scaled_sync(20)
+            )
+
+            response = SyncResponse.from_dict(
+                TestClass._scaled_sync(20),
+                1,
+                executor=executor
+            )
+            assert type(response) == PartialSyncResponse
+            assert response == SyncResponse.from_dict(
+                TestClass._scaled_sync(20),
+                1
+            )
+
+            # The workers are already running, they still need to see event
+            # types that are registered now.
+            parsed_dict = TestClass._scaled_sync(20)
+
+            for room_dict in parsed_dict["rooms"]["join"].values():
+                room_dict["timeline"]["events"].append({
+                    "type": "org.example.custom",
+                    "event_id": "$custom:example.org",
+                    "sender": "@alice:example.org",
+                    "origin_server_ts": 1516809890615,
+                    "content": {},
+                })
+
+            register_event_type("org.example.custom", CustomEvent)
+
+            try:
+                response = SyncResponse.from_dict(
+                    parsed_dict,
+                    executor=executor
+                )
+            finally:
+                Event._event_parsers.pop("org.example.custom")
+
+        for room_info in response.rooms.join.values():
+            assert isinstance(room_info.timeline.events[-1], CustomEvent)
+
+    def test_sync_stream(self):
+        parsed_dict = TestClass._scaled_sync(3)
+        body = json.dumps(parsed_dict, ensure_ascii=False).encode("utf-8")
+
+        stream = SyncStream()
+        parts = []
+
+        for i in range(0, len(body), 7):
+            parts += stream.feed(body[i:i + 7])
+
+        parts += stream.feed(b"", True)
+        response = stream.finish()
+
+        assert len(parts) == 3
+        assert all(type(part) == PartialSyncResponse for part in parts)
+        assert response == SyncResponse.from_dict(parsed_dict)
+
+        # Released rooms aren't part of the final response.
+        stream = SyncStream()
+        parts = stream.feed(body, True)
+        stream.release(list(parts[0].rooms.join)[0])
+        response = stream.finish()
+        assert len(response.rooms.join) == 2
+        assert not set(parts[0].rooms.join) & set(response.rooms.join)
+
+        stream = SyncStream()
+        stream.feed(body[:-10], True)
+        assert isinstance(stream.finish(), SyncError)
+
+    def test_validator_cache(self):
+        validator = _get_validator(Schemas.sync)
+        assert _get_validator(Schemas.sync) is validator
+        assert _get_validator(Schemas.room_event) is not validator
+
+    def test_sync_parse_scaled(self, benchmark):
+        parsed_dict = TestClass._scaled_sync(100)
+
+        def setup():
+            return (deepcopy(parsed_dict), ), {}
+
+        response = benchmark.pedantic(
+            SyncResponse.from_dict,
+            setup=setup,
+            rounds=10
+        )
+        assert type(response) == SyncResponse
+        assert len(response.rooms.join) == 100
+
     def test_keyshare_request(self):
         parsed_dict = {
             "errcode": "M_LIMIT_EXCEEDED",
@@ -160,6 +348,40 @@ class TestClass(object):
             ].timeline.events
         ) == 1
 
+    def test_partial_sync_cursor(self):
+        parsed_dict = TestClass._scaled_sync(10)
+        response = SyncResponse.from_dict(parsed_dict, 2)
+        assert isinstance(response, PartialSyncResponse)
+
+        parts = [response]
+
+        while isinstance(response, PartialSyncResponse):
+            response = response.next_part(3)
+            parts.append(response)
+
+        assert isinstance(response, SyncResponse)
+
+        for part in parts[1:]:
+            for info in part.rooms.join.values():
+                assert len(info.state) + len(info.timeline.events) <= 3
+
+        # Every part handles the next events of all the unfinished rooms.
+        assert len(parts) == 4
+        assert len(parts[1].rooms.join) == 10
+
+        for i in range(10):
+            room_id = "!room{}:localhost".format(i)
+            state = []
+            timeline = []
+
+            for part in parts:
+                if room_id in part.rooms.join:
+                    state += part.rooms.join[room_id].state
+                    timeline += part.rooms.join[room_id].timeline.events
+
+            assert len(state) == 9
+            assert len(timeline) == 1
+
     def test_get_displayname(self):
         parsed_dict = TestClass._load_response(
             "tests/data/get_displayname_response.json")
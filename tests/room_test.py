@@ -2,11 +2,12 @@ import pytest
 
 from helpers import faker
 from nio.events import (InviteAliasEvent, InviteMemberEvent, InviteNameEvent,
-                        RoomCreateEvent, RoomGuestAccessEvent,
-                        RoomHistoryVisibilityEvent, RoomJoinRulesEvent,
-                        RoomNameEvent)
+                        RoomCreateEvent, RoomEncryptionEvent,
+                        RoomGuestAccessEvent, RoomHistoryVisibilityEvent,
+                        RoomJoinRulesEvent, RoomMemberEvent, RoomNameEvent)
 from nio.responses import RoomSummary, TypingNoticeEvent
-from nio.rooms import MatrixInvitedRoom, MatrixRoom
+from nio.rooms import (EncryptedRoomIndex, MatrixInvitedRoom, MatrixRoom,
+                       RoomCache, RoomTimeline, TimelineBudget, TimelineGap)
 
 TEST_ROOM = "!test:example.org"
 BOB_ID = "@bob:example.org"
@@ -39,6 +40,19 @@ class TestClass(object):
         assert member.user_id == mx_id
         assert member.display_name == name
         assert member.avatar_url == avatar
+        assert not hasattr(member, "__dict__")
+
+    def test_member_ids_interned(self):
+        first = self.test_room
+        second = MatrixRoom("!test2:example.org", BOB_ID)
+
+        first.add_member("".join(["@alice", ":example.org"]), "Alice", None)
+        second.add_member("".join(["@alice", ":example.org"]), "Alice", None)
+
+        first_user = first.users["@alice:example.org"]
+        second_user = second.users["@alice:example.org"]
+        assert first_user.user_id is second_user.user_id
+        assert first_user.display_name is second_user.display_name
 
     def test_named_checks(self):
         room = self.test_room
@@ -117,20 +131,91 @@ class TestClass(object):
         room.add_member("@malory:example.org", "Alice", None)
         assert room.user_name("@alice:example.org") == "Alice (@alice:example.org)"
         assert room.user_name("@malory:example.org") == "Alice (@malory:example.org)"
-        assert room.user_name_clashes("Alice") == ["@alice:example.org", "@malory:example.org"]
+        assert sorted(room.user_name_clashes("Alice")) == [
+            "@alice:example.org", "@malory:example.org"
+        ]
 
         room.remove_member("@alice:example.org")
         assert room.user_name("@malory:example.org") == "Alice"
 
         room.remove_member("@malory:example.org")
+        assert "Alice" not in room.names
+        assert not room.user_name_clashes("Alice")
+
         room.add_member("@alice:example.org", None, None)
         assert room.user_name("@alice:example.org") == "@alice:example.org"
-        assert room.user_name_clashes("@alice:example.org") == ["@alice:example.org"]
+        assert room.user_name_clashes("@alice:example.org") == [
+            "@alice:example.org"
+        ]
 
         room.add_member("@malory:example.org", "@alice:example.org", None)
         assert room.user_name("@alice:example.org") == "@alice:example.org"
         assert room.user_name("@malory:example.org") == "@alice:example.org (@malory:example.org)"
-        assert room.user_name_clashes("@alice:example.org") == ["@alice:example.org", "@malory:example.org"]
+        assert sorted(room.user_name_clashes("@alice:example.org")) == [
+            "@alice:example.org", "@malory:example.org"
+        ]
+
+        room.user_name_clashes("@alice:example.org").clear()
+        assert len(room.user_name_clashes("@alice:example.org")) == 2
+
+    def test_name_cache_invalidation(self):
+        room = self.test_room
+        room.add_member("@alice:example.org", "Alice", None)
+        room.add_member("@malory:example.org", "Malory", None)
+
+        assert room.display_name == "Alice and Malory"
+        assert room.user_name("@alice:example.org") == "Alice"
+
+        room.handle_membership(
+            RoomMemberEvent(
+                {
+                    "event_id": "event_id",
+                    "sender": "@malory:example.org",
+                    "origin_server_ts": 0
+                },
+                "@malory:example.org",
+                {"membership": "join", "displayname": "Alice"}
+            )
+        )
+
+        assert room.user_name("@alice:example.org") == (
+            "Alice (@alice:example.org)"
+        )
+        assert room.display_name == (
+            "Alice (@alice:example.org) and Alice (@malory:example.org)"
+        )
+
+        room.name = "Test room"
+        assert room.display_name == "#Test room"
+
+        # Only the users sharing a name are disambiguated again.
+        room.add_member("@bob:example.org", "Bob", None)
+        assert "@alice:example.org" in room._user_names
+        room.add_member("@bobby:example.org", "Bob", None)
+        assert "@alice:example.org" in room._user_names
+        assert room.user_name("@bob:example.org") == "Bob (@bob:example.org)"
+
+        room.remove_member("@bobby:example.org")
+        assert "@bob:example.org" not in room._user_names
+        assert room.user_name("@bob:example.org") == "Bob"
+
+    def test_display_name_large_room(self, benchmark):
+        room = self.test_room
+
+        for i in range(50000):
+            room.add_member("@user{}:example.org".format(i), "User", None)
+
+        # Measure the computation after an invalidation, cached accesses
+        # don't do any work.
+        display_name = benchmark.pedantic(
+            lambda: room.display_name,
+            setup=lambda: room._invalidate_names("User", "@user0:example.org"),
+            rounds=100
+        )
+
+        assert display_name == (
+            "User (@user0:example.org) and 49999 others"
+        )
 
     def test_machine_name(self):
         room = self.test_room
@@ -222,6 +307,144 @@ class TestClass(object):
         )
         assert room.name == "test name"
 
+    def test_encrypted_room_index(self):
+        index = EncryptedRoomIndex()
+        room = MatrixRoom(TEST_ROOM, BOB_ID, encrypted_room_index=index)
+        room.add_member(BOB_ID, "Bob", None)
+
+        assert BOB_ID not in index
+
+        room.handle_event(
+            RoomEncryptionEvent(
+                {
+                    "event_id": "event_id",
+                    "sender": BOB_ID,
+                    "origin_server_ts": 0
+                }
+            )
+        )
+        assert index.rooms(BOB_ID) == {TEST_ROOM}
+
+        room.add_member("@alice:example.org", "Alice", None)
+        assert index.rooms("@alice:example.org") == {TEST_ROOM}
+
+        room.remove_member(BOB_ID)
+        assert BOB_ID not in index
+        assert not index.rooms(BOB_ID)
+
+    def test_room_cache(self):
+        saved = dict()
+
+        def save(room):
+            saved[room.room_id] = room
+            return True
+
+        cache = RoomCache(2, saved.pop, save)
+        rooms = [
+            MatrixRoom("!room{}:example.org".format(i), BOB_ID)
+            for i in range(3)
+        ]
+
+        for room in rooms:
+            cache[room.room_id] = room
+
+        assert list(saved) == [rooms[0].room_id]
+        assert not cache.is_resident(rooms[0].room_id)
+        assert rooms[0].room_id in cache
+        assert len(cache) == 3
+
+        assert cache[rooms[0].room_id] is rooms[0]
+        assert cache.is_resident(rooms[0].room_id)
+        assert list(saved) == [rooms[1].room_id]
+
+        del cache[rooms[1].room_id]
+        assert rooms[1].room_id not in cache
+        assert len(cache) == 2
+
+        with pytest.raises(KeyError):
+            cache[rooms[1].room_id]
+
+        # Discarding an evicted room doesn't load it.
+        cache[rooms[1].room_id] = rooms[1]
+        assert not cache.is_resident(rooms[2].room_id)
+        assert cache.discard(rooms[2].room_id) is None
+        assert rooms[2].room_id not in cache
+        assert rooms[2].room_id in saved
+        assert cache.discard(rooms[0].room_id) is rooms[0]
+        assert list(cache) == [rooms[1].room_id]
+
+        unsaved = RoomCache(1, saved.pop, lambda room: False)
+        unsaved[rooms[0].room_id] = rooms[0]
+        unsaved[rooms[1].room_id] = rooms[1]
+        assert unsaved.is_resident(rooms[0].room_id)
+
+    @staticmethod
+    def _name_event(number):
+        return RoomNameEvent(
+            {
+                "event_id": "event_id_{}".format(number),
+                "sender": BOB_ID,
+                "origin_server_ts": 0
+            },
+            "Room {}".format(number)
+        )
+
+    def test_room_timeline(self):
+        timeline = RoomTimeline(3)
+        events = [self._name_event(i) for i in range(5)]
+
+        timeline.add_gap("token1")
+        timeline.add_gap("token1")
+
+        for event in events[3:]:
+            timeline.append(event)
+
+        assert list(timeline) == [TimelineGap("token1")] + events[3:]
+        assert timeline.get("event_id_4") is events[4]
+
+        # Backwards pagination from the gap, the newest event comes first.
+        assert not timeline.fill_gap("token2", [events[2]], "token0")
+        assert timeline.fill_gap("token1", [events[2], events[1]], "token0")
+        assert list(timeline) == events[2:]
+
+        timeline.append(events[4])
+        assert len(timeline) == 3
+
+        timeline.append(self._name_event(5))
+        assert "event_id_2" not in timeline
+        assert timeline.get("event_id_2") is None
+        assert timeline.get("event_id_3") is events[3]
+
+        # A new gap drops the entries that aren't contiguous anymore.
+        timeline.add_gap("token5")
+        assert list(timeline) == [TimelineGap("token5")]
+        assert "event_id_3" not in timeline
+
+        timeline.clear()
+        timeline.add_gap("token5")
+        assert list(timeline) == [TimelineGap("token5")]
+
+    def test_timeline_budget(self):
+        budget = TimelineBudget(3)
+        first = RoomTimeline(10, budget)
+        second = RoomTimeline(10, budget)
+
+        first.append(self._name_event(0))
+        first.append(self._name_event(1))
+        second.append(self._name_event(2))
+        second.append(self._name_event(3))
+
+        assert budget.event_count == 3
+        assert "event_id_0" not in first
+        assert "event_id_1" in first
+
+        second.append(self._name_event(4))
+        assert not len(first)
+        assert len(second) == 3
+
+        second.clear()
+        assert budget.event_count == 0
+
     def test_summary_update(self):
         room = self.test_room
         assert not room.summary
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import json
+from copy import deepcopy
+
+import pytest
+from jsonschema.exceptions import ValidationError
+
+import nio.schemas
+from nio.responses import SyncResponse
+from nio.schemas import (Schemas, _SchemaCompiler, _get_validator,
+                         compile_schema, validate_json)
+
+
+def all_schemas():
+    return [
+        (name, schema) for name, schema in sorted(vars(Schemas).items())
+        if isinstance(schema, dict)
+    ]
+
+
+class TestClass(object):
+    @staticmethod
+    def _load_response(filename):
+        with open(filename) as f:
+            return json.loads(f.read(), encoding="utf-8")
+
+    @staticmethod
+    def _outcome(validate, instance):
+        try:
+            validate(instance)
+        except ValidationError:
+            return False
+        return True
+
+    def test_schemas_compile(self):
+        for name, schema in all_schemas():
+            # No schema should need to fall back to the jsonschema validator.
+            assert _SchemaCompiler().compile(schema), name
+
+    def test_compiled_matches_jsonschema(self):
+        instances = [
+            TestClass._load_response("tests/data/sync.json"),
+            TestClass._load_response("tests/data/keys_query.json"),
+            TestClass._load_response("tests/data/room_messages.json"),
+            TestClass._load_response("tests/data/events/message_text.json"),
+            TestClass._load_response("tests/data/events/member.json"),
+            {},
+            {"type": 1},
+            [],
+        ]
+
+        for name, schema in all_schemas():
+            validate = compile_schema(schema)
+
+            for instance in instances:
+                expected_instance = deepcopy(instance)
+                compiled_instance = deepcopy(instance)
+
+                expected = TestClass._outcome(
+                    _get_validator(schema).validate,
+                    expected_instance
+                )
+                compiled = TestClass._outcome(validate, compiled_instance)
+
+                assert expected == compiled, name
+                assert expected_instance == compiled_instance, name
+
+    def test_compiled_errors(self):
+        validate = compile_schema(Schemas.room_event)
+        event = TestClass._load_response("tests/data/events/message_text.json")
+
+        validate(deepcopy(event))
+
+        bad_sender = deepcopy(event)
+        bad_sender["sender"] = "alice"
+        with pytest.raises(ValidationError):
+            validate(bad_sender)
+
+        missing_id = deepcopy(event)
+        missing_id.pop("event_id")
+        with pytest.raises(ValidationError):
+            validate(missing_id)
+
+        validate = compile_schema(Schemas.keys_query)
+        keys = TestClass._load_response("tests/data/keys_query.json")
+        user_id = list(keys["device_keys"])[0]
+        device = list(keys["device_keys"][user_id].values())[0]
+        device["keys"]["ed25519:DEVICE"] = 1
+
+        with pytest.raises(ValidationError):
+            validate(keys)
+
+    def test_compiled_defaults(self):
+        validate = compile_schema(Schemas.room_create)
+        event = TestClass._load_response("tests/data/events/create.json")
+        event["content"].pop("m.federate", None)
+        event["content"].pop("room_version", None)
+
+        validate(event)
+        assert event["content"]["m.federate"] is True
+        assert event["content"]["room_version"] == "1"
+
+    def test_compiled_validation_mode(self, benchmark):
+        parsed_dict = TestClass._load_response("tests/data/sync.json")
+
+        nio.schemas.use_compiled_validation()
+
+        try:
+            with pytest.raises(ValidationError):
+                validate_json({}, Schemas.sync)
+
+            response = benchmark.pedantic(
+                SyncResponse.from_dict,
+                setup=lambda: ((deepcopy(parsed_dict), ), {}),
+                rounds=10
+            )
+        finally:
+            nio.schemas.use_compiled_validation(False)
+
+        assert type(response) == SyncResponse
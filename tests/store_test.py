@@ -13,6 +13,7 @@ from nio.crypto import (InboundGroupSession, OlmAccount, OlmDevice,
                         OutboundGroupSession, OutboundSession,
                         OutgoingKeyRequest)
 from nio.exceptions import OlmTrustError
+from nio.rooms import MatrixInvitedRoom, MatrixRoom
 from nio.store import (Ed25519Key, Key, KeyStore, LegacyMatrixStore,
                        MatrixStore, SqliteMemoryStore, SqliteStore)
 
@@ -434,6 +435,60 @@ class TestClass(object):
         assert TEST_ROOM in encrypted_rooms
         assert TEST_ROOM_2 not in encrypted_rooms
 
+    def test_tracked_users_saving(self, store):
+        assert store.load_tracked_users() == set()
+
+        store.save_tracked_users([BOB_ID, "@alice:example.org"])
+        store.save_tracked_users([BOB_ID])
+
+        store2 = self.copy_store(store)
+        assert store2.load_tracked_users() == {BOB_ID, "@alice:example.org"}
+
+    def test_room_state_saving(self, store):
+        assert store.load_rooms() == ({}, {})
+        assert not store.load_sync_token()
+
+        room = MatrixRoom(TEST_ROOM, store.user_id)
+        room.name = "Test room"
+        room.encrypted = True
+        room.power_levels.users[BOB_ID] = 100
+        room.add_member(BOB_ID, "Bob", None)
+        room.add_member("@alice:example.org", "Alice", None)
+
+        invited_room = MatrixInvitedRoom(TEST_ROOM_2, store.user_id)
+        invited_room.inviter = BOB_ID
+
+        store.save_rooms([room, invited_room])
+        store.save_sync_token("token123")
+
+        room.remove_member("@alice:example.org")
+        room.add_member("@malory:example.org", None, None)
+        store.save_rooms(
+            [room],
+            {TEST_ROOM: {"@alice:example.org", "@malory:example.org"}}
+        )
+
+        store2 = self.copy_store(store)
+        rooms, invited_rooms = store2.load_rooms()
+
+        assert store2.load_sync_token() == "token123"
+
+        loaded = rooms[TEST_ROOM]
+        assert loaded.display_name == "#Test room"
+        assert loaded.encrypted
+        assert set(loaded.users) == {BOB_ID, "@malory:example.org"}
+        assert loaded.users[BOB_ID].power_level == 100
+        assert loaded.power_levels == room.power_levels
+
+        assert invited_rooms[TEST_ROOM_2].inviter == BOB_ID
+
+        assert set(store2.load_room(TEST_ROOM).users) == set(loaded.users)
+        assert store2.load_room(TEST_ROOM_2) is None
+
+        store2.delete_room(TEST_ROOM)
+        rooms, _ = store2.load_rooms()
+        assert not rooms
+
     def test_new_key_request_saving(self, store):
         key_requests = store.load_outgoing_key_requests()
 